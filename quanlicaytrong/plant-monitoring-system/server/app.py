@@ -1,14 +1,32 @@
 from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room
 from config import Config
-from extensions import db, mqtt
-from models import SensorData, ThresholdSettings
+from extensions import db, mqtt, devices
+from models import SensorData, ThresholdSettings, SensorRollupMinute
+from partitions import SensorPartitions
+from chunk_store import SensorChunkStore
+from rollups import rebuild_rollups
+from broadcaster import BroadcastScheduler, WIRE_JSON
+from ingest_buffer import SensorDataBuffer
+from ring_buffer import RecentReadings
+from storage import SQLiteStorage
+from ingest_queue import IngestQueue
+from threshold_cache import ThresholdCache
+from automation import AutomationEngine
+from metrics import (
+    MQTT_MESSAGES, MQTT_MESSAGE_SECONDS, INGEST_QUEUE_DEPTH, INGEST_QUEUE_DROPPED, DB_BUFFER_PENDING,
+    SOCKETIO_CLIENTS, SOCKETIO_EMITS
+)
+from devices import (
+    DEFAULT_DEVICE_ID, SUBTOPIC_DATA, SUBTOPIC_TEMPERATURE, SUBTOPIC_HUMIDITY, SUBTOPIC_SOIL_MOISTURE,
+    SUBTOPIC_LIGHT_LEVEL, SUBTOPIC_PUMP_STATUS, SUBTOPIC_LIGHT_STATUS, SUBTOPIC_MODE, SUBTOPIC_THRESHOLDS,
+    SUBTOPIC_COMMAND, SENSOR_KEYS, device_topic, parse_topic, subscription_topics
+)
 import json
 from datetime import datetime, timedelta
 import logging
 import sys
 import argparse
-from gesture_control import start_gesture_thread
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,42 +44,24 @@ app.config.from_object(Config)
 
 socketio = SocketIO(app, cors_allowed_origins="*")
 db.init_app(app)
-mqtt.init_app(app)
+storage = SQLiteStorage(db, app)
+if Config.SERVER_RUNTIME != 'asyncio' and Config.SERVER_ROLE != 'web':
+    # The asyncio runtime drives the same paho client from its event loop instead of Flask-MQTT's thread,
+    # and cluster.py web workers hand their publishes to the ingest process
+    mqtt.init_app(app)
+sensor_partitions = SensorChunkStore(app) if Config.SENSOR_STORE == 'chunks' else SensorPartitions(app)
+sensor_buffer = SensorDataBuffer(app)
+recent_readings = RecentReadings(app)
+broadcaster = BroadcastScheduler(socketio, devices, app)
+threshold_cache = ThresholdCache(devices, app)
+automation = AutomationEngine(socketio, devices, mqtt, broadcaster, app)
 
 from routes import main_bp
 app.register_blueprint(main_bp)
 
-TOPIC_DATA = "plant/data"
-TOPIC_TEMPERATURE = "plant/temperature"
-TOPIC_HUMIDITY = "plant/humidity"
-TOPIC_SOIL_MOISTURE = "plant/soil_moisture"
-TOPIC_LIGHT_LEVEL = "plant/light_level"
-TOPIC_PUMP_STATUS = "plant/pump_status"
-TOPIC_LIGHT_STATUS = "plant/light_status"
-TOPIC_MODE = "plant/mode"
-TOPIC_THRESHOLDS = "plant/thresholds"
-TOPIC_COMMAND = "plant/command"
-
-current_state = {
-    "temperature": 0,
-    "humidity": 0,
-    "soil_moisture": 0,
-    "light_level": 0,
-    "pump_status": "OFF",
-    "light_status": "OFF",
-    "mode": "AUTO"
-}
-
-thresholds = {
-    "temperature_min": 18.0,
-    "temperature_max": 30.0,
-    "soil_moisture_min": 30,
-    "humidity_min": 40.0,
-    "light_level_min": 30
-}
-
-last_db_save_time = datetime.now()
-DB_SAVE_INTERVAL = 60
+# The default device keeps the original module-level dicts so single-board setups behave as before
+current_state = devices.get(DEFAULT_DEVICE_ID).state
+thresholds = devices.get(DEFAULT_DEVICE_ID).thresholds
 
 gesture_thread = None
 
@@ -69,74 +69,62 @@ gesture_thread = None
 def handle_connect(client, userdata, flags, rc):
     if rc == 0:
         logger.info("Connected to MQTT broker")
-        mqtt.subscribe(TOPIC_DATA)
-        mqtt.subscribe(TOPIC_TEMPERATURE)
-        mqtt.subscribe(TOPIC_HUMIDITY)
-        mqtt.subscribe(TOPIC_SOIL_MOISTURE)
-        mqtt.subscribe(TOPIC_LIGHT_LEVEL)
-        mqtt.subscribe(TOPIC_PUMP_STATUS)
-        mqtt.subscribe(TOPIC_LIGHT_STATUS)
-        mqtt.subscribe(TOPIC_MODE)
-        mqtt.subscribe(TOPIC_THRESHOLDS)
+        for topic in subscription_topics():
+            mqtt.subscribe(topic)
     else:
         logger.error(f"Failed to connect to MQTT broker with code {rc}")
 
-def save_sensor_data_to_db(temperature, humidity, soil_moisture, light_level, timestamp=None):
-    global last_db_save_time
-    
+if mqtt.connected:
+    # init_app() connects right away; a broker that answered before the handler above existed never called it
+    handle_connect(mqtt.client, None, None, 0)
+
+def save_sensor_data_to_db(device_id, temperature, humidity, soil_moisture, light_level, timestamp=None):
     current_time = datetime.now()
     
-    if (current_time - last_db_save_time).total_seconds() >= DB_SAVE_INTERVAL:
+    if timestamp is None:
+        timestamp = current_time
+    elif isinstance(timestamp, str):
         try:
-            if timestamp is None:
-                timestamp = current_time
-            elif isinstance(timestamp, str):
-                try:
-                    timestamp = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    timestamp = current_time
-            
-            new_data = SensorData(
-                temperature=temperature,
-                humidity=humidity,
-                soil_moisture=soil_moisture,
-                light_level=light_level,
-                timestamp=timestamp
-            )
-            
-            with app.app_context():
-                db.session.add(new_data)
-                db.session.commit()
-                
-            last_db_save_time = current_time
-            logger.info(f"Sensor data saved to database at {current_time}")
-            
-        except Exception as e:
-            logger.error(f"Error saving sensor data to database: {str(e)}")
-            with app.app_context():
-                db.session.rollback()
+            timestamp = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            timestamp = current_time
+    
+    sensor_buffer.add(device_id, temperature, humidity, soil_moisture, light_level, timestamp)
+    recent_readings.append(device_id, timestamp, temperature, humidity, soil_moisture, light_level)
+
+def publish_changes(device_id, changes):
+    if changes:
+        broadcaster.publish(device_id, changes)
+        automation.notify(device_id)
 
 @mqtt.on_message()
 def handle_message(client, userdata, message):
-    topic = message.topic
-    payload = message.payload.decode()
-    logger.info(f"Received message on topic {topic}: {payload}")
+    # Only route here; parsing and storage run on the ingest workers so the MQTT network loop never stalls
+    device_id, subtopic = parse_topic(message.topic)
+    MQTT_MESSAGES.inc(subtopic=subtopic or 'unknown')
+    if subtopic is None:
+        return
+    ingest_queue.submit(device_id, (message.topic, message.payload))
+
+def process_message(topic, payload):
+    device_id, subtopic = parse_topic(topic)
+    with MQTT_MESSAGE_SECONDS.time(subtopic=subtopic):
+        apply_message(device_id, subtopic, topic, payload.decode())
+
+def apply_message(device_id, subtopic, topic, payload):
+    logger.debug(f"Received message on topic {topic}: {payload}")
+    device = devices.get(device_id)
     
     try:
-        if topic == TOPIC_DATA:
+        if subtopic == SUBTOPIC_DATA:
             data = json.loads(payload)
             timestamp = data.get("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             
-            if "temperature" in data:
-                current_state["temperature"] = data["temperature"]
-            if "humidity" in data:
-                current_state["humidity"] = data["humidity"]
-            if "soil_moisture" in data:
-                current_state["soil_moisture"] = data["soil_moisture"]
-            if "light_level" in data:
-                current_state["light_level"] = data["light_level"]
+            readings = {key: data[key] for key in SENSOR_KEYS if key in data}
+            changes = device.update({**readings, "timestamp": timestamp})
             
             save_sensor_data_to_db(
+                device_id,
                 data["temperature"], 
                 data["humidity"], 
                 data["soil_moisture"],
@@ -144,122 +132,93 @@ def handle_message(client, userdata, message):
                 timestamp
             )
             
-            socketio.emit('sensor_data_update', data)
+            publish_changes(device_id, changes)
             
-        elif topic == TOPIC_TEMPERATURE:
+        elif subtopic == SUBTOPIC_TEMPERATURE:
             value = float(payload)
-            if current_state["temperature"] != value:
-                current_state["temperature"] = value
-                socketio.emit('temperature_update', {"value": value})
+            publish_changes(device_id, device.update({"temperature": value}))
         
-        elif topic == TOPIC_HUMIDITY:
+        elif subtopic == SUBTOPIC_HUMIDITY:
             value = float(payload)
-            if current_state["humidity"] != value:
-                current_state["humidity"] = value
-                socketio.emit('humidity_update', {"value": value})
+            publish_changes(device_id, device.update({"humidity": value}))
         
-        elif topic == TOPIC_SOIL_MOISTURE:
+        elif subtopic == SUBTOPIC_SOIL_MOISTURE:
             value = int(payload)
-            if current_state["soil_moisture"] != value:
-                current_state["soil_moisture"] = value
-                socketio.emit('soil_moisture_update', {"value": value})
+            publish_changes(device_id, device.update({"soil_moisture": value}))
                 
-        elif topic == TOPIC_LIGHT_LEVEL:
+        elif subtopic == SUBTOPIC_LIGHT_LEVEL:
             value = int(payload)
-            if current_state["light_level"] != value:
-                current_state["light_level"] = value
-                socketio.emit('light_level_update', {"value": value})
-            
-        if topic in [TOPIC_TEMPERATURE, TOPIC_HUMIDITY, TOPIC_SOIL_MOISTURE, TOPIC_LIGHT_LEVEL]:
-            if all(current_state[key] != 0 for key in ["temperature", "humidity", "soil_moisture", "light_level"]):
-                save_sensor_data_to_db(
-                    current_state["temperature"],
-                    current_state["humidity"],
-                    current_state["soil_moisture"],
-                    current_state["light_level"]
-                )
+            publish_changes(device_id, device.update({"light_level": value}))
             
-        elif topic == TOPIC_PUMP_STATUS:
-            if current_state["pump_status"] != payload:
-                current_state["pump_status"] = payload
-                socketio.emit('pump_status_update', {"status": payload})
+        elif subtopic == SUBTOPIC_PUMP_STATUS:
+            publish_changes(device_id, device.update({"pump_status": payload}))
             
-        elif topic == TOPIC_LIGHT_STATUS:
-            if current_state["light_status"] != payload:
-                current_state["light_status"] = payload
-                socketio.emit('light_status_update', {"status": payload})
+        elif subtopic == SUBTOPIC_LIGHT_STATUS:
+            publish_changes(device_id, device.update({"light_status": payload}))
             
-        elif topic == TOPIC_MODE:
-            if current_state["mode"] != payload:
-                current_state["mode"] = payload
-                socketio.emit('mode_update', {"mode": payload})
+        elif subtopic == SUBTOPIC_MODE:
+            publish_changes(device_id, device.update({"mode": payload}))
             
-        elif topic == TOPIC_THRESHOLDS:
-            threshold_data = json.loads(payload)
-            thresholds.update(threshold_data)
-            update_thresholds_in_db(threshold_data)
-            socketio.emit('thresholds_update', threshold_data)
+        elif subtopic == SUBTOPIC_THRESHOLDS:
+            device_thresholds = threshold_cache.update(device_id, json.loads(payload))
+            if device_thresholds is not None:
+                publish_changes(device_id, {"thresholds": device_thresholds})
             
     except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
+        logger.error(f"Error processing message on topic {topic}: {str(e)}")
 
-def update_thresholds_in_db(threshold_data):
-    try:
-        with app.app_context():
-            settings = ThresholdSettings.query.first()
-            if not settings:
-                settings = ThresholdSettings()
-            
-            if "temperature_min" in threshold_data:
-                settings.temperature_min = threshold_data["temperature_min"]
-            if "temperature_max" in threshold_data:
-                settings.temperature_max = threshold_data["temperature_max"]
-            if "soil_moisture_min" in threshold_data:
-                settings.soil_moisture_min = threshold_data["soil_moisture_min"]
-            if "humidity_min" in threshold_data:
-                settings.humidity_min = threshold_data["humidity_min"]
-            if "light_level_min" in threshold_data:
-                settings.light_level_min = threshold_data["light_level_min"]
-            
-            db.session.add(settings)
-            db.session.commit()
-            logger.info("Thresholds updated in database")
-    except Exception as e:
-        logger.error(f"Error updating thresholds in database: {str(e)}")
-        with app.app_context():
-            db.session.rollback()
+ingest_queue = IngestQueue(process_message, app)
+
+INGEST_QUEUE_DEPTH.set_function(ingest_queue.depth)
+INGEST_QUEUE_DROPPED.set_function(lambda: ingest_queue.dropped)
+DB_BUFFER_PENDING.set_function(lambda: len(sensor_buffer))
+SOCKETIO_CLIENTS.set_function(broadcaster.client_count)
+SOCKETIO_EMITS.set_function(lambda: broadcaster.emits)
 
 @socketio.on('connect')
 def handle_websocket_connect():
     logger.info(f"Client connected: {request.sid}")
+    device_id = request.args.get('device_id', DEFAULT_DEVICE_ID)
+    join_room(broadcaster.add_client(
+        request.sid,
+        device_id,
+        request.args.get('wire', WIRE_JSON),
+        request.args.get('max_rate', type=float)
+    ))
+    state, device_thresholds = devices.snapshot(device_id)
     socketio.emit('initial_state', {
-        "current_state": current_state,
-        "thresholds": thresholds
+        "device_id": device_id,
+        "current_state": state,
+        "thresholds": device_thresholds
     }, room=request.sid)
 
 @socketio.on('disconnect')
 def handle_websocket_disconnect():
+    broadcaster.remove_client(request.sid)
     logger.info(f"Client disconnected: {request.sid}")
 
 @socketio.on('set_mode')
 def handle_set_mode(data):
+    device_id = data.get('device_id', DEFAULT_DEVICE_ID)
     mode = data.get('mode', 'AUTO')
-    logger.info(f"Setting mode to {mode}")
-    mqtt.publish(TOPIC_MODE, mode, retain=True)
+    logger.info(f"Setting mode of {device_id} to {mode}")
+    mqtt.publish(device_topic(device_id, SUBTOPIC_MODE), mode, retain=True)
 
 @socketio.on('set_thresholds')
 def handle_set_thresholds(data):
-    logger.info(f"Setting thresholds to {data}")
-    mqtt.publish(TOPIC_THRESHOLDS, json.dumps(data), retain=True)
+    device_id = data.pop('device_id', DEFAULT_DEVICE_ID)
+    logger.info(f"Setting thresholds of {device_id} to {data}")
+    mqtt.publish(device_topic(device_id, SUBTOPIC_THRESHOLDS), json.dumps(data), retain=True)
 
 @socketio.on('send_command')
 def handle_send_command(data):
+    device_id = data.get('device_id', DEFAULT_DEVICE_ID)
     command = data.get('command')
     if command:
-        logger.info(f"Sending command: {command}")
-        mqtt.publish(TOPIC_COMMAND, command)
+        logger.info(f"Sending command to {device_id}: {command}")
+        mqtt.publish(device_topic(device_id, SUBTOPIC_COMMAND), command)
 
-def get_historical_data(period='day'):
+def get_historical_data(period='day', device_id=DEFAULT_DEVICE_ID):
     now = datetime.now()
     
     if period == 'day':
@@ -274,13 +233,18 @@ def get_historical_data(period='day'):
         start_date = now - timedelta(days=1)
     
     with app.app_context():
-        data = SensorData.query.filter(SensorData.timestamp >= start_date).order_by(SensorData.timestamp).all()
+        data = [
+            SensorData(**row._mapping)
+            for row in sensor_partitions.read_range(storage.reader_session(), device_id, start_date)
+        ]
     return data
 
 def start_gesture_recognition(test_mode=False):
     global gesture_thread
     try:
         logger.info("Starting gesture recognition thread")
+        # Imported here so web-only runs (--app) never load the gesture modules
+        from gesture_workers import start_gesture_thread
         gesture_thread = start_gesture_thread(test_mode)
         logger.info("Gesture recognition thread started")
     except Exception as e:
@@ -289,9 +253,13 @@ def start_gesture_recognition(test_mode=False):
 def init_database():
     with app.app_context():
         db.create_all()
+        sensor_partitions.load(db.engine)
+        sensor_partitions.migrate_legacy_rows(db.session)
+        sensor_partitions.apply_retention(db.engine)
         
-        if not ThresholdSettings.query.first():
+        if not ThresholdSettings.query.filter_by(device_id=DEFAULT_DEVICE_ID).first():
             initial_settings = ThresholdSettings(
+                device_id=DEFAULT_DEVICE_ID,
                 temperature_min=18.0,
                 temperature_max=30.0,
                 soil_moisture_min=30,
@@ -300,13 +268,12 @@ def init_database():
             )
             db.session.add(initial_settings)
             db.session.commit()
-        else:
-            settings = ThresholdSettings.query.first()
-            thresholds["temperature_min"] = settings.temperature_min
-            thresholds["temperature_max"] = settings.temperature_max
-            thresholds["soil_moisture_min"] = settings.soil_moisture_min
-            thresholds["humidity_min"] = settings.humidity_min
-            thresholds["light_level_min"] = settings.light_level_min
+        
+        threshold_cache.load(db.session)
+        
+        if not SensorRollupMinute.query.first() and sensor_partitions.has_rows(db.session):
+            rebuild_rollups(db.session, sensor_partitions.read_all(db.session))
+            db.session.commit()
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Plant Monitoring System')
@@ -319,10 +286,15 @@ if __name__ == '__main__':
     args = parse_arguments()
     
     if args.cam:
-        import gesture_control
-        gesture_control.run_gesture_detection(test_mode=True)
+        import gesture_workers
+        gesture_workers.run_gesture_detection(test_mode=True)
     else:
         init_database()
+        storage.start()
+        sensor_buffer.start()
+        ingest_queue.start()
+        broadcaster.start()
+        automation.start()
         if not args.app:
             start_gesture_recognition()
     
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import logging
+import os
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+# app.py checks this at import time and leaves the MQTT client to this event loop
+os.environ['SERVER_RUNTIME'] = 'asyncio'
+
+import paho.mqtt.client as paho
+import socketio
+import uvicorn
+from a2wsgi import WSGIMiddleware
+
+import app as server
+from broadcaster import WIRE_JSON
+from config import Config
+from devices import DEFAULT_DEVICE_ID, SUBTOPIC_THRESHOLDS, parse_topic
+from extensions import devices, mqtt
+from metrics import MQTT_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+BUFFER_CHECK_INTERVAL = 0.1
+MQTT_MISC_INTERVAL = 1.0
+MQTT_RECONNECT_DELAY = 5.0
+
+
+class LoopEmitter:
+    # Stands in for the Flask-SocketIO object in the schedulers; each emit becomes a task on the loop
+    def __init__(self, sio, loop):
+        self.sio = sio
+        self.loop = loop
+        self._tasks = set()
+
+    def emit(self, event, data, to=None, room=None):
+        task = self.loop.create_task(self.sio.emit(event, data, to=to or room))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class MqttLoop:
+    # Drives the Flask-MQTT paho client from the event loop (paho's external event loop callbacks)
+    # instead of its own network thread
+    def __init__(self, client, loop, config):
+        self.client = client
+        self.loop = loop
+        self.host = config['MQTT_BROKER_URL']
+        self.port = config['MQTT_BROKER_PORT']
+        self.keepalive = config.get('MQTT_KEEPALIVE', 60)
+        self._misc = None
+        self._stopping = False
+
+        # The client settings Flask-MQTT's init_app() applies on the threaded path, which never runs here
+        client_id = config.get('MQTT_CLIENT_ID', '')
+        client._client_id = client_id.encode('utf-8') if isinstance(client_id, str) else client_id
+        client._clean_session = config.get('MQTT_CLEAN_SESSION', True)
+        client._transport = config.get('MQTT_TRANSPORT', 'tcp').lower()
+        client._protocol = config.get('MQTT_PROTOCOL_VERSION', paho.MQTTv311)
+        if config.get('MQTT_LAST_WILL_TOPIC'):
+            client.will_set(
+                config['MQTT_LAST_WILL_TOPIC'],
+                config.get('MQTT_LAST_WILL_MESSAGE'),
+                config.get('MQTT_LAST_WILL_QOS', 0),
+                config.get('MQTT_LAST_WILL_RETAIN', False)
+            )
+        if config.get('MQTT_USERNAME'):
+            client.username_pw_set(config['MQTT_USERNAME'], config.get('MQTT_PASSWORD'))
+        if config.get('MQTT_TLS_ENABLED'):
+            client.tls_set(
+                ca_certs=config.get('MQTT_TLS_CA_CERTS'),
+                certfile=config.get('MQTT_TLS_CERTFILE'),
+                keyfile=config.get('MQTT_TLS_KEYFILE'),
+                cert_reqs=config.get('MQTT_TLS_CERT_REQS', ssl.CERT_REQUIRED),
+                tls_version=config.get('MQTT_TLS_VERSION'),
+                ciphers=config.get('MQTT_TLS_CIPHERS')
+            )
+            if config.get('MQTT_TLS_INSECURE'):
+                client.tls_insecure_set(True)
+
+        # Flask-MQTT's handlers keep mqtt.connected and the subscriptions right across reconnects
+        client.on_connect = mqtt._handle_connect
+        client.on_disconnect = mqtt._handle_disconnect
+
+        # These fire on whichever thread connects or publishes (Flask routes run on worker threads),
+        # so they are handed to the loop; the descriptor is taken now because paho closes the socket right after
+        client.on_socket_open = lambda client, userdata, sock: self._call(self._socket_open, sock.fileno())
+        client.on_socket_close = lambda client, userdata, sock: self._call(self._socket_close, sock.fileno())
+        client.on_socket_register_write = lambda client, userdata, sock: self._call(
+            self.loop.add_writer, sock.fileno(), client.loop_write)
+        client.on_socket_unregister_write = lambda client, userdata, sock: self._call(
+            self.loop.remove_writer, sock.fileno())
+
+    def _call(self, callback, *args):
+        # paho also closes the socket from Client.__del__, which can run after the loop is gone
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _socket_open(self, fd):
+        self.loop.add_reader(fd, self.client.loop_read)
+        self._misc = self.loop.create_task(self._run_misc())
+
+    def _socket_close(self, fd):
+        self.loop.remove_reader(fd)
+        self.loop.remove_writer(fd)
+        if self._misc is not None:
+            self._misc.cancel()
+            self._misc = None
+        if not self._stopping:
+            logger.warning(f"Lost connection to MQTT broker, reconnecting in {MQTT_RECONNECT_DELAY:g}s")
+            self.loop.create_task(self.connect(delay=MQTT_RECONNECT_DELAY))
+
+    async def _run_misc(self):
+        # Keepalive pings and retries, what loop_forever() does between reads
+        while self.client.loop_misc() == paho.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MQTT_MISC_INTERVAL)
+
+    async def connect(self, delay=0):
+        while not self._stopping:
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                # DNS lookup and TCP handshake block, so they run on the default executor
+                await self.loop.run_in_executor(None, self.client.connect, self.host, self.port, self.keepalive)
+                return
+            except OSError as e:
+                logger.error(f"Could not connect to MQTT broker {self.host}:{self.port}: {str(e)}")
+                delay = MQTT_RECONNECT_DELAY
+
+    def disconnect(self):
+        self._stopping = True
+        if self._misc is not None:
+            self._misc.cancel()
+        self.client.disconnect()
+        # Send the DISCONNECT packet now instead of waiting for the writer callback; paho closes the socket after it
+        self.client.loop_write()
+
+
+class AsyncRuntime:
+    def __init__(self, with_gesture=True):
+        self.with_gesture = with_gesture
+        self.loop = None
+        self.sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+        # SQLite has one writer, so one thread serializes every flush and threshold write
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self.http = WSGIMiddleware(server.app, workers=Config.ASYNC_HTTP_WORKERS)
+        self.asgi_app = socketio.ASGIApp(self.sio, other_asgi_app=self.http)
+        self.mqtt_loop = None
+        self.gesture_processes = []
+        self._tasks = []
+
+        self.sio.on('connect', self.handle_connect)
+        self.sio.on('disconnect', self.handle_disconnect)
+        self.sio.on('set_mode', lambda sid, data: server.handle_set_mode(data))
+        self.sio.on('set_thresholds', lambda sid, data: server.handle_set_thresholds(data))
+        self.sio.on('send_command', lambda sid, data: server.handle_send_command(data))
+
+    async def handle_connect(self, sid, environ, auth=None):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        device_id = query.get('device_id', [DEFAULT_DEVICE_ID])[0]
+        try:
+            max_rate = float(query['max_rate'][0]) if 'max_rate' in query else None
+        except ValueError:
+            max_rate = None
+
+        logger.info(f"Client connected: {sid}")
+        room = server.broadcaster.add_client(sid, device_id, query.get('wire', [WIRE_JSON])[0], max_rate)
+        await self.sio.enter_room(sid, room)
+        state, device_thresholds = devices.snapshot(device_id)
+        await self.sio.emit('initial_state', {
+            "device_id": device_id,
+            "current_state": state,
+            "thresholds": device_thresholds
+        }, to=sid)
+
+    async def handle_disconnect(self, sid):
+        server.broadcaster.remove_client(sid)
+        logger.info(f"Client disconnected: {sid}")
+
+    def handle_message(self, client, userdata, message):
+        device_id, subtopic = parse_topic(message.topic)
+        MQTT_MESSAGES.inc(subtopic=subtopic or 'unknown')
+        if subtopic is None:
+            return
+        if subtopic == SUBTOPIC_THRESHOLDS:
+            # Threshold changes are written to the database; every other message only touches memory
+            self.loop.run_in_executor(self.db_executor, server.process_message, message.topic, message.payload)
+        else:
+            server.process_message(message.topic, message.payload)
+
+    async def run_every(self, interval, callback, name):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in {name}: {str(e)}")
+
+    async def flush_sensor_data(self):
+        buffer = server.sensor_buffer
+        last_flush = self.loop.time()
+        while True:
+            await asyncio.sleep(BUFFER_CHECK_INTERVAL)
+            if len(buffer) >= buffer.max_batch_size or self.loop.time() - last_flush >= buffer.flush_interval:
+                last_flush = self.loop.time()
+                await self.loop.run_in_executor(self.db_executor, buffer.flush)
+
+    async def checkpoint_storage(self):
+        # The checkpointer thread's job, on the DB executor so it never overlaps a flush
+        while True:
+            await asyncio.sleep(server.storage.checkpoint_interval)
+            await self.loop.run_in_executor(self.db_executor, server.storage.checkpoint)
+
+    async def relay_gesture_commands(self, source):
+        # Same worker processes as gesture_workers, but their commands go out on the server's own MQTT client
+        from gesture_workers import COMMANDS, TOPIC_COMMAND, worker_command
+
+        process = await asyncio.create_subprocess_exec(
+            *worker_command(source), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+        )
+        self.gesture_processes.append(process)
+        while line := await process.stdout.readline():
+            command = line.decode().strip()
+            if command in COMMANDS:
+                mqtt.publish(TOPIC_COMMAND, command)
+                logger.info(f"Camera {source}: sent {command}")
+        await process.wait()
+        logger.info(f"Camera {source} worker exited with code {process.returncode}")
+
+    def start_tasks(self):
+        broadcaster = server.broadcaster
+        automation = server.automation
+        broadcaster.socketio = LoopEmitter(self.sio, self.loop)
+
+        self._tasks.append(self.loop.create_task(
+            self.run_every(broadcaster.tick_interval, broadcaster.tick, 'broadcast scheduler')))
+        self._tasks.append(self.loop.create_task(self.flush_sensor_data()))
+        if server.storage.durable:
+            self._tasks.append(self.loop.create_task(self.checkpoint_storage()))
+        if automation.enabled:
+            for device_id in devices.device_ids():
+                automation.notify(device_id)
+            self._tasks.append(self.loop.create_task(
+                self.run_every(automation.tick_interval, automation.tick, 'automation engine')))
+
+        if self.with_gesture:
+            from gesture_workers import CAMERA_SOURCES
+            for source in CAMERA_SOURCES:
+                self._tasks.append(self.loop.create_task(self.relay_gesture_commands(source)))
+
+    async def serve(self, host, port):
+        self.loop = asyncio.get_running_loop()
+        server.sensor_buffer.autostart = False
+        mqtt.client.on_message = self.handle_message
+        self.mqtt_loop = MqttLoop(mqtt.client, self.loop, server.app.config)
+
+        # Connecting runs as a task so the web server comes up even while the broker is unreachable
+        self._tasks.append(self.loop.create_task(self.mqtt_loop.connect()))
+        self.start_tasks()
+
+        config = uvicorn.Config(self.asgi_app, host=host, port=port, loop='asyncio', ws='wsproto', lifespan='off')
+        try:
+            await uvicorn.Server(config).serve()
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        for process in self.gesture_processes:
+            if process.returncode is None:
+                process.stdin.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.mqtt_loop.disconnect()
+        await self.loop.run_in_executor(self.db_executor, server.sensor_buffer.flush)
+        self.db_executor.shutdown()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Plant Monitoring System on a single asyncio event loop')
+    parser.add_argument('--app', action='store_true', help='Run only the web application without gesture control')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    server.init_database()
+    asyncio.run(AsyncRuntime(with_gesture=not args.app).serve(args.host, args.port))
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from devices import SENSOR_KEYS, THRESHOLD_KEYS, SUBTOPIC_COMMAND, device_topic
+from metrics import AUTOMATION_COMMANDS
+
+logger = logging.getLogger(__name__)
+
+TEMPERATURE, HUMIDITY, SOIL_MOISTURE, LIGHT_LEVEL = range(len(SENSOR_KEYS))
+TEMPERATURE_MIN, TEMPERATURE_MAX, SOIL_MOISTURE_MIN, HUMIDITY_MIN, LIGHT_LEVEL_MIN = range(len(THRESHOLD_KEYS))
+
+ALERTS = ['temperature_low', 'temperature_high', 'humidity_low']
+
+
+class AutomationEngine:
+    def __init__(self, socketio, registry, mqtt, broadcaster, app=None):
+        self.socketio = socketio
+        self.registry = registry
+        self.mqtt = mqtt
+        self.broadcaster = broadcaster
+        self.enabled = False
+        self.tick_interval = 0.2
+        self.soil_hysteresis = 5
+        self.light_hysteresis = 5
+        self.min_command_interval = 60.0
+        self.pump_max_run = 3.0
+        self.ticks = 0
+        self.commands = 0
+        self._slots = {}
+        self._device_ids = []
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._allocate(64)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AUTOMATION_ENABLED', self.enabled)
+        self.tick_interval = app.config.get('AUTOMATION_TICK_MS', 200) / 1000.0
+        self.soil_hysteresis = app.config.get('AUTOMATION_SOIL_HYSTERESIS', self.soil_hysteresis)
+        self.light_hysteresis = app.config.get('AUTOMATION_LIGHT_HYSTERESIS', self.light_hysteresis)
+        self.min_command_interval = app.config.get('AUTOMATION_MIN_COMMAND_INTERVAL', self.min_command_interval)
+        self.pump_max_run = app.config.get('AUTOMATION_PUMP_MAX_RUN', self.pump_max_run)
+        app.extensions['automation'] = self
+
+    def _allocate(self, capacity):
+        # One row per device; arrays double when the fleet outgrows them
+        old = getattr(self, 'sensors', None)
+        count = len(self._device_ids)
+
+        def grow(array, shape, fill, dtype):
+            grown = np.full(shape, fill, dtype=dtype)
+            if array is not None:
+                grown[:count] = array[:count]
+            return grown
+
+        self.sensors = grow(old, (capacity, len(SENSOR_KEYS)), np.nan, np.float64)
+        self.thresholds = grow(getattr(self, 'thresholds', None), (capacity, len(THRESHOLD_KEYS)), np.nan, np.float64)
+        self.ready = grow(getattr(self, 'ready', None), capacity, False, bool)
+        self.auto = grow(getattr(self, 'auto', None), capacity, False, bool)
+        self.pump_on = grow(getattr(self, 'pump_on', None), capacity, False, bool)
+        self.light_on = grow(getattr(self, 'light_on', None), capacity, False, bool)
+        self.pump_since = grow(getattr(self, 'pump_since', None), capacity, np.inf, np.float64)
+        self.last_pump_command = grow(getattr(self, 'last_pump_command', None), capacity, -np.inf, np.float64)
+        self.last_light_command = grow(getattr(self, 'last_light_command', None), capacity, -np.inf, np.float64)
+        self.alerts = grow(getattr(self, 'alerts', None), (capacity, len(ALERTS)), False, bool)
+
+    def notify(self, device_id):
+        # Called on every state or threshold change; the work happens once per tick for all changed devices
+        if not self.enabled:
+            return
+        with self._lock:
+            self._dirty.add(device_id)
+
+    def _slot(self, device_id):
+        slot = self._slots.get(device_id)
+        if slot is None:
+            slot = len(self._device_ids)
+            if slot >= len(self.ready):
+                self._allocate(len(self.ready) * 2)
+            self._slots[device_id] = slot
+            self._device_ids.append(device_id)
+        return slot
+
+    def _refresh(self, device_ids, now):
+        for device_id in device_ids:
+            device = self.registry.get(device_id, create=False)
+            if device is None:
+                continue
+            state, thresholds = device.snapshot()
+            slot = self._slot(device_id)
+
+            self.sensors[slot] = [state.get(key, np.nan) for key in SENSOR_KEYS]
+            self.thresholds[slot] = [thresholds.get(key, np.nan) for key in THRESHOLD_KEYS]
+            # Defaults are zeros until a full reading arrives, and a dry-looking zero must not start the pump
+            self.ready[slot] = 'timestamp' in state
+            self.auto[slot] = state.get('mode') == 'AUTO'
+
+            pump_on = state.get('pump_status') == 'ON'
+            if pump_on and not self.pump_on[slot]:
+                self.pump_since[slot] = now
+            elif not pump_on:
+                self.pump_since[slot] = np.inf
+            self.pump_on[slot] = pump_on
+            self.light_on[slot] = state.get('light_status') == 'ON'
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if dirty:
+            self._refresh(dirty, now)
+
+        count = len(self._device_ids)
+        if not count:
+            return 0
+
+        sensors = self.sensors[:count]
+        thresholds = self.thresholds[:count]
+        active = self.ready[:count] & self.auto[:count]
+        # Views into the full arrays, so the assignments below update the engine state in place
+        pump_on = self.pump_on[:count]
+        light_on = self.light_on[:count]
+        soil = sensors[:, SOIL_MOISTURE]
+        light = sensors[:, LIGHT_LEVEL]
+        pump_allowed = now - self.last_pump_command[:count] >= self.min_command_interval
+        light_allowed = now - self.last_light_command[:count] >= self.min_command_interval
+
+        # Switch on below the minimum, switch off only once the reading clears minimum + hysteresis.
+        # Every switch waits out min_command_interval, except the pump run-time cap: that is a safety cut-off
+        soil_min = thresholds[:, SOIL_MOISTURE_MIN]
+        light_min = thresholds[:, LIGHT_LEVEL_MIN]
+        pump_start = active & ~pump_on & (soil < soil_min) & pump_allowed
+        pump_stop = active & pump_on & (
+            ((soil >= soil_min + self.soil_hysteresis) & pump_allowed)
+            | (now - self.pump_since[:count] >= self.pump_max_run)
+        )
+        light_start = active & ~light_on & (light < light_min) & light_allowed
+        light_stop = active & light_on & (light >= light_min + self.light_hysteresis) & light_allowed
+
+        sent = 0
+        sent += self._send(np.flatnonzero(pump_start), 'PUMP_ON')
+        sent += self._send(np.flatnonzero(pump_stop), 'PUMP_OFF')
+        sent += self._send(np.flatnonzero(light_start), 'LIGHT_ON')
+        sent += self._send(np.flatnonzero(light_stop), 'LIGHT_OFF')
+
+        # Until the board confirms with a status message, assume the command took effect
+        pump_on[pump_start] = True
+        pump_on[pump_stop] = False
+        self.pump_since[:count][pump_start] = now
+        self.pump_since[:count][pump_stop] = np.inf
+        self.last_pump_command[:count][pump_start | pump_stop] = now
+        light_on[light_start] = True
+        light_on[light_stop] = False
+        self.last_light_command[:count][light_start | light_stop] = now
+
+        self._update_alerts(count)
+        self.ticks += 1
+        self.commands += sent
+        return sent
+
+    def _send(self, slots, command):
+        for slot in slots.tolist():
+            device_id = self._device_ids[slot]
+            self.mqtt.publish(device_topic(device_id, SUBTOPIC_COMMAND), command)
+            AUTOMATION_COMMANDS.inc(command=command)
+            logger.info(f"Automation sent {command} to {device_id}")
+        return len(slots)
+
+    def _update_alerts(self, count):
+        sensors = self.sensors[:count]
+        thresholds = self.thresholds[:count]
+        alerts = np.stack([
+            sensors[:, TEMPERATURE] < thresholds[:, TEMPERATURE_MIN],
+            sensors[:, TEMPERATURE] > thresholds[:, TEMPERATURE_MAX],
+            sensors[:, HUMIDITY] < thresholds[:, HUMIDITY_MIN]
+        ], axis=1) & self.ready[:count, np.newaxis]
+
+        changed = np.flatnonzero((alerts != self.alerts[:count]).any(axis=1))
+        self.alerts[:count] = alerts
+        for slot in changed.tolist():
+            active = [name for name, flag in zip(ALERTS, alerts[slot]) if flag]
+            self.broadcaster.publish(self._device_ids[slot], {'alerts': active})
+
+    def start(self):
+        if self._started or not self.enabled:
+            return
+        self._started = True
+        # Evaluate every known device once so automation does not wait for the first change after startup
+        for device_id in self.registry.device_ids():
+            self.notify(device_id)
+        self.socketio.start_background_task(self._run)
+        logger.info(f"Automation engine started (tick {int(self.tick_interval * 1000)} ms)")
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick_interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error evaluating automation rules: {str(e)}")
@@ -0,0 +1,121 @@
+import argparse
+import os
+import statistics
+import threading
+import time
+
+# The benchmark feeds messages straight into the MQTT callback, so the real client must not need a broker
+os.environ.setdefault('MQTT_CONNECT_ASYNC', 'true')
+os.environ.setdefault('MQTT_BROKER_URL', '127.0.0.1')
+
+import paho.mqtt.client as paho
+
+import app as server
+from extensions import db
+from fleet_simulator import FleetSimulator
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def count_rows():
+    with server.app.app_context():
+        return server.sensor_partitions.count_rows(db.session)
+
+
+class LatencyProbe:
+    # A Socket.IO test client subscribed to every device; readings are matched to their send time by temperature
+    def __init__(self, poll_interval=0.002):
+        self.client = server.socketio.test_client(server.app, query_string='device_id=*')
+        self.client.get_received()
+        self.poll_interval = poll_interval
+        self.sent = {}
+        self.latencies = []
+        self.events = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def on_reading(self, device_id, reading):
+        self.sent[(device_id, reading['temperature'])] = time.perf_counter()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._collect()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._collect()
+            time.sleep(self.poll_interval)
+
+    def _collect(self):
+        now = time.perf_counter()
+        for event in self.client.get_received():
+            if event['name'] != 'state_delta':
+                continue
+            self.events += 1
+            for device_id, changes in event['args'][0]['devices'].items():
+                sent_at = self.sent.pop((device_id, changes.get('temperature')), None)
+                if sent_at is not None:
+                    self.latencies.append(now - sent_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end ingest benchmark: simulated fleet -> MQTT callback -> DB / Socket.IO')
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=1.0, help='Readings per second per device (0 = as fast as possible)')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--no-metric-topics', action='store_true', help='Only publish plant/<id>/data')
+    args = parser.parse_args()
+
+    server.init_database()
+    rows_before = count_rows()
+    server.sensor_buffer.start()
+    server.ingest_queue.start()
+    server.broadcaster.start()
+
+    probe = LatencyProbe()
+    probe.start()
+
+    def publish(topic, payload):
+        message = paho.MQTTMessage(topic=topic.encode())
+        message.payload = payload.encode()
+        server.handle_message(None, None, message)
+
+    simulator = FleetSimulator(args.devices, args.rate, not args.no_metric_topics, tagged=True)
+    started = time.perf_counter()
+    publish_time = simulator.run(publish, args.duration, on_reading=probe.on_reading)
+    server.ingest_queue.join()
+    ingest_time = time.perf_counter() - started
+
+    # Let the last coalesced broadcast go out, then write whatever is still buffered
+    time.sleep(server.broadcaster.tick_interval * 3)
+    probe.stop()
+    server.sensor_buffer.flush()
+    rows = count_rows() - rows_before
+
+    stats = server.ingest_queue.stats()
+    latencies_ms = [latency * 1000 for latency in probe.latencies]
+
+    print(f"devices {args.devices}, {args.rate:g} readings/s each, {args.duration:g}s, "
+          f"metric topics {'off' if args.no_metric_topics else 'on'}")
+    print(f"published      {simulator.published} messages ({simulator.readings} readings) "
+          f"at {simulator.published / publish_time:.0f} msg/s")
+    print(f"processed      {stats['processed']} messages at {stats['processed'] / ingest_time:.0f} msg/s sustained, "
+          f"{stats['dropped']} dropped, max queue lag {stats['lag_seconds']['max'] * 1000:.1f} ms")
+    print(f"db rows        {rows} written ({rows / ingest_time:.0f} rows/s)")
+    print(f"socket.io      {probe.events} state_delta events, {len(latencies_ms)} readings matched")
+    if latencies_ms:
+        print(f"latency ms     p50 {statistics.median(latencies_ms):.1f}  p90 {percentile(latencies_ms, 0.9):.1f}  "
+              f"p99 {percentile(latencies_ms, 0.99):.1f}  max {max(latencies_ms):.1f}")
+
+
+if __name__ == '__main__':
+    main()
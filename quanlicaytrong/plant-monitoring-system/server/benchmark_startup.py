@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VISION_MODULES = ['cv2', 'mediapipe', 'jax', 'matplotlib']
+
+# Runs in a fresh interpreter per sample, so every import is cold in sys.modules (the OS file cache stays warm)
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+except ImportError:
+    rss_mb = None
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': rss_mb,
+    'vision': [name for name in {vision} if name in sys.modules]
+}}))
+"""
+
+
+def probe(module, env):
+    code = PROBE.format(module=module, vision=VISION_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=SERVER_DIR, env=env, capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {'error': error[-1] if error else f'exit code {result.returncode}'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time and peak RSS of the server modules')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per module')
+    parser.add_argument('--modules', nargs='+', default=['app', 'gesture_workers', 'gesture_control'])
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Importing app creates the MQTT client; connecting in the background keeps the broker out of the timing
+    env.setdefault('MQTT_CONNECT_ASYNC', 'true')
+    env.setdefault('MQTT_BROKER_URL', '127.0.0.1')
+
+    print(f"{'module':<18} {'median s':>9} {'min s':>7} {'peak RSS MB':>12}  vision modules loaded")
+    for module in args.modules:
+        samples = [probe(module, env) for _ in range(args.runs)]
+        failed = [sample for sample in samples if 'error' in sample]
+        if failed:
+            print(f"{module:<18} failed: {failed[0]['error']}")
+            continue
+
+        seconds = [sample['seconds'] for sample in samples]
+        rss = [sample['rss_mb'] for sample in samples if sample['rss_mb'] is not None]
+        rss_text = f"{statistics.median(rss):.0f}" if rss else '-'
+        vision = ', '.join(samples[-1]['vision']) or 'none'
+        print(f"{module:<18} {statistics.median(seconds):>9.3f} {min(seconds):>7.3f} {rss_text:>12}  {vision}")
+
+
+if __name__ == '__main__':
+    main()
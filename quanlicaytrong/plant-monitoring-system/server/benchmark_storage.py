@@ -0,0 +1,106 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from chunk_store import SensorChunkStore
+from config import Config
+from devices import SENSOR_KEYS
+from fleet_simulator import SimulatedDevice
+from models import SensorChunk, SensorData
+from partitions import SensorPartitions
+
+STORES = {'partitions': SensorPartitions, 'chunks': SensorChunkStore}
+
+
+def readings(device_count, days, interval):
+    devices = [SimulatedDevice(f'sim{index:04d}', seed=index) for index in range(device_count)]
+    start = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    for step in range(int(days * 86400 / interval)):
+        timestamp = start + timedelta(seconds=step * interval)
+        for device in devices:
+            reading = device.read()
+            reading['device_id'] = device.device_id
+            reading['timestamp'] = timestamp
+            yield reading
+
+
+def run(name, args, directory):
+    path = os.path.join(directory, f'{name}.db')
+    engine = create_engine(f'sqlite:///{path}')
+    SensorData.__table__.create(engine)
+    SensorChunk.__table__.create(engine)
+
+    app = Flask(__name__)
+    app.config['SENSOR_CHUNK_SECONDS'] = args.chunk_seconds
+    store = STORES[name](app)
+
+    # Same batching as the ingest buffer: one transaction per flush
+    started = time.perf_counter()
+    batch = []
+    with Session(engine) as session:
+        for reading in readings(args.devices, args.days, args.interval):
+            batch.append(reading)
+            if len(batch) >= Config.DB_FLUSH_BATCH_SIZE:
+                store.insert(session, batch)
+                session.commit()
+                batch = []
+        if batch:
+            store.insert(session, batch)
+            session.commit()
+    write_seconds = time.perf_counter() - started
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql('VACUUM')
+    size = os.path.getsize(path)
+
+    start_date = datetime.now() - timedelta(days=args.days + 1)
+    with Session(engine) as session:
+        count = store.count_rows(session)
+
+        started = time.perf_counter()
+        rows = sum(1 for _ in store.read_range(session, 'sim0000', start_date))
+        row_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        epochs, values = store.read_columns(session, 'sim0000', start_date, metrics=SENSOR_KEYS)
+        column_seconds = time.perf_counter() - started
+
+    engine.dispose()
+    return {
+        'count': count,
+        'bytes': size,
+        'write': write_seconds,
+        'rows': rows,
+        'row_scan': row_seconds,
+        'column_scan': column_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare disk use and scan speed of the raw sensor stores')
+    parser.add_argument('--devices', type=int, default=2)
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--interval', type=float, default=5, help='Seconds between readings of one device')
+    parser.add_argument('--chunk-seconds', type=int, default=Config.SENSOR_CHUNK_SECONDS)
+    parser.add_argument('--stores', nargs='+', default=list(STORES), choices=list(STORES))
+    args = parser.parse_args()
+
+    print(f"devices {args.devices}, {args.days:g} days at one reading per {args.interval:g}s each")
+    print(f"{'store':<11} {'readings':>9} {'MB':>7} {'B/reading':>10} {'write s':>8} "
+          f"{'rows/s':>10} {'columns/s':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.stores:
+            result = run(name, args, directory)
+            print(f"{name:<11} {result['count']:>9} {result['bytes'] / 1e6:>7.2f} "
+                  f"{result['bytes'] / max(result['count'], 1):>10.1f} {result['write']:>8.2f} "
+                  f"{result['rows'] / result['row_scan']:>10.0f} {result['rows'] / result['column_scan']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+
+from devices import SENSOR_KEYS
+from wire_format import encode_readings
+
+logger = logging.getLogger(__name__)
+
+ALL_DEVICES = '*'
+WIRE_JSON = 'json'
+WIRE_COLUMNAR = 'columnar'
+
+
+class ClientGroup:
+    def __init__(self, device_id, interval, wire):
+        self.device_id = device_id
+        self.interval = interval
+        self.wire = wire
+        self.room = f'delta:{device_id}:{int(interval * 1000)}:{wire}'
+        self.members = set()
+        self.pending = {}
+        self.last_emit = 0.0
+
+
+class BroadcastScheduler:
+    def __init__(self, socketio, registry, app=None):
+        self.socketio = socketio
+        self.registry = registry
+        self.tick_interval = 0.2
+        self.max_client_rate = 0
+        self.ticks = 0
+        self.emits = 0
+        self._pending = {}
+        self._groups = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._started = False
+        # Set in the ingest process of cluster.py: every tick's changes also go out to the web workers
+        self.bus = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.tick_interval = app.config.get('BROADCAST_TICK_MS', 200) / 1000.0
+        self.max_client_rate = app.config.get('BROADCAST_MAX_CLIENT_RATE', self.max_client_rate)
+        app.extensions['broadcaster'] = self
+
+    def publish(self, device_id, changes):
+        if not changes:
+            return
+        with self._lock:
+            pending = self._pending.get(device_id)
+            if pending is None:
+                self._pending[device_id] = dict(changes)
+            else:
+                pending.update(changes)
+
+    def client_interval(self, max_rate=None):
+        interval = self.tick_interval
+        if self.max_client_rate:
+            interval = max(interval, 1.0 / self.max_client_rate)
+        if max_rate:
+            interval = max(interval, 1.0 / max_rate)
+        # Round to whole ticks so clients with similar limits share one group
+        ticks = max(1, round(interval / self.tick_interval))
+        return ticks * self.tick_interval
+
+    def add_client(self, sid, device_id=ALL_DEVICES, wire=WIRE_JSON, max_rate=None):
+        key = (device_id or ALL_DEVICES, self.client_interval(max_rate), wire)
+        with self._lock:
+            self._remove_locked(sid)
+            group = self._groups.get(key)
+            if group is None:
+                group = ClientGroup(*key)
+                self._groups[key] = group
+            group.members.add(sid)
+            self._clients[sid] = key
+        return group.room
+
+    def remove_client(self, sid):
+        with self._lock:
+            return self._remove_locked(sid)
+
+    def _remove_locked(self, sid):
+        key = self._clients.pop(sid, None)
+        if key is None:
+            return None
+        group = self._groups[key]
+        group.members.discard(sid)
+        if not group.members:
+            del self._groups[key]
+        return group.room
+
+    def client_count(self):
+        return len(self._clients)
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            delta, self._pending = self._pending, {}
+            groups = list(self._groups.values())
+
+        if delta and self.bus is not None:
+            self.bus.publish({'type': 'state', 'devices': delta})
+
+        if delta:
+            for group in groups:
+                if group.device_id == ALL_DEVICES:
+                    for device_id, changes in delta.items():
+                        group.pending.setdefault(device_id, {}).update(changes)
+                elif group.device_id in delta:
+                    group.pending.setdefault(group.device_id, {}).update(delta[group.device_id])
+
+        emitted = 0
+        for group in groups:
+            # Small tolerance so a group whose interval equals the tick is not skipped by timer jitter
+            if group.pending and now - group.last_emit >= group.interval - self.tick_interval / 2:
+                pending, group.pending = group.pending, {}
+                group.last_emit = now
+                emitted += self._emit(group, pending)
+
+        self.ticks += 1
+        self.emits += emitted
+        return emitted
+
+    def _emit(self, group, delta):
+        if group.wire != WIRE_COLUMNAR:
+            self.socketio.emit('state_delta', {'devices': delta}, to=group.room)
+            return 1
+
+        emitted = 0
+        readings = []
+        others = {}
+        for device_id, changes in delta.items():
+            if any(key in changes for key in SENSOR_KEYS):
+                state = self.registry.get(device_id).state
+                readings.append((device_id, {key: state[key] for key in SENSOR_KEYS}))
+            rest = {key: value for key, value in changes.items() if key not in SENSOR_KEYS}
+            if rest:
+                others[device_id] = rest
+
+        if readings:
+            self.socketio.emit('sensor_frame', encode_readings(readings), to=group.room)
+            emitted += 1
+        if others:
+            self.socketio.emit('state_delta', {'devices': others}, to=group.room)
+            emitted += 1
+        return emitted
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self.socketio.start_background_task(self._run)
+        logger.info(f"Broadcast scheduler started (tick {int(self.tick_interval * 1000)} ms)")
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick_interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error broadcasting state changes: {str(e)}")
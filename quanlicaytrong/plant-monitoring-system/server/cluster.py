@@ -0,0 +1,203 @@
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from message_bus import LocalBus, UnixSocketClient, UnixSocketHub
+
+logger = logging.getLogger(__name__)
+
+# How soon web workers see a monthly partition the ingest process has just created
+PARTITION_REFRESH_INTERVAL = 5
+WORKER_RESTART_DELAY = 2.0
+
+
+def device_snapshot(registry):
+    devices = {}
+    for device in registry:
+        state, thresholds = device.snapshot()
+        devices[device.device_id] = {'state': state, 'thresholds': thresholds}
+    return {'type': 'snapshot', 'devices': devices}
+
+
+class StateSubscriber:
+    # Web side: keeps this process's device registry in step with the ingest process and feeds the local broadcaster
+    def __init__(self, registry, broadcaster, threshold_cache):
+        self.registry = registry
+        self.broadcaster = broadcaster
+        self.threshold_cache = threshold_cache
+        self.updates = 0
+
+    def handle(self, message):
+        if message.get('type') == 'snapshot':
+            for device_id, snapshot in message['devices'].items():
+                self.apply(device_id, snapshot['state'], snapshot['thresholds'])
+            logger.info(f"Synchronized {len(message['devices'])} devices from the ingest process")
+        elif message.get('type') == 'state':
+            for device_id, changes in message['devices'].items():
+                self.apply(device_id, changes, changes.get('thresholds'))
+                # Changes from this process's own broadcaster (the in-process bus) have already gone out
+                if self.broadcaster.bus is None:
+                    self.broadcaster.publish(device_id, changes)
+                self.updates += 1
+
+    def apply(self, device_id, changes, thresholds=None):
+        device = self.registry.get(device_id)
+        device.update({key: value for key, value in changes.items() if key in device.state})
+        if thresholds:
+            self.threshold_cache.refresh(device_id, thresholds)
+
+
+class CommandForwarder:
+    # Web side: stands in for mqtt.publish and the threshold writer, since only the ingest process
+    # holds a broker connection and writes the database
+    def __init__(self, bus):
+        self.bus = bus
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        sent = self.bus.publish({'type': 'mqtt', 'topic': topic, 'payload': payload, 'qos': qos, 'retain': retain})
+        return (0 if sent else 4), None
+
+    def save_thresholds(self, device_id, values):
+        if not self.bus.publish({'type': 'thresholds', 'device_id': device_id, 'values': values}):
+            raise RuntimeError("Not connected to the ingest process, thresholds were not saved")
+
+
+def handle_request(server, message):
+    # Ingest side: what web workers forward
+    if message.get('type') == 'mqtt':
+        server.mqtt.publish(
+            message['topic'], message['payload'], qos=message.get('qos', 0), retain=message.get('retain', False)
+        )
+    elif message.get('type') == 'thresholds':
+        device_thresholds = server.threshold_cache.update(message['device_id'], message['values'])
+        if device_thresholds is not None:
+            # Goes back out to every worker as a state delta
+            server.publish_changes(message['device_id'], {'thresholds': device_thresholds})
+
+
+def run_web(server, args):
+    with server.app.app_context():
+        server.sensor_partitions.load(server.db.engine)
+        server.threshold_cache.load(server.db.session)
+
+    bus = UnixSocketClient(server.Config.MESSAGE_BUS_PATH)
+    subscriber = StateSubscriber(server.devices, server.broadcaster, server.threshold_cache)
+    bus.subscribe(subscriber.handle)
+    forwarder = CommandForwarder(bus)
+    server.mqtt.publish = forwarder.publish
+    server.threshold_cache.writer = forwarder.save_thresholds
+    bus.start()
+    server.broadcaster.start()
+    server.socketio.start_background_task(refresh_partitions, server)
+
+    logger.info(f"Web worker {os.getpid()} serving on port {args.port}")
+    server.socketio.run(server.app, host=args.host, port=args.port, allow_unsafe_werkzeug=True)
+
+
+def refresh_partitions(server):
+    while True:
+        server.socketio.sleep(PARTITION_REFRESH_INTERVAL)
+        try:
+            with server.app.app_context():
+                server.sensor_partitions.refresh(server.db.engine)
+        except Exception as e:
+            logger.error(f"Error refreshing sensor data partitions: {str(e)}")
+
+
+def start_ingest(server, bus):
+    server.init_database()
+    bus.greeting = lambda: device_snapshot(server.devices)
+    bus.subscribe(lambda message: handle_request(server, message))
+    bus.start()
+
+    server.broadcaster.bus = bus
+    server.storage.start()
+    server.sensor_buffer.start()
+    server.ingest_queue.start()
+    server.broadcaster.start()
+    server.automation.start()
+
+
+def spawn_worker(args, port):
+    command = [sys.executable, os.path.abspath(__file__), '--role', 'web', '--host', args.host, '--port', str(port)]
+    return subprocess.Popen(command)
+
+
+def run_ingest(server, args):
+    if server.Config.MESSAGE_BUS == 'local' or args.workers < 1:
+        # One process (MESSAGE_BUS=local or --workers 0): the ingest half and the dashboards share the in-process bus
+        bus = LocalBus()
+        start_ingest(server, bus)
+        bus.subscribe(StateSubscriber(server.devices, server.broadcaster, server.threshold_cache).handle)
+        if not args.app:
+            server.start_gesture_recognition()
+        server.socketio.run(server.app, host=args.host, port=args.port, allow_unsafe_werkzeug=True)
+        return
+
+    if not server.storage.durable:
+        logger.warning("Web workers cannot see an in-memory database; set STORAGE_PROFILE=durable")
+
+    bus = UnixSocketHub(server.Config.MESSAGE_BUS_PATH)
+    # No dashboards connect here, so the broadcaster ticks at the bus flush rate; each web worker's own
+    # broadcaster keeps BROADCAST_TICK_MS for its clients
+    server.broadcaster.tick_interval = server.Config.MESSAGE_BUS_FLUSH_MS / 1000.0
+    start_ingest(server, bus)
+    if not args.app:
+        server.start_gesture_recognition()
+
+    ports = [args.port + index for index in range(args.workers)]
+    workers = {port: spawn_worker(args, port) for port in ports}
+    logger.info(f"Started {len(workers)} web workers on ports {ports[0]}-{ports[-1]}")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        while not stopping:
+            time.sleep(WORKER_RESTART_DELAY)
+            for port, process in workers.items():
+                if process.poll() is not None:
+                    logger.error(f"Web worker on port {port} exited with code {process.returncode}, restarting it")
+                    workers[port] = spawn_worker(args, port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        bus.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Plant Monitoring System as one ingest process and several web worker processes'
+    )
+    parser.add_argument('--role', choices=['ingest', 'web'], default='ingest', help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, default=None, help='Web worker processes (default WEB_WORKERS)')
+    parser.add_argument('--app', action='store_true', help='Run without gesture control')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001, help='Port of the first web worker; the others follow it')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    # config.py and app.py read these at import time. Web workers read what the ingest process writes,
+    # which needs a database file rather than :memory:
+    os.environ['SERVER_ROLE'] = args.role
+    os.environ.setdefault('STORAGE_PROFILE', 'durable')
+    import app as server
+
+    if args.role == 'web':
+        run_web(server, args)
+    else:
+        if args.workers is None:
+            args.workers = server.Config.WEB_WORKERS
+        run_ingest(server, args)
@@ -1,21 +1,88 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard-to-guess-string'
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1', 't')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-    
-    # Option 2: Use file-based SQLite with absolute path
-    # basedir = os.path.abspath(os.path.dirname(__file__))
-    # db_path = os.path.join(basedir, 'plant_monitor.db')
-    # SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
-    
-    # Option 3: Use the database path from environment variable
-    # SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///plant_monitor.db'
+    # memory keeps everything in RAM and loses it on restart; durable is a WAL-mode SQLite file (see storage.py)
+    STORAGE_PROFILE = os.environ.get('STORAGE_PROFILE') or 'memory'
+    if STORAGE_PROFILE == 'durable':
+        basedir = os.path.abspath(os.path.dirname(__file__))
+        SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(basedir, 'plant_monitor.db')}"
+        # SQLite allows one writer at a time, so writes queue for a single connection; reads use their own pool
+        SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30}
+    else:
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB') or 64)
+    SQLITE_MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB') or 256)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_READER_POOL_SIZE = int(os.environ.get('SQLITE_READER_POOL_SIZE') or 8)
+    SQLITE_CHECKPOINT_INTERVAL = float(os.environ.get('SQLITE_CHECKPOINT_INTERVAL') or 30)
+    # WAL pages before SQLite checkpoints on its own during a commit, in case the checkpointer falls behind
+    SQLITE_WAL_AUTOCHECKPOINT = int(os.environ.get('SQLITE_WAL_AUTOCHECKPOINT') or 10000)
+    SQLITE_WAL_LIMIT_MB = int(os.environ.get('SQLITE_WAL_LIMIT_MB') or 64)
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DB_FLUSH_BATCH_SIZE = int(os.environ.get('DB_FLUSH_BATCH_SIZE') or 500)
+    DB_FLUSH_INTERVAL = float(os.environ.get('DB_FLUSH_INTERVAL') or 5)
+    DB_BUFFER_MAX_ROWS = int(os.environ.get('DB_BUFFER_MAX_ROWS') or 50000)
+    # Number of monthly sensor partitions to keep, including the current one (0 keeps everything)
+    SENSOR_RETENTION_MONTHS = int(os.environ.get('SENSOR_RETENTION_MONTHS') or 0)
+    # Days of rollup buckets kept per resolution (0 keeps them forever); /api/history needs a day of minutes
+    # and 30 days of days, so the defaults leave room for resolution= overrides
+    ROLLUP_RETENTION_DAYS = {
+        'minute': int(os.environ.get('ROLLUP_RETENTION_MINUTE_DAYS') or 7),
+        'hour': int(os.environ.get('ROLLUP_RETENTION_HOUR_DAYS') or 90),
+        'day': int(os.environ.get('ROLLUP_RETENTION_DAY_DAYS') or 730),
+        'month': int(os.environ.get('ROLLUP_RETENTION_MONTH_DAYS') or 0)
+    }
+    # Seconds between retention passes on the database writer
+    RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL') or 3600)
+    # Raw readings storage: 'partitions' (one row per reading in monthly tables) or 'chunks' (compressed per-device chunks)
+    SENSOR_STORE = os.environ.get('SENSOR_STORE') or 'partitions'
+    SENSOR_CHUNK_SECONDS = int(os.environ.get('SENSOR_CHUNK_SECONDS') or 7200)
+    # Hours of full-resolution readings kept in the shared memory ring buffer (0 turns it off)
+    RECENT_READINGS_HOURS = float(os.environ.get('RECENT_READINGS_HOURS') or 6)
+    # Shortest expected seconds between readings of one device; the ring holds hours * 3600 / interval readings per device
+    RECENT_READINGS_INTERVAL = float(os.environ.get('RECENT_READINGS_INTERVAL') or 1)
+    RECENT_READINGS_MAX_DEVICES = int(os.environ.get('RECENT_READINGS_MAX_DEVICES') or 64)
+    RECENT_READINGS_PATH = os.environ.get('RECENT_READINGS_PATH') or os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'plant-monitor-recent.ring'
+    )
+    BROADCAST_TICK_MS = int(os.environ.get('BROADCAST_TICK_MS') or 200)
+    # Upper bound on Socket.IO updates per second for any client (0 means once per tick)
+    BROADCAST_MAX_CLIENT_RATE = float(os.environ.get('BROADCAST_MAX_CLIENT_RATE') or 0)
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS') or 4)
+    INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE') or 10000)
+    # What to do when the ingest queue is full: drop_oldest, drop_newest or block (for INGEST_BLOCK_TIMEOUT seconds)
+    INGEST_OVERFLOW_POLICY = os.environ.get('INGEST_OVERFLOW_POLICY') or 'drop_oldest'
+    INGEST_BLOCK_TIMEOUT = float(os.environ.get('INGEST_BLOCK_TIMEOUT') or 0.5)
+    LONG_POLL_MAX_WAIT = float(os.environ.get('LONG_POLL_MAX_WAIT') or 60)
+    # threading (python app.py) or asyncio (python async_runtime.py, which sets this itself)
+    SERVER_RUNTIME = os.environ.get('SERVER_RUNTIME') or 'threading'
+    # Threads serving Flask routes in the asyncio runtime; the event loop itself never runs blocking code
+    ASYNC_HTTP_WORKERS = int(os.environ.get('ASYNC_HTTP_WORKERS') or 16)
+    # standalone (python app.py) or, under cluster.py, ingest (MQTT, database writer, automation) and web (dashboards)
+    SERVER_ROLE = os.environ.get('SERVER_ROLE') or 'standalone'
+    # Carries state updates from the ingest process to the web workers: unix (a Unix socket) or local (one process)
+    MESSAGE_BUS = os.environ.get('MESSAGE_BUS') or 'unix'
+    MESSAGE_BUS_PATH = os.environ.get('MESSAGE_BUS_PATH') or os.path.join(tempfile.gettempdir(), 'plant-monitor-bus.sock')
+    # How often the ingest process sends the changes it has coalesced to the web workers; with the local bus the
+    # one broadcaster keeps BROADCAST_TICK_MS for the dashboards it serves
+    MESSAGE_BUS_FLUSH_MS = int(os.environ.get('MESSAGE_BUS_FLUSH_MS') or 50)
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS') or os.cpu_count() or 1)
+    # Server-side AUTO mode rules; off by default because the firmware already runs its own AUTO logic
+    AUTOMATION_ENABLED = os.environ.get('AUTOMATION_ENABLED', 'False').lower() in ('true', '1', 't')
+    AUTOMATION_TICK_MS = int(os.environ.get('AUTOMATION_TICK_MS') or 200)
+    AUTOMATION_SOIL_HYSTERESIS = float(os.environ.get('AUTOMATION_SOIL_HYSTERESIS') or 5)
+    AUTOMATION_LIGHT_HYSTERESIS = float(os.environ.get('AUTOMATION_LIGHT_HYSTERESIS') or 5)
+    # Minimum seconds between two commands to the same actuator of one device; the pump run-time cap is exempt
+    AUTOMATION_MIN_COMMAND_INTERVAL = float(os.environ.get('AUTOMATION_MIN_COMMAND_INTERVAL') or 60)
+    # Longest the automation lets the pump run in one go, like PUMP_RUN_TIME in the firmware
+    AUTOMATION_PUMP_MAX_RUN = float(os.environ.get('AUTOMATION_PUMP_MAX_RUN') or 3)
     print(f"Database configuration: {SQLALCHEMY_DATABASE_URI}")
 
     MQTT_BROKER_URL = os.environ.get('MQTT_BROKER_URL') or 'mqtt-dashboard.com'
@@ -26,4 +93,6 @@ class Config:
     MQTT_TLS_ENABLED = os.environ.get('MQTT_TLS_ENABLED', 'False').lower() in ('true', '1', 't')
     MQTT_TLS_CERT_REQS = int(os.environ.get('MQTT_TLS_CERT_REQS') or 0)
     MQTT_TLS_CA_CERTS = os.environ.get('MQTT_TLS_CA_CERTS')
-    MQTT_CLIENT_ID = os.environ.get('MQTT_CLIENT_ID') or 'flask_plant_monitor'
\ No newline at end of file
+    MQTT_CLIENT_ID = os.environ.get('MQTT_CLIENT_ID') or 'flask_plant_monitor'
+    # Connect in the background so the web server starts even while the broker is unreachable
+    MQTT_CONNECT_ASYNC = os.environ.get('MQTT_CONNECT_ASYNC', 'False').lower() in ('true', '1', 't')
\ No newline at end of file
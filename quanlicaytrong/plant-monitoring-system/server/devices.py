@@ -0,0 +1,163 @@
+import itertools
+import threading
+import time
+
+TOPIC_PREFIX = "plant"
+DEFAULT_DEVICE_ID = "default"
+
+SUBTOPIC_DATA = "data"
+SUBTOPIC_TEMPERATURE = "temperature"
+SUBTOPIC_HUMIDITY = "humidity"
+SUBTOPIC_SOIL_MOISTURE = "soil_moisture"
+SUBTOPIC_LIGHT_LEVEL = "light_level"
+SUBTOPIC_PUMP_STATUS = "pump_status"
+SUBTOPIC_LIGHT_STATUS = "light_status"
+SUBTOPIC_MODE = "mode"
+SUBTOPIC_THRESHOLDS = "thresholds"
+SUBTOPIC_COMMAND = "command"
+
+INBOUND_SUBTOPICS = [
+    SUBTOPIC_DATA,
+    SUBTOPIC_TEMPERATURE,
+    SUBTOPIC_HUMIDITY,
+    SUBTOPIC_SOIL_MOISTURE,
+    SUBTOPIC_LIGHT_LEVEL,
+    SUBTOPIC_PUMP_STATUS,
+    SUBTOPIC_LIGHT_STATUS,
+    SUBTOPIC_MODE,
+    SUBTOPIC_THRESHOLDS
+]
+
+SENSOR_KEYS = ["temperature", "humidity", "soil_moisture", "light_level"]
+THRESHOLD_KEYS = ["temperature_min", "temperature_max", "soil_moisture_min", "humidity_min", "light_level_min"]
+
+
+def device_topic(device_id, subtopic):
+    # The original single-board firmware talks on plant/<subtopic>; it is kept as the default device
+    if not device_id or device_id == DEFAULT_DEVICE_ID:
+        return f"{TOPIC_PREFIX}/{subtopic}"
+    return f"{TOPIC_PREFIX}/{device_id}/{subtopic}"
+
+
+def subscription_topics():
+    topics = []
+    for subtopic in INBOUND_SUBTOPICS:
+        topics.append(f"{TOPIC_PREFIX}/{subtopic}")
+        topics.append(f"{TOPIC_PREFIX}/+/{subtopic}")
+    return topics
+
+
+def parse_topic(topic):
+    parts = topic.split('/')
+    if parts[0] != TOPIC_PREFIX:
+        return None, None
+    if len(parts) == 2:
+        return DEFAULT_DEVICE_ID, parts[1]
+    if len(parts) == 3 and parts[1]:
+        return parts[1], parts[2]
+    return None, None
+
+
+def default_state():
+    return {
+        "temperature": 0,
+        "humidity": 0,
+        "soil_moisture": 0,
+        "light_level": 0,
+        "pump_status": "OFF",
+        "light_status": "OFF",
+        "mode": "AUTO"
+    }
+
+
+def default_thresholds():
+    return {
+        "temperature_min": 18.0,
+        "temperature_max": 30.0,
+        "soil_moisture_min": 30,
+        "humidity_min": 40.0,
+        "light_level_min": 30
+    }
+
+
+class DeviceState:
+    def __init__(self, device_id, sequence=None):
+        self.device_id = device_id
+        self.state = default_state()
+        self.thresholds = default_thresholds()
+        self.last_seen = None
+        self.seq = 0
+        self.lock = threading.Lock()
+        self._sequence = sequence or itertools.count(1)
+        self._waiters = set()
+
+    def update(self, changes):
+        with self.lock:
+            changed = {key: value for key, value in changes.items() if self.state.get(key) != value}
+            self.state.update(changed)
+            self.last_seen = time.time()
+            if changed:
+                self.seq = next(self._sequence)
+                for waiter in self._waiters:
+                    waiter.set()
+        return changed
+
+    def wait_for_change(self, since, timeout, create_event=threading.Event):
+        # Each waiter gets an event from the caller's async mode (socketio's eio.create_event), set by update()
+        with self.lock:
+            if self.seq > since:
+                return True
+            event = create_event()
+            self._waiters.add(event)
+        try:
+            event.wait(timeout)
+        finally:
+            with self.lock:
+                self._waiters.discard(event)
+        return self.seq > since
+
+    def update_thresholds(self, changes):
+        with self.lock:
+            self.thresholds.update(changes)
+            return dict(self.thresholds)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.state), dict(self.thresholds)
+
+    def current(self):
+        with self.lock:
+            return self.seq, dict(self.state)
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self._devices = {}
+        # One counter shared by every device, so sequence numbers are increasing across the whole registry
+        self._sequence = itertools.count(1)
+
+    def get(self, device_id, create=True):
+        device = self._devices.get(device_id)
+        if device is None and create:
+            # dict.setdefault is atomic, so concurrent first messages from a device share one state
+            device = self._devices.setdefault(device_id, DeviceState(device_id, self._sequence))
+        return device
+
+    def snapshot(self, device_id):
+        # Read-only: ids that have never reported get the defaults without an entry of their own
+        device = self.get(device_id, create=False)
+        if device is None:
+            return default_state(), default_thresholds()
+        return device.snapshot()
+
+    def device_ids(self):
+        return list(self._devices.keys())
+
+    def __iter__(self):
+        return iter(list(self._devices.values()))
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
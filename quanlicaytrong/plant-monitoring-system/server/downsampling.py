@@ -0,0 +1,93 @@
+import numpy as np
+
+METHODS = ['lttb', 'minmax', 'avg']
+
+
+def bucket_edges(count, buckets):
+    return np.linspace(0, count, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, threshold):
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = 1 + bucket_edges(count - 2, threshold - 2)
+    cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+    cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[1:] - edges[:-1]
+    average_x = (cumulative_x[edges[1:]] - cumulative_x[edges[:-1]]) / sizes
+    average_y = (cumulative_y[edges[1:]] - cumulative_y[edges[:-1]]) / sizes
+    average_x = np.append(average_x[1:], x[-1])
+    average_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+    anchor = 0
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[anchor] - average_x[bucket]) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (average_y[bucket] - y[anchor])
+        )
+        anchor = start + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+
+    return selected
+
+
+def minmax_indices(y, threshold):
+    count = len(y)
+    buckets = threshold // 2
+    if threshold >= count or buckets < 1:
+        return np.arange(count)
+
+    edges = bucket_edges(count, buckets)
+    bucket_ids = np.repeat(np.arange(buckets), edges[1:] - edges[:-1])
+    # Sorting by (bucket, value) puts each bucket's minimum first and maximum last
+    order = np.lexsort((np.asarray(y, dtype=np.float64), bucket_ids))
+    return np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1])))
+
+
+def average_buckets(x, values, threshold):
+    count = len(x)
+    if threshold >= count or threshold < 1:
+        return np.asarray(x), values
+
+    edges = bucket_edges(count, threshold)
+    starts = edges[:-1]
+    sizes = (edges[1:] - starts).astype(np.float64)
+    averaged = {
+        name: np.add.reduceat(np.asarray(column, dtype=np.float64), starts) / sizes
+        for name, column in values.items()
+    }
+    return np.asarray(x)[starts], averaged
+
+
+def effective_method(method, metric_count):
+    # Point-picking methods choose different rows per metric, so several metrics are averaged instead
+    if metric_count != 1:
+        return 'avg'
+    return method or 'lttb'
+
+
+def downsample(x, values, max_points, method=None):
+    method = effective_method(method, len(values))
+    if method not in METHODS:
+        raise ValueError(f"Invalid downsampling method. Must be one of {METHODS}")
+
+    if method == 'avg':
+        return average_buckets(x, values, max_points)
+
+    name, column = next(iter(values.items()))
+    if method == 'lttb':
+        indices = lttb_indices(x, column, max_points)
+    else:
+        indices = minmax_indices(column, max_points)
+    return np.asarray(x)[indices], {name: np.asarray(column)[indices]}
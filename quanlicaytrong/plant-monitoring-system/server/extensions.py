@@ -1,5 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_mqtt import Mqtt
+from config import Config
+from devices import DeviceRegistry
 
 db = SQLAlchemy()
-mqtt = Mqtt()
\ No newline at end of file
+# Flask-MQTT only takes this as a constructor argument, not from app.config
+mqtt = Mqtt(connect_async=Config.MQTT_CONNECT_ASYNC)
+devices = DeviceRegistry()
\ No newline at end of file
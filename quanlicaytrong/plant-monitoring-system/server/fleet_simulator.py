@@ -0,0 +1,130 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from devices import (
+    SUBTOPIC_DATA, SUBTOPIC_TEMPERATURE, SUBTOPIC_HUMIDITY, SUBTOPIC_SOIL_MOISTURE, SUBTOPIC_LIGHT_LEVEL,
+    device_topic
+)
+
+# Distinct temperatures a tagged device cycles through; readings are told apart by value within one cycle
+TAG_CYCLE = 1000
+
+
+class SimulatedDevice:
+    def __init__(self, device_id, seed=None, tagged=False):
+        self.device_id = device_id
+        self.tagged = tagged
+        self.readings = 0
+        self._random = random.Random(seed)
+        self.temperature = self._random.uniform(22.0, 30.0)
+        self.humidity = self._random.uniform(50.0, 80.0)
+        self.soil_moisture = self._random.randint(20, 70)
+        self.light_level = self._random.randint(10, 90)
+
+    def read(self):
+        # Slow random walk, rounded like the firmware's String(float) / int conversions
+        self.temperature = min(45.0, max(5.0, self.temperature + self._random.gauss(0, 0.1)))
+        self.humidity = min(100.0, max(10.0, self.humidity + self._random.gauss(0, 0.3)))
+        self.soil_moisture = min(100, max(0, self.soil_moisture + self._random.choice((-1, 0, 0, 1))))
+        self.light_level = min(100, max(0, self.light_level + self._random.choice((-1, 0, 0, 1))))
+        self.readings += 1
+
+        temperature = round(self.temperature, 2)
+        if self.tagged:
+            temperature = round(10 + (self.readings % TAG_CYCLE) / 50, 2)
+
+        return {
+            'temperature': temperature,
+            'humidity': round(self.humidity, 2),
+            'soil_moisture': self.soil_moisture,
+            'light_level': self.light_level,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def messages(self, reading, metric_topics=True):
+        # Same order as publishData() in the firmware: the four metric topics, then the JSON document
+        messages = []
+        if metric_topics:
+            messages.append((device_topic(self.device_id, SUBTOPIC_TEMPERATURE), f"{reading['temperature']:.2f}"))
+            messages.append((device_topic(self.device_id, SUBTOPIC_HUMIDITY), f"{reading['humidity']:.2f}"))
+            messages.append((device_topic(self.device_id, SUBTOPIC_SOIL_MOISTURE), str(reading['soil_moisture'])))
+            messages.append((device_topic(self.device_id, SUBTOPIC_LIGHT_LEVEL), str(reading['light_level'])))
+        messages.append((device_topic(self.device_id, SUBTOPIC_DATA), json.dumps(reading)))
+        return messages
+
+
+class FleetSimulator:
+    def __init__(self, device_count, rate=0.2, metric_topics=True, tagged=False, prefix='sim', seed=0):
+        # rate: readings per second per device (the firmware reads every 5 s, so 0.2)
+        self.rate = rate
+        self.metric_topics = metric_topics
+        self.devices = [
+            SimulatedDevice(f'{prefix}-{index:04d}', seed=seed + index, tagged=tagged)
+            for index in range(device_count)
+        ]
+        self.published = 0
+        self.readings = 0
+
+    def run(self, publish, duration, on_reading=None, stop_event=None):
+        # publish(topic, payload) is called for every message; rate 0 publishes as fast as publish() allows
+        stop_event = stop_event or threading.Event()
+        started = time.perf_counter()
+        interval = 1.0 / self.rate if self.rate > 0 else 0
+        # Spread devices evenly across the interval instead of bursting them all at once
+        offsets = [interval * index / len(self.devices) for index in range(len(self.devices))]
+        rounds = 0
+
+        while not stop_event.is_set():
+            round_start = started + rounds * interval
+            if time.perf_counter() - started >= duration:
+                break
+
+            for device, offset in zip(self.devices, offsets):
+                if interval:
+                    delay = round_start + offset - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                reading = device.read()
+                if on_reading is not None:
+                    on_reading(device.device_id, reading)
+                for topic, payload in device.messages(reading, self.metric_topics):
+                    publish(topic, payload)
+                    self.published += 1
+                self.readings += 1
+            rounds += 1
+
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a fleet of plant monitoring boards publishing over MQTT')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=0.2, help='Readings per second per device (0 = as fast as possible)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--no-metric-topics', action='store_true', help='Only publish plant/<id>/data')
+    parser.add_argument('--broker', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--prefix', default='sim', help='Device id prefix')
+    args = parser.parse_args()
+
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(client_id=f'{args.prefix}-fleet-simulator')
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+
+    simulator = FleetSimulator(args.devices, args.rate, not args.no_metric_topics, prefix=args.prefix)
+    elapsed = simulator.run(lambda topic, payload: client.publish(topic, payload), args.duration)
+
+    client.loop_stop()
+    client.disconnect()
+    print(f"Published {simulator.published} messages ({simulator.readings} readings) from {args.devices} devices "
+          f"in {elapsed:.1f}s: {simulator.published / elapsed:.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import cv2
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger('gesture_control')
+
+
+class FrameGrabber:
+    def __init__(self, source, buffer_size=2):
+        self.source = source
+        self.captured = 0
+        self.dropped = 0
+        self._frames = deque(maxlen=max(1, buffer_size))
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._cap = None
+
+    def start(self):
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            return False
+
+        # Keep the backend queue as short as possible; the ring buffer below decides what gets dropped
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._thread = threading.Thread(target=self._run, name='frame-grabber')
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                success, frame = self._cap.read()
+                if not success:
+                    logger.error("Không thể đọc khung hình từ camera")
+                    break
+
+                with self._condition:
+                    self._seq += 1
+                    self._frames.append((self._seq, time.time(), frame))
+                    self.captured += 1
+                    self._condition.notify_all()
+        finally:
+            self._stopped.set()
+            with self._condition:
+                self._condition.notify_all()
+
+    def read(self, last_seq=0, timeout=1.0):
+        # Returns the newest frame captured after last_seq, skipping any older ones still in the buffer
+        with self._condition:
+            while not self._frames or self._frames[-1][0] <= last_seq:
+                if self._stopped.is_set():
+                    return None
+                if not self._condition.wait(timeout):
+                    return None
+            seq, captured_at, frame = self._frames[-1]
+
+        if last_seq:
+            self.dropped += seq - last_seq - 1
+        return seq, captured_at, frame
+
+    def is_running(self):
+        return not self._stopped.is_set()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
@@ -0,0 +1,168 @@
+import numpy as np
+
+GESTURE_DURATION = 1.5
+
+# MediaPipe hand landmark indices
+WRIST = 0
+INDEX_FINGER_PIP = 6
+INDEX_FINGER_TIP = 8
+MIDDLE_FINGER_PIP = 10
+MIDDLE_FINGER_TIP = 12
+RING_FINGER_PIP = 14
+RING_FINGER_TIP = 16
+PINKY_PIP = 18
+PINKY_TIP = 20
+
+LANDMARK_COUNT = 21
+
+TEXT_NO_GESTURE = "Không phát hiện cử chỉ"
+TEXT_RESTING = "Tay đang ở vị trí nghỉ"
+TEXT_INDEX_UP = "Phát hiện ngón trỏ dơ lên"
+TEXT_MIDDLE_UP = "Phát hiện ngón giữa dơ lên"
+TEXT_LIGHT_ON = "ĐÃ BẬT ĐÈN!"
+TEXT_LIGHT_OFF = "ĐÃ TẮT ĐÈN!"
+TEXT_PUMP_ON = "ĐÃ BẬT MÁY BƠM!"
+TEXT_PUMP_OFF = "ĐÃ TẮT MÁY BƠM!"
+TEXT_ALL_OFF = "ĐÃ TẮT TẤT CẢ!"
+
+
+FINGER_PIPS = np.array([INDEX_FINGER_PIP, MIDDLE_FINGER_PIP, RING_FINGER_PIP, PINKY_PIP])
+FINGER_TIPS = np.array([INDEX_FINGER_TIP, MIDDLE_FINGER_TIP, RING_FINGER_TIP, PINKY_TIP])
+
+
+# Landmarks are (..., 21, 3) arrays of normalized x, y, z, so one call covers a hand, all hands in a frame
+# or a whole recording; y grows downwards in the image
+def finger_states(landmarks):
+    y = np.asarray(landmarks)[..., 1]
+    tips = y[..., FINGER_TIPS]
+    pips = y[..., FINGER_PIPS]
+    up = tips < pips
+    return {
+        # If wrist is higher than all finger tips, it's likely in resting position
+        'resting': (y[..., WRIST, np.newaxis] < tips).all(axis=-1),
+        'index_up': up[..., 0],
+        'middle_up': up[..., 1],
+        'fist': (tips > pips).all(axis=-1)
+    }
+
+
+def hand_features(landmarks):
+    # Per-hand (resting, index_up, middle_up, fist) tuples of plain bools for the state machine
+    states = finger_states(landmarks)
+    return list(zip(
+        states['resting'].tolist(),
+        states['index_up'].tolist(),
+        states['middle_up'].tolist(),
+        states['fist'].tolist()
+    ))
+
+
+class HandState:
+    # Timers and last finger states of one tracked hand; the light and pump states stay on the machine
+    def __init__(self):
+        self.index_finger_timer = 0.0
+        self.middle_finger_timer = 0.0
+        self.fist_timer = 0.0
+        self.current_gesture = None
+        self.last_index_state = None
+        self.last_middle_state = None
+
+
+class GestureStateMachine:
+    def __init__(self, gesture_duration=GESTURE_DURATION, light_state=False, pump_state=False):
+        self.gesture_duration = gesture_duration
+        self.light_state = light_state
+        self.pump_state = pump_state
+        self.hands = {}
+
+    def update(self, hands, current_time, keys=None):
+        # hands: (hands, 21, 3) landmarks seen in this frame; returns (commands, gesture_text)
+        if not len(hands):
+            return self.update_features([], current_time)
+        return self.update_features(hand_features(np.asarray(hands)), current_time, keys)
+
+    def update_features(self, features, current_time, keys=None):
+        # features: hand_features() output, so callers can classify many frames in one finger_states() pass.
+        # keys identify each hand across frames (MediaPipe's handedness label); by default its position in the frame
+        commands = []
+        gesture_text = TEXT_NO_GESTURE
+
+        if not features:
+            # No hand detected, reset states
+            for hand in self.hands.values():
+                hand.current_gesture = None
+            return commands, gesture_text
+
+        if keys is None:
+            keys = range(len(features))
+
+        for key, (resting, index_up, middle_up, is_fist_gesture) in zip(keys, features):
+            hand = self.hands.get(key)
+            if hand is None:
+                hand = self.hands[key] = HandState()
+
+            if resting:
+                gesture_text = TEXT_RESTING
+                hand.current_gesture = "resting"
+                continue
+
+            gesture_text = self._update_hand(hand, index_up, middle_up, is_fist_gesture, current_time, commands, gesture_text)
+
+        return commands, gesture_text
+
+    def _update_hand(self, hand, index_up, middle_up, is_fist_gesture, current_time, commands, gesture_text):
+        duration = self.gesture_duration
+
+        # Handle index finger for light control
+        if index_up != hand.last_index_state and hand.last_index_state is not None:
+            if index_up:
+                hand.index_finger_timer = current_time
+                gesture_text = TEXT_INDEX_UP
+            elif current_time - hand.index_finger_timer >= duration and self.light_state:
+                commands.append("LIGHT_OFF")
+                self.light_state = False
+                gesture_text = TEXT_LIGHT_OFF
+
+        # Handle middle finger for pump control
+        if middle_up != hand.last_middle_state and hand.last_middle_state is not None:
+            if middle_up:
+                hand.middle_finger_timer = current_time
+                gesture_text = TEXT_MIDDLE_UP
+            elif current_time - hand.middle_finger_timer >= duration and self.pump_state:
+                commands.append("PUMP_OFF")
+                self.pump_state = False
+                gesture_text = TEXT_PUMP_OFF
+
+        # Continuously check for active gestures; timers reset to prevent multiple triggers
+        if index_up and current_time - hand.index_finger_timer >= duration and not self.light_state:
+            commands.append("LIGHT_ON")
+            self.light_state = True
+            hand.index_finger_timer = current_time
+            gesture_text = TEXT_LIGHT_ON
+
+        if middle_up and current_time - hand.middle_finger_timer >= duration and not self.pump_state:
+            commands.append("PUMP_ON")
+            self.pump_state = True
+            hand.middle_finger_timer = current_time
+            gesture_text = TEXT_PUMP_ON
+
+        # Fist held for the gesture duration turns everything off
+        if is_fist_gesture:
+            if hand.current_gesture != "fist":
+                hand.current_gesture = "fist"
+                hand.fist_timer = current_time
+
+            if current_time - hand.fist_timer >= duration and (self.light_state or self.pump_state):
+                if self.light_state:
+                    commands.append("LIGHT_OFF")
+                if self.pump_state:
+                    commands.append("PUMP_OFF")
+                self.light_state = False
+                self.pump_state = False
+                gesture_text = TEXT_ALL_OFF
+        elif hand.current_gesture == "fist":
+            hand.current_gesture = None
+
+        hand.last_index_state = index_up
+        hand.last_middle_state = middle_up
+        return gesture_text
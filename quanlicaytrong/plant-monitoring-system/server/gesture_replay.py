@@ -0,0 +1,164 @@
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+from gesture_logic import (
+    GESTURE_DURATION, GestureStateMachine, LANDMARK_COUNT, finger_states, WRIST, INDEX_FINGER_PIP, INDEX_FINGER_TIP,
+    MIDDLE_FINGER_PIP, MIDDLE_FINGER_TIP, RING_FINGER_PIP, RING_FINGER_TIP, PINKY_PIP, PINKY_TIP
+)
+
+# Trace files are NPZ archives with:
+#   landmarks   float32 (frames, max_hands, 21, 3); missing hands are NaN
+#   timestamps  float64 (frames,) capture time in seconds
+#   expected    optional str array with the commands the trace should produce, in order
+
+
+def pad_frames(frames):
+    max_hands = max([len(hands) for hands in frames] + [1])
+    landmarks = np.full((len(frames), max_hands, LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+    for index, hands in enumerate(frames):
+        for hand, points in enumerate(hands):
+            landmarks[index, hand] = points
+    return landmarks
+
+
+def trace_features(landmarks):
+    # One finger_states() pass over every hand of every frame, then split back into per-frame feature lists
+    present = ~np.isnan(landmarks).all(axis=(2, 3))
+    states = finger_states(landmarks)
+    columns = np.stack([states['resting'], states['index_up'], states['middle_up'], states['fist']], axis=-1)
+    return [
+        [tuple(hand) for hand in columns[index][present[index]].tolist()]
+        for index in range(len(landmarks))
+    ]
+
+
+def save_trace(path, frames, timestamps, expected=None):
+    arrays = {'landmarks': pad_frames(frames), 'timestamps': np.asarray(timestamps, dtype=np.float64)}
+    if expected is not None:
+        arrays['expected'] = np.asarray(expected, dtype=str)
+    np.savez_compressed(path, **arrays)
+
+
+def load_trace(path):
+    with np.load(path) as data:
+        landmarks = data['landmarks']
+        timestamps = data['timestamps']
+        expected = list(data['expected']) if 'expected' in data else None
+
+    present = ~np.isnan(landmarks).all(axis=(2, 3))
+    frames = [[landmarks[index, hand] for hand in np.flatnonzero(present[index])] for index in range(len(landmarks))]
+    return frames, timestamps, expected
+
+
+def hand_pose(fingers_up=(), resting=False):
+    # Minimal synthetic hand: only the y coordinates the classifiers look at are meaningful
+    points = np.full((LANDMARK_COUNT, 3), 0.5, dtype=np.float32)
+    points[WRIST, 1] = 0.1 if resting else 0.9
+    for name, (pip, tip) in {
+        'index': (INDEX_FINGER_PIP, INDEX_FINGER_TIP),
+        'middle': (MIDDLE_FINGER_PIP, MIDDLE_FINGER_TIP),
+        'ring': (RING_FINGER_PIP, RING_FINGER_TIP),
+        'pinky': (PINKY_PIP, PINKY_TIP)
+    }.items():
+        points[pip, 1] = 0.6
+        points[tip, 1] = 0.4 if name in fingers_up and not resting else 0.7
+    return points
+
+
+SYNTHETIC_SCRIPT = [
+    (None, 1.0),
+    ((), 1.0),
+    (('index',), 2.0),
+    ((), 2.0),
+    (('middle',), 2.0),
+    ('resting', 1.0),
+    ((), 2.0),
+    (None, 1.0)
+]
+SYNTHETIC_EXPECTED = ['LIGHT_ON', 'LIGHT_OFF', 'PUMP_ON', 'PUMP_OFF']
+
+
+def synthetic_trace(fps=30.0, noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    timestamps = []
+    now = 0.0
+
+    for pose, seconds in SYNTHETIC_SCRIPT:
+        for _ in range(int(seconds * fps)):
+            if pose is None:
+                hands = []
+            else:
+                points = hand_pose(resting=True) if pose == 'resting' else hand_pose(pose)
+                if noise:
+                    points = points + rng.normal(0.0, noise, points.shape).astype(np.float32)
+                hands = [points]
+            frames.append(hands)
+            timestamps.append(now)
+            now += 1.0 / fps
+
+    return frames, np.asarray(timestamps), list(SYNTHETIC_EXPECTED)
+
+
+def replay(frames, timestamps, gesture_duration=GESTURE_DURATION):
+    machine = GestureStateMachine(gesture_duration)
+    commands = []
+
+    started = time.perf_counter()
+    features = trace_features(pad_frames(frames))
+    for frame_features, timestamp in zip(features, timestamps.tolist()):
+        frame_commands, _ = machine.update_features(frame_features, timestamp)
+        commands.extend(frame_commands)
+    elapsed = time.perf_counter() - started
+
+    return commands, elapsed
+
+
+def score(commands, expected):
+    emitted = Counter(commands)
+    wanted = Counter(expected)
+    false_triggers = sum((emitted - wanted).values())
+    missed = sum((wanted - emitted).values())
+    return false_triggers, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded hand landmark traces through the gesture state machine')
+    parser.add_argument('traces', nargs='*', help='NPZ trace files')
+    parser.add_argument('--synthetic', action='store_true', help='Also replay a generated trace')
+    parser.add_argument('--fps', type=float, default=30.0, help='Frame rate of the synthetic trace')
+    parser.add_argument('--noise', type=float, default=0.0, help='Landmark jitter of the synthetic trace')
+    parser.add_argument('--save', help='Write the synthetic trace to this NPZ file')
+    parser.add_argument('--duration', type=float, nargs='+', default=[GESTURE_DURATION], help='GESTURE_DURATION values to compare')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay each trace this many times for timing')
+    args = parser.parse_args()
+
+    traces = [(path, *load_trace(path)) for path in args.traces]
+    if args.synthetic or not traces:
+        frames, timestamps, expected = synthetic_trace(args.fps, args.noise)
+        if args.save:
+            save_trace(args.save, frames, timestamps, expected)
+        traces.append((f'synthetic@{args.fps:g}fps noise={args.noise:g}', frames, timestamps, expected))
+
+    print(f"{'trace':<40} {'duration':>8} {'frames':>8} {'decisions/s':>12} {'commands':>8} {'false':>6} {'missed':>6}")
+    for name, frames, timestamps, expected in traces:
+        for duration in args.duration:
+            elapsed = 0.0
+            for _ in range(args.repeat):
+                commands, run_time = replay(frames, timestamps, duration)
+                elapsed += run_time
+            rate = len(frames) * args.repeat / elapsed if elapsed else float('inf')
+
+            if expected is None:
+                false_triggers, missed = '-', '-'
+            else:
+                false_triggers, missed = score(commands, expected)
+            print(f"{name:<40} {duration:>8g} {len(frames):>8} {rate:>12.0f} {len(commands):>8} {false_triggers:>6} {missed:>6}")
+            print(f"{'':<40} commands: {' '.join(commands) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import atexit
+import os
+import subprocess
+import sys
+import threading
+import logging
+from dotenv import load_dotenv
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger('gesture_control')
+
+load_dotenv()
+
+MQTT_BROKER = os.getenv('MQTT_BROKER_URL', 'test.mosquitto.org')
+MQTT_PORT = int(os.getenv('MQTT_BROKER_PORT', 1883))
+MQTT_USERNAME = os.getenv('MQTT_USERNAME', '')
+MQTT_PASSWORD = os.getenv('MQTT_PASSWORD', '')
+MQTT_CLIENT_ID = os.getenv('MQTT_CLIENT_ID', 'gesture_control') + '_gesture'
+
+TOPIC_COMMAND = "plant/command"
+COMMANDS = ["LIGHT_ON", "LIGHT_OFF", "PUMP_ON", "PUMP_OFF"]
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gesture_control.py')
+
+def parse_camera_source(source):
+    source = source.strip()
+    return int(source) if source.isdigit() else source
+
+# Comma-separated list of camera indices or stream URLs, one worker process each
+CAMERA_SOURCES = [parse_camera_source(source) for source in os.getenv('CAMERA_SOURCE', '1').split(',') if source.strip()]
+
+def connect_mqtt():
+    client = mqtt.Client(client_id=MQTT_CLIENT_ID)
+    if MQTT_USERNAME and MQTT_PASSWORD:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            logger.info("Kết nối MQTT thành công!")
+        else:
+            logger.error(f"Kết nối MQTT thất bại với mã lỗi {rc}")
+
+    client.on_connect = on_connect
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    return client
+
+def send_command(client, command):
+    client.publish(TOPIC_COMMAND, command)
+    logger.info(f"Đã gửi lệnh: {command}")
+
+def worker_command(source, test_mode=False):
+    args = [sys.executable, WORKER_SCRIPT, '--worker', str(source)]
+    if test_mode:
+        args.append('--test')
+    return args
+
+def start_camera_worker(source, test_mode=False):
+    # Each camera gets its own interpreter, so MediaPipe never shares a GIL with the web server.
+    # Commands come back one per line on stdout; closing stdin tells the worker to exit.
+    return subprocess.Popen(worker_command(source, test_mode), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+def relay_commands(source, process, mqtt_client):
+    for line in process.stdout:
+        command = line.strip()
+        if command not in COMMANDS:
+            continue
+        if mqtt_client is None:
+            logger.info(f"Camera {source}: {command} (chế độ test, không gửi)")
+            continue
+        send_command(mqtt_client, command)
+
+    process.wait()
+    logger.info(f"Camera {source} đã dừng (mã thoát {process.returncode})")
+
+def stop_camera_workers(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.stdin.close()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def run_gesture_detection(test_mode=False):
+    processes = []
+    mqtt_client = None
+    try:
+        logger.info(f"Khởi động hệ thống nhận diện cử chỉ cho {len(CAMERA_SOURCES)} camera: {CAMERA_SOURCES}")
+        if test_mode:
+            logger.info("Chạy ở chế độ test với hiển thị camera")
+        else:
+            mqtt_client = connect_mqtt()
+            mqtt_client.loop_start()
+
+        processes = [start_camera_worker(source, test_mode) for source in CAMERA_SOURCES]
+        atexit.register(stop_camera_workers, processes)
+
+        relays = [
+            threading.Thread(target=relay_commands, args=(source, process, mqtt_client), daemon=True)
+            for source, process in zip(CAMERA_SOURCES, processes)
+        ]
+        for relay in relays:
+            relay.start()
+        for relay in relays:
+            relay.join()
+    except Exception as e:
+        logger.error(f"Lỗi trong thread nhận diện cử chỉ: {str(e)}")
+    finally:
+        stop_camera_workers(processes)
+        if mqtt_client is not None:
+            mqtt_client.loop_stop()
+
+def start_gesture_thread(test_mode=False):
+    gesture_thread = threading.Thread(target=run_gesture_detection, args=(test_mode,))
+    gesture_thread.daemon = True
+    gesture_thread.start()
+    return gesture_thread
@@ -0,0 +1,182 @@
+import struct
+
+import numpy as np
+
+# Gorilla (Pelkonen et al., VLDB 2015) timestamp and value compression.
+# Timestamps are whole seconds, stored as delta-of-delta against the chunk start;
+# values are float64, stored as the XOR with the previous value.
+
+# (prefix, prefix bits, value bits) for delta-of-deltas that are not zero, smallest first
+DOD_BUCKETS = [(0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12), (0b1111, 4, 32)]
+
+# Bytes read per decoded timestamp / value
+TIMESTAMP_WINDOW = 6
+FLOAT_WINDOW = 11
+
+
+class BitWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.data.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self):
+        if self._bits:
+            return bytes(self.data) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.data)
+
+    def copy(self):
+        writer = BitWriter()
+        writer.data = bytearray(self.data)
+        writer._acc = self._acc
+        writer._bits = self._bits
+        return writer
+
+
+def signed(value, bits):
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+class TimestampEncoder:
+    def __init__(self, start):
+        self.writer = BitWriter()
+        self.previous = start
+        self.delta = 0
+
+    def append(self, timestamp):
+        delta = timestamp - self.previous
+        dod = delta - self.delta
+        if dod == 0:
+            self.writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, bits in DOD_BUCKETS:
+                if -(1 << (bits - 1)) <= dod < 1 << (bits - 1):
+                    self.writer.write(prefix, prefix_bits)
+                    self.writer.write(dod, bits)
+                    break
+            else:
+                raise ValueError(f"Timestamp delta-of-delta {dod} does not fit in 32 bits")
+        self.previous = timestamp
+        self.delta = delta
+
+    def getvalue(self):
+        return self.writer.getvalue()
+
+    def copy(self):
+        encoder = TimestampEncoder(self.previous)
+        encoder.writer = self.writer.copy()
+        encoder.delta = self.delta
+        return encoder
+
+
+class FloatEncoder:
+    def __init__(self):
+        self.writer = BitWriter()
+        self.previous = None
+        self.leading = -1
+        self.trailing = 0
+
+    def append(self, value):
+        bits = struct.unpack('>Q', struct.pack('>d', value))[0]
+        if self.previous is None:
+            self.writer.write(bits, 64)
+            self.previous = bits
+            return
+
+        xor = bits ^ self.previous
+        self.previous = bits
+        if xor == 0:
+            self.writer.write(0, 1)
+            return
+
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if self.leading >= 0 and leading >= self.leading and trailing >= self.trailing:
+            # The meaningful bits fit inside the previous window, so the window is not repeated
+            self.writer.write(0b10, 2)
+            self.writer.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+        else:
+            meaningful = 64 - leading - trailing
+            self.writer.write(0b11, 2)
+            self.writer.write(leading, 5)
+            self.writer.write(meaningful - 1, 6)
+            self.writer.write(xor >> trailing, meaningful)
+            self.leading = leading
+            self.trailing = trailing
+
+    def getvalue(self):
+        return self.writer.getvalue()
+
+    def copy(self):
+        encoder = FloatEncoder()
+        encoder.writer = self.writer.copy()
+        encoder.previous = self.previous
+        encoder.leading = self.leading
+        encoder.trailing = self.trailing
+        return encoder
+
+
+def decode_timestamps(data, start, count):
+    # One big-endian window per timestamp holds its whole code (at most 36 bits past any bit offset)
+    data = bytes(data) + bytes(TIMESTAMP_WINDOW)
+    timestamps = []
+    position = 0
+    previous = start
+    delta = 0
+    for _ in range(count):
+        offset = position >> 3
+        # Regular sampling makes most codes a single 0 bit, which needs no window
+        if data[offset] >> (7 - (position & 7)) & 1:
+            window = int.from_bytes(data[offset:offset + TIMESTAMP_WINDOW], 'big')
+            top = TIMESTAMP_WINDOW * 8 - 1 - (position & 7)
+            for prefix, prefix_bits, bits in DOD_BUCKETS:
+                if window >> (top - prefix_bits + 1) & ((1 << prefix_bits) - 1) == prefix:
+                    delta += signed(window >> (top - prefix_bits - bits + 1) & ((1 << bits) - 1), bits)
+                    position += prefix_bits + bits
+                    break
+        else:
+            position += 1
+        previous += delta
+        timestamps.append(previous)
+    return np.asarray(timestamps, dtype=np.int64)
+
+
+def decode_floats(data, count):
+    if not count:
+        return np.empty(0, dtype=np.float64)
+
+    # One window per value holds the control bits, the header and up to 64 meaningful bits past any bit offset
+    data = bytes(data) + bytes(FLOAT_WINDOW)
+    value = int.from_bytes(data[:8], 'big')
+    values = [value]
+    position = 64
+    leading = trailing = 0
+    for _ in range(count - 1):
+        offset = position >> 3
+        if not data[offset] >> (7 - (position & 7)) & 1:
+            position += 1
+            values.append(value)
+            continue
+
+        window = int.from_bytes(data[offset:offset + FLOAT_WINDOW], 'big')
+        top = FLOAT_WINDOW * 8 - 1 - (position & 7)
+        if window >> (top - 1) & 1:
+            leading = window >> (top - 6) & 0x1F
+            meaningful = (window >> (top - 12) & 0x3F) + 1
+            trailing = 64 - leading - meaningful
+            value ^= (window >> (top - 12 - meaningful) & ((1 << meaningful) - 1)) << trailing
+            position += 13 + meaningful
+        else:
+            meaningful = 64 - leading - trailing
+            value ^= (window >> (top - 1 - meaningful) & ((1 << meaningful) - 1)) << trailing
+            position += 2 + meaningful
+        values.append(value)
+    return np.asarray(values, dtype=np.uint64).view(np.float64)
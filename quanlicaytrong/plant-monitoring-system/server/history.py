@@ -0,0 +1,87 @@
+import numpy as np
+from flask import current_app
+
+from rollups import ROLLUP_MODELS, query_rollups
+from wire_format import DTYPE_INT16, RAW_METRIC_DTYPES, to_epoch_seconds
+
+HISTORY_STREAM_BATCH_SIZE = 500
+
+HISTORY_LABELS = {
+    'raw': ('timestamp', '%Y-%m-%d %H:%M:%S'),
+    'minute': ('timestamp', '%Y-%m-%d %H:%M:%S'),
+    'hour': ('timestamp', '%Y-%m-%d %H:%M:%S'),
+    'day': ('date', '%Y-%m-%d'),
+    'month': ('month', '%Y-%m')
+}
+
+
+def reader_session():
+    # History reads go to the storage reader pool so they never hold the single writer connection
+    return current_app.extensions['storage'].reader_session()
+
+
+def recent_readings(device_id, start_date):
+    # Windows the shared memory ring still holds in full are read from it instead of SQLite
+    return current_app.extensions['recent_readings'].covering(device_id, start_date)
+
+
+def iter_history(interval, device_id, start_date, metrics):
+    label_key, label_format = HISTORY_LABELS[interval]
+
+    recent = recent_readings(device_id, start_date) if interval == 'raw' else None
+    if recent is not None:
+        epochs, values = recent.read_columns(device_id, start_date, metrics=metrics)
+        # The ring keeps every metric as float64; integer metrics go out as ints, like rows from the database
+        yield from iter_columns(interval, epochs, {
+            metric: column.astype(np.int64) if RAW_METRIC_DTYPES[metric] == DTYPE_INT16 else column
+            for metric, column in values.items()
+        })
+    elif interval == 'raw':
+        rows = current_app.extensions['sensor_partitions'].read_range(
+            reader_session(), device_id, start_date, batch_size=HISTORY_STREAM_BATCH_SIZE
+        )
+        for row in rows:
+            item = {label_key: row.timestamp.strftime(label_format)}
+            for metric in metrics:
+                item[metric] = getattr(row, metric)
+            yield item
+    else:
+        for bucket in query_rollups(interval, device_id, start_date, session=reader_session()).yield_per(HISTORY_STREAM_BATCH_SIZE):
+            item = {label_key: bucket.bucket.strftime(label_format)}
+            for metric in metrics:
+                item[metric] = bucket.average(metric)
+            yield item
+
+
+def load_history_columns(interval, device_id, start_date, metrics):
+    recent = recent_readings(device_id, start_date) if interval == 'raw' else None
+    if recent is not None:
+        return recent.read_columns(device_id, start_date, metrics=metrics)
+
+    if interval == 'raw':
+        return current_app.extensions['sensor_partitions'].read_columns(
+            reader_session(), device_id, start_date, metrics=metrics, batch_size=HISTORY_STREAM_BATCH_SIZE
+        )
+
+    model = ROLLUP_MODELS[interval]
+    rows = query_rollups(interval, device_id, start_date, session=reader_session()).with_entities(
+        model.bucket, model.count, *[getattr(model, f'{metric}_sum') for metric in metrics]
+    ).all()
+
+    buckets = [row[0] for row in rows]
+    counts = np.asarray([row[1] for row in rows], dtype=np.float64)
+    sums = np.asarray([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(metrics))
+    averages = sums / counts[:, None] if len(rows) else sums
+    return to_epoch_seconds(buckets), {metric: averages[:, index] for index, metric in enumerate(metrics)}
+
+
+def iter_columns(interval, epochs, values):
+    label_key, label_format = HISTORY_LABELS[interval]
+    timestamps = np.asarray(epochs, dtype='datetime64[s]').astype(object)
+    columns = {metric: np.asarray(column).tolist() for metric, column in values.items()}
+
+    for index, timestamp in enumerate(timestamps):
+        item = {label_key: timestamp.strftime(label_format)}
+        for metric, column in columns.items():
+            item[metric] = column[index]
+        yield item
@@ -0,0 +1,153 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from extensions import db
+from metrics import DB_FLUSH_ERRORS, DB_FLUSH_ROWS, DB_FLUSH_SECONDS
+from rollups import apply_rollups, expire_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class SensorDataBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.max_batch_size = 500
+        self.flush_interval = 5.0
+        self.max_pending = 50000
+        self.rollup_retention_days = {}
+        self.retention_interval = 3600.0
+        self._next_retention = 0.0
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        # The asyncio runtime turns this off and runs flush() on its own executor instead of the flusher thread
+        self.autostart = True
+        self.dropped = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_batch_size = app.config.get('DB_FLUSH_BATCH_SIZE', self.max_batch_size)
+        self.flush_interval = app.config.get('DB_FLUSH_INTERVAL', self.flush_interval)
+        self.max_pending = app.config.get('DB_BUFFER_MAX_ROWS', self.max_pending)
+        self.rollup_retention_days = app.config.get('ROLLUP_RETENTION_DAYS', self.rollup_retention_days)
+        self.retention_interval = app.config.get('RETENTION_INTERVAL', self.retention_interval)
+        app.extensions['sensor_buffer'] = self
+
+    def add(self, device_id, temperature, humidity, soil_moisture, light_level, timestamp):
+        row = {
+            'device_id': device_id,
+            'temperature': temperature,
+            'humidity': humidity,
+            'soil_moisture': soil_moisture,
+            'light_level': light_level,
+            'timestamp': timestamp
+        }
+
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(row)
+            pending = len(self._pending)
+
+        if self._thread is None and self.autostart:
+            self.start()
+
+        if pending >= self.max_batch_size:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='sensor-buffer-flusher')
+            self._thread.daemon = True
+
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"Sensor data buffer started (batch size {self.max_batch_size}, interval {self.flush_interval}s)")
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.flush()
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _requeue(self, rows):
+        with self._lock:
+            space = self.max_pending - len(self._pending)
+            if space < len(rows):
+                self.dropped += len(rows) - max(space, 0)
+                rows = rows[len(rows) - max(space, 0):]
+            self._pending.extendleft(reversed(rows))
+
+    def flush(self):
+        written = 0
+
+        with self._flush_lock:
+            while True:
+                rows = self._take_batch()
+                if not rows:
+                    break
+
+                try:
+                    with DB_FLUSH_SECONDS.time(), self.app.app_context():
+                        self.app.extensions['sensor_partitions'].insert(db.session, rows)
+                        apply_rollups(db.session, rows)
+                        db.session.commit()
+                except Exception as e:
+                    DB_FLUSH_ERRORS.inc()
+                    logger.error(f"Error flushing {len(rows)} sensor readings to database: {str(e)}")
+                    with self.app.app_context():
+                        db.session.rollback()
+                    self._requeue(rows)
+                    break
+
+                DB_FLUSH_ROWS.observe(len(rows))
+                written += len(rows)
+
+            if time.monotonic() >= self._next_retention:
+                self.apply_retention()
+
+        if written:
+            logger.info(f"Flushed {written} sensor readings to database")
+        return written
+
+    def apply_retention(self, now=None):
+        # Runs between flushes so expiry shares the single writer with ingest instead of competing for it
+        self._next_retention = time.monotonic() + self.retention_interval
+        try:
+            with self.app.app_context():
+                self.app.extensions['sensor_partitions'].apply_retention(db.engine, now)
+                expire_rollups(db.session, self.rollup_retention_days, now)
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error applying sensor data retention: {str(e)}")
+            with self.app.app_context():
+                db.session.rollback()
@@ -0,0 +1,156 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_DROP_NEWEST = 'drop_newest'
+POLICY_BLOCK = 'block'
+OVERFLOW_POLICIES = [POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_BLOCK]
+
+_STOP = object()
+
+
+class IngestQueue:
+    def __init__(self, handler, app=None):
+        self.handler = handler
+        self.workers = 4
+        self.capacity = 10000
+        self.policy = POLICY_DROP_OLDEST
+        self.block_timeout = 0.5
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lag_last = 0.0
+        self.lag_avg = 0.0
+        self.lag_max = 0.0
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = max(1, app.config.get('INGEST_WORKERS', self.workers))
+        self.capacity = max(self.workers, app.config.get('INGEST_QUEUE_SIZE', self.capacity))
+        self.policy = app.config.get('INGEST_OVERFLOW_POLICY', self.policy)
+        self.block_timeout = app.config.get('INGEST_BLOCK_TIMEOUT', self.block_timeout)
+        if self.policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid INGEST_OVERFLOW_POLICY {self.policy}. Must be one of {OVERFLOW_POLICIES}")
+        app.extensions['ingest_queue'] = self
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            # One bounded queue per worker; a device always lands on the same worker, keeping its messages in order
+            per_worker = self.capacity // self.workers
+            self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+            for index, work_queue in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(work_queue,), name=f'ingest-worker-{index}')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        atexit.register(self.stop)
+        logger.info(f"Ingest queue started ({self.workers} workers, capacity {self.capacity}, policy {self.policy})")
+
+    def stop(self, timeout=5.0):
+        for work_queue in self._queues:
+            try:
+                work_queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("Ingest worker queue still full at shutdown")
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, shard_key, item):
+        if not self._threads:
+            self.start()
+
+        work_queue = self._queues[hash(shard_key) % len(self._queues)]
+        entry = (time.monotonic(), item)
+        self.enqueued += 1
+
+        try:
+            if self.policy == POLICY_BLOCK:
+                work_queue.put(entry, timeout=self.block_timeout)
+            else:
+                work_queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == POLICY_DROP_OLDEST:
+            try:
+                work_queue.get_nowait()
+                work_queue.task_done()
+            except queue.Empty:
+                pass
+            try:
+                work_queue.put_nowait(entry)
+                self.dropped += 1
+                return True
+            except queue.Full:
+                pass
+
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            logger.warning(f"Ingest queue full, {self.dropped} messages dropped so far ({self.policy})")
+        return False
+
+    def _run(self, work_queue):
+        while True:
+            entry = work_queue.get()
+            if entry is _STOP:
+                work_queue.task_done()
+                break
+
+            received_at, item = entry
+            lag = time.monotonic() - received_at
+            failed = False
+
+            try:
+                self.handler(*item)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error in ingest worker: {str(e)}")
+            finally:
+                with self._stats_lock:
+                    self.lag_last = lag
+                    self.lag_avg = lag if not self.processed else self.lag_avg * 0.99 + lag * 0.01
+                    self.lag_max = max(self.lag_max, lag)
+                    self.processed += 1
+                    self.errors += failed
+                work_queue.task_done()
+
+    def join(self):
+        for work_queue in self._queues:
+            work_queue.join()
+
+    def depth(self):
+        return sum(work_queue.qsize() for work_queue in self._queues)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'policy': self.policy,
+            'depth': self.depth(),
+            'capacity': self.capacity,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'lag_seconds': {
+                'last': self.lag_last,
+                'avg': self.lag_avg,
+                'max': self.lag_max
+            }
+        }
@@ -0,0 +1,262 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import queue
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Every message is a JSON object behind a 4-byte big-endian length
+FRAME_HEADER = struct.Struct('>I')
+RECEIVE_SIZE = 65536
+
+
+def encode_frame(message):
+    data = json.dumps(message, separators=(',', ':'), default=str).encode()
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+def read_frames(sock, dispatch):
+    # Returns when the peer closes the connection; socket errors are left to the caller
+    buffer = bytearray()
+    while True:
+        chunk = sock.recv(RECEIVE_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+        # Walk the complete frames by offset and drop them in one go, so a burst is not copied once per frame
+        offset = 0
+        while len(buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+            end = offset + FRAME_HEADER.size + length
+            if len(buffer) < end:
+                break
+            dispatch(json.loads(buffer[offset + FRAME_HEADER.size:end]))
+            offset = end
+        del buffer[:offset]
+
+
+class MessageBus(ABC):
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def _dispatch(self, message):
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Error handling {message.get('type')} bus message: {str(e)}")
+
+    @abstractmethod
+    def publish(self, message):
+        # Returns whether the message went anywhere
+        pass
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalBus(MessageBus):
+    # Publisher and subscribers in one process. Messages still go through JSON,
+    # so subscribers see exactly what they would get over a socket and never share dicts with the publisher
+    def publish(self, message):
+        self._dispatch(json.loads(json.dumps(message, default=str)))
+        return True
+
+
+class Peer:
+    def __init__(self, hub, sock, max_queue):
+        self.hub = hub
+        self.sock = sock
+        self.closed = False
+        self._outbox = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._write, name='bus-peer-writer', daemon=True)
+        self._reader = threading.Thread(target=self._read, name='bus-peer-reader', daemon=True)
+
+    def start(self):
+        self._writer.start()
+        self._reader.start()
+
+    def send(self, frame):
+        try:
+            self._outbox.put_nowait(frame)
+        except queue.Full:
+            # A subscriber this far behind is dropped; it reconnects and starts again from a snapshot
+            logger.warning(f"Message bus subscriber fell {self._outbox.maxsize} messages behind, disconnecting it")
+            self.close()
+
+    def _write(self):
+        while not self.closed:
+            frame = self._outbox.get()
+            if frame is None:
+                break
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                break
+        self.close()
+
+    def _read(self):
+        try:
+            read_frames(self.sock, self.hub._dispatch)
+        except (OSError, ValueError):
+            pass
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.hub._remove(self)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        try:
+            self._outbox.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class UnixSocketHub(MessageBus):
+    # The publishing end: every message goes to every connected subscriber, and what they send back
+    # reaches this process's handlers. Each subscriber gets its own queue, so a slow one never blocks ingest
+    def __init__(self, path, greeting=None, max_queue=10000):
+        super().__init__()
+        self.path = path
+        self.greeting = greeting
+        self.max_queue = max_queue
+        self.published = 0
+        self._peers = set()
+        # Reentrant: a peer that overflows while being greeted removes itself under the same lock
+        self._lock = threading.RLock()
+        self._server = None
+        self._closed = False
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(64)
+        threading.Thread(target=self._accept, name='bus-hub', daemon=True).start()
+        logger.info(f"Message bus listening on {self.path}")
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                break
+            peer = Peer(self, sock, self.max_queue)
+            # The greeting is queued before the peer can see any update, so nothing falls between the two
+            with self._lock:
+                if self.greeting is not None:
+                    peer.send(encode_frame(self.greeting()))
+                self._peers.add(peer)
+            peer.start()
+            logger.info(f"Message bus subscriber connected ({len(self._peers)} total)")
+
+    def _remove(self, peer):
+        with self._lock:
+            if peer not in self._peers:
+                return
+            self._peers.discard(peer)
+        logger.info(f"Message bus subscriber disconnected ({len(self._peers)} left)")
+
+    def subscriber_count(self):
+        return len(self._peers)
+
+    def publish(self, message):
+        frame = encode_frame(message)
+        with self._lock:
+            peers = list(self._peers)
+        for peer in peers:
+            peer.send(frame)
+        self.published += 1
+        return bool(peers)
+
+    def close(self):
+        self._closed = True
+        if self._server is not None:
+            self._server.close()
+        for peer in list(self._peers):
+            peer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UnixSocketClient(MessageBus):
+    # The subscribing end: keeps reconnecting to the hub, and its own messages go back to it
+    def __init__(self, path, reconnect_delay=1.0):
+        super().__init__()
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='bus-client', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                logger.debug(f"Message bus at {self.path} not reachable: {str(e)}")
+                self._stopped.wait(self.reconnect_delay)
+                continue
+
+            self._sock = sock
+            logger.info(f"Connected to message bus at {self.path}")
+            try:
+                read_frames(sock, self._dispatch)
+            except (OSError, ValueError) as e:
+                logger.error(f"Message bus connection failed: {str(e)}")
+            with self._send_lock:
+                self._sock = None
+            sock.close()
+            if not self._stopped.is_set():
+                logger.warning(f"Lost connection to message bus, reconnecting in {self.reconnect_delay:g}s")
+                self._stopped.wait(self.reconnect_delay)
+
+    def publish(self, message):
+        frame = encode_frame(message)
+        with self._send_lock:
+            if self._sock is None:
+                logger.warning(f"Message bus not connected, dropped {message.get('type')} message")
+                return False
+            try:
+                self._sock.sendall(frame)
+            except OSError as e:
+                logger.error(f"Error sending to message bus: {str(e)}")
+                return False
+        return True
+
+    def close(self):
+        self._stopped.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
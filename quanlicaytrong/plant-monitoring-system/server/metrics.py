@@ -0,0 +1,178 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function):
+        # Read the value at scrape time, for numbers another component already tracks
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), float(self._function()))]
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value in self.samples():
+            labelnames = self.labelnames if len(key) == len(self.labelnames) else self.labelnames + ('le',)
+            lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._values.items())
+
+        samples = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', key + (_format_value(float(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+registry = MetricsRegistry()
+
+MQTT_MESSAGES = registry.counter(
+    'plant_mqtt_messages_total', 'MQTT messages received, by topic', ['subtopic'])
+MQTT_MESSAGE_SECONDS = registry.histogram(
+    'plant_mqtt_message_processing_seconds', 'Time spent processing one MQTT message', ['subtopic'])
+INGEST_QUEUE_DEPTH = registry.gauge(
+    'plant_ingest_queue_depth', 'MQTT messages waiting for an ingest worker')
+INGEST_QUEUE_DROPPED = registry.counter(
+    'plant_ingest_queue_dropped_total', 'MQTT messages dropped because the ingest queue was full')
+DB_FLUSH_SECONDS = registry.histogram(
+    'plant_db_flush_seconds', 'Time spent writing one batch of sensor readings')
+DB_FLUSH_ROWS = registry.histogram(
+    'plant_db_flush_batch_rows', 'Sensor readings written per batch', buckets=SIZE_BUCKETS)
+DB_FLUSH_ERRORS = registry.counter(
+    'plant_db_flush_errors_total', 'Sensor reading batches that failed to write')
+DB_BUFFER_PENDING = registry.gauge(
+    'plant_db_buffer_pending_rows', 'Sensor readings waiting to be written')
+SOCKETIO_CLIENTS = registry.gauge(
+    'plant_socketio_connected_clients', 'Connected Socket.IO clients')
+SOCKETIO_EMITS = registry.counter(
+    'plant_socketio_emits_total', 'Socket.IO broadcasts sent by the scheduler')
+AUTOMATION_COMMANDS = registry.counter(
+    'plant_automation_commands_total', 'Commands sent by the server-side automation engine', ['command'])
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'plant_http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method', 'status'])
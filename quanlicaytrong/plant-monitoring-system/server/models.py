@@ -3,18 +3,24 @@ from datetime import datetime
 
 class SensorData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False, default='default')
     temperature = db.Column(db.Float, nullable=False)
     humidity = db.Column(db.Float, nullable=False)
     soil_moisture = db.Column(db.Integer, nullable=False)
     light_level = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_sensor_data_device_timestamp', 'device_id', 'timestamp'),
+    )
+    
     def __repr__(self):
-        return f'<SensorData {self.timestamp}: Temp={self.temperature}, Humidity={self.humidity}, Soil={self.soil_moisture}, Light={self.light_level}>'
+        return f'<SensorData {self.device_id} {self.timestamp}: Temp={self.temperature}, Humidity={self.humidity}, Soil={self.soil_moisture}, Light={self.light_level}>'
     
     def to_dict(self):
         return {
             'id': self.id,
+            'device_id': self.device_id,
             'temperature': self.temperature,
             'humidity': self.humidity,
             'soil_moisture': self.soil_moisture,
@@ -24,6 +30,7 @@ class SensorData(db.Model):
 
 class ThresholdSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False, default='default', unique=True)
     temperature_min = db.Column(db.Float, nullable=False, default=18.0)
     temperature_max = db.Column(db.Float, nullable=False, default=30.0)
     soil_moisture_min = db.Column(db.Integer, nullable=False, default=30)
@@ -32,14 +39,76 @@ class ThresholdSettings(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
-        return f'<ThresholdSettings: Temp min={self.temperature_min}, Temp max={self.temperature_max}>'
+        return f'<ThresholdSettings {self.device_id}: Temp min={self.temperature_min}, Temp max={self.temperature_max}>'
     
     def to_dict(self):
         return {
+            'device_id': self.device_id,
             'temperature_min': self.temperature_min,
             'temperature_max': self.temperature_max,
             'soil_moisture_min': self.soil_moisture_min,
             'humidity_min': self.humidity_min,
             'light_level_min': self.light_level_min,
             'last_updated': self.last_updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+
+class RollupMixin:
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False, default='default')
+    bucket = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    temperature_sum = db.Column(db.Float, nullable=False, default=0)
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    humidity_sum = db.Column(db.Float, nullable=False, default=0)
+    humidity_min = db.Column(db.Float)
+    humidity_max = db.Column(db.Float)
+    soil_moisture_sum = db.Column(db.Float, nullable=False, default=0)
+    soil_moisture_min = db.Column(db.Integer)
+    soil_moisture_max = db.Column(db.Integer)
+    light_level_sum = db.Column(db.Float, nullable=False, default=0)
+    light_level_min = db.Column(db.Integer)
+    light_level_max = db.Column(db.Integer)
+    
+    def average(self, metric):
+        if not self.count:
+            return None
+        return getattr(self, f'{metric}_sum') / self.count
+    
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.device_id} {self.bucket}: count={self.count}>'
+
+class SensorRollupMinute(RollupMixin, db.Model):
+    __tablename__ = 'sensor_rollup_minute'
+    __table_args__ = (db.UniqueConstraint('device_id', 'bucket', name='uq_sensor_rollup_minute_bucket'),)
+
+class SensorRollupHour(RollupMixin, db.Model):
+    __tablename__ = 'sensor_rollup_hour'
+    __table_args__ = (db.UniqueConstraint('device_id', 'bucket', name='uq_sensor_rollup_hour_bucket'),)
+
+class SensorRollupDay(RollupMixin, db.Model):
+    __tablename__ = 'sensor_rollup_day'
+    __table_args__ = (db.UniqueConstraint('device_id', 'bucket', name='uq_sensor_rollup_day_bucket'),)
+
+class SensorRollupMonth(RollupMixin, db.Model):
+    __tablename__ = 'sensor_rollup_month'
+    __table_args__ = (db.UniqueConstraint('device_id', 'bucket', name='uq_sensor_rollup_month_bucket'),)
+
+class SensorChunk(db.Model):
+    # Gorilla-compressed readings of one device over one fixed time window (see chunk_store.py)
+    __tablename__ = 'sensor_chunk'
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False, default='default')
+    start = db.Column(db.DateTime, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    timestamps = db.Column(db.LargeBinary, nullable=False)
+    temperature = db.Column(db.LargeBinary, nullable=False)
+    humidity = db.Column(db.LargeBinary, nullable=False)
+    soil_moisture = db.Column(db.LargeBinary, nullable=False)
+    light_level = db.Column(db.LargeBinary, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('device_id', 'start', name='uq_sensor_chunk_device_start'),)
+    
+    def __repr__(self):
+        return f'<SensorChunk {self.device_id} {self.start}: count={self.count}>'
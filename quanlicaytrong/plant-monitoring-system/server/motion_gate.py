@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, width=64, threshold=12, min_area=0.01, hold_seconds=3.0, learning_rate=0.05):
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.hold_seconds = hold_seconds
+        self.learning_rate = learning_rate
+        self.motion = 0.0
+        self.checks = 0
+        self.opened = 0
+        self._background = None
+        self._open_until = 0.0
+
+    def check(self, frame, now):
+        # A tiny grayscale copy compared against a running-average background; costs far less than hand inference
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.cvtColor(cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        self.checks += 1
+
+        if self._background is None or self._background.shape != small.shape:
+            self._background = small.astype(np.float32)
+            self.hold(now)
+            return True
+
+        difference = cv2.absdiff(small, cv2.convertScaleAbs(self._background))
+        self.motion = np.count_nonzero(difference > self.threshold) / difference.size
+        cv2.accumulateWeighted(small, self._background, self.learning_rate)
+
+        if self.motion >= self.min_area:
+            self.hold(now)
+        return self.is_open(now)
+
+    def hold(self, now):
+        # Called while hands are visible too, so a hand held still for a gesture keeps inference running
+        if not self.is_open(now):
+            self.opened += 1
+        self._open_until = now + self.hold_seconds
+
+    def is_open(self, now):
+        return now < self._open_until
@@ -0,0 +1,242 @@
+import logging
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, inspect, insert, select
+
+from devices import SENSOR_KEYS
+from models import SensorData
+from wire_format import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'sensor_data_'
+PARTITION_PATTERN = re.compile(r'^sensor_data_(\d{4})(\d{2})$')
+
+
+def month_key(timestamp):
+    return timestamp.year * 100 + timestamp.month
+
+
+def shift_month_key(key, months):
+    year, month = divmod(key, 100)
+    index = year * 12 + (month - 1) + months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+class SensorPartitions:
+    def __init__(self, app=None):
+        self.app = None
+        self.retention_months = 0
+        self.metadata = MetaData()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.retention_months = app.config.get('SENSOR_RETENTION_MONTHS', self.retention_months)
+        app.extensions['sensor_partitions'] = self
+
+    def _define(self, key):
+        name = f'{PARTITION_PREFIX}{key}'
+        columns = [
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in SensorData.__table__.columns
+        ]
+        table = Table(name, self.metadata, *columns)
+        Index(f'ix_{name}_device_timestamp', table.c.device_id, table.c.timestamp)
+        return table
+
+    def _scan(self, bind):
+        keys = set()
+        for name in inspect(bind).get_table_names():
+            match = PARTITION_PATTERN.match(name)
+            if match:
+                keys.add(int(match.group(1)) * 100 + int(match.group(2)))
+
+        with self._lock:
+            added = [key for key in keys if key not in self._tables]
+            for key in added:
+                self._tables[key] = self._define(key)
+        return added, keys
+
+    def load(self, bind):
+        self._scan(bind)
+        logger.info(f"Loaded {len(self._tables)} sensor data partitions")
+
+    def refresh(self, bind):
+        # Picks up partitions another process created or dropped since load()
+        added, keys = self._scan(bind)
+        with self._lock:
+            for key in [key for key in self._tables if key not in keys]:
+                self.metadata.remove(self._tables.pop(key))
+        for key in added:
+            logger.info(f"Found sensor data partition {PARTITION_PREFIX}{key}")
+
+    def keys(self):
+        return sorted(self._tables.keys())
+
+    def tables(self):
+        # (key, table) pairs in month order, copied under the lock: apply_retention() can drop a partition
+        # while a read is still walking the list
+        with self._lock:
+            return sorted(self._tables.items(), key=lambda item: item[0])
+
+    def is_current(self, key, table):
+        # False once the partition has been dropped (or dropped and recreated) since tables() was taken
+        return self._tables.get(key) is table
+
+    def cutoff_key(self, now=None):
+        if not self.retention_months:
+            return None
+        return shift_month_key(month_key(now or datetime.now()), -(self.retention_months - 1))
+
+    def table_for(self, key, bind):
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                table = self._define(key)
+                table.create(bind, checkfirst=True)
+                self._tables[key] = table
+                logger.info(f"Created sensor data partition {table.name}")
+                created = True
+            else:
+                created = False
+
+        if created:
+            self.apply_retention(bind)
+        return table
+
+    def insert(self, session, rows):
+        cutoff = self.cutoff_key()
+        groups = {}
+        for row in rows:
+            key = month_key(row['timestamp'])
+            if cutoff is not None and key < cutoff:
+                continue
+            groups.setdefault(key, []).append(row)
+
+        # Missing partitions are created on a connection of their own, before this session writes anything.
+        # The durable writer pool has a single connection, so callers that already hold it create them first
+        bind = session.get_bind()
+        tables = {key: self.table_for(key, bind) for key in groups}
+        for key, group in groups.items():
+            session.execute(insert(tables[key]), group)
+        return sum(len(group) for group in groups.values())
+
+    def tables_between(self, start_date, end_date=None):
+        start_key = month_key(start_date)
+        end_key = month_key(end_date) if end_date is not None else None
+        return [
+            (key, table) for key, table in self.tables()
+            if key >= start_key and (end_key is None or key <= end_key)
+        ]
+
+    def select_range(self, table, device_id, start_date, end_date=None):
+        stmt = select(table).where(table.c.device_id == device_id, table.c.timestamp >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(table.c.timestamp < end_date)
+        return stmt.order_by(table.c.timestamp)
+
+    def read_range(self, session, device_id, start_date, end_date=None, batch_size=1000):
+        # Partitions never overlap, so reading them in month order keeps rows ordered by timestamp
+        for key, table in self.tables_between(start_date, end_date):
+            if not self.is_current(key, table):
+                continue
+            stmt = self.select_range(table, device_id, start_date, end_date)
+            for row in session.execute(stmt.execution_options(yield_per=batch_size)):
+                yield row
+
+    def read_columns(self, session, device_id, start_date, end_date=None, metrics=SENSOR_KEYS, batch_size=1000):
+        timestamps = []
+        values = {metric: [] for metric in metrics}
+        for row in self.read_range(session, device_id, start_date, end_date, batch_size):
+            timestamps.append(row.timestamp)
+            for metric in metrics:
+                values[metric].append(getattr(row, metric))
+        return to_epoch_seconds(timestamps), {
+            metric: np.asarray(values[metric], dtype=np.float64) for metric in metrics
+        }
+
+    def read_all(self, session, batch_size=1000):
+        for key, table in self.tables():
+            if not self.is_current(key, table):
+                continue
+            stmt = select(table).order_by(table.c.timestamp).execution_options(yield_per=batch_size)
+            for row in session.execute(stmt):
+                yield row
+
+    def latest(self, session, device_id):
+        for key, table in reversed(self.tables()):
+            if not self.is_current(key, table):
+                continue
+            row = session.execute(
+                select(table).where(table.c.device_id == device_id).order_by(table.c.timestamp.desc()).limit(1)
+            ).first()
+            if row is not None:
+                return row
+        return None
+
+    def has_rows(self, session):
+        return bool(self.keys())
+
+    def count_rows(self, session):
+        return sum(
+            session.execute(select(func.count()).select_from(table)).scalar()
+            for key, table in self.tables() if self.is_current(key, table)
+        )
+
+    def apply_retention(self, bind, now=None):
+        cutoff = self.cutoff_key(now)
+        if cutoff is None:
+            return []
+
+        dropped = []
+        with self._lock:
+            for key in [key for key in self._tables if key < cutoff]:
+                table = self._tables.pop(key)
+                table.drop(bind, checkfirst=True)
+                self.metadata.remove(table)
+                dropped.append(table.name)
+
+        if dropped:
+            logger.info(f"Dropped expired sensor data partitions: {', '.join(dropped)}")
+        return dropped
+
+    def migrate_legacy_rows(self, session, batch_size=5000):
+        legacy = SensorData.__table__
+        columns = [column for column in legacy.columns if column.name != 'id']
+        total = 0
+
+        # Each batch below is read in the same transaction it is inserted in, so the partitions go first
+        cutoff = self.cutoff_key()
+        months = session.execute(select(func.distinct(func.strftime('%Y%m', legacy.c.timestamp)))).scalars().all()
+        session.commit()
+        for month in months:
+            if month is not None and (cutoff is None or int(month) >= cutoff):
+                self.table_for(int(month), session.get_bind())
+
+        while True:
+            rows = session.execute(
+                select(legacy.c.id, *columns).order_by(legacy.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            self.insert(session, [{column.name: row._mapping[column.name] for column in columns} for row in rows])
+            session.execute(delete(legacy).where(legacy.c.id <= rows[-1].id))
+            session.commit()
+            total += len(rows)
+
+        if total:
+            logger.info(f"Moved {total} legacy sensor readings into monthly partitions")
+        return total
@@ -0,0 +1,316 @@
+import argparse
+import atexit
+import calendar
+import logging
+import mmap
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import Config
+from devices import SENSOR_KEYS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PLRB'
+VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'), ('version', '<u4'), ('capacity', '<u8'), ('max_devices', '<u4'), ('devices', '<u4'),
+    ('writer_pid', '<i8'), ('created', '<i8')
+])
+# 'head' counts every reading a device has ever written; its newest reading sits at slot (head - 1) % capacity
+DEVICE_DTYPE = np.dtype([('device_id', 'S64'), ('head', '<u8')])
+ALIGNMENT = 64
+COLUMNS = ['timestamp', *SENSOR_KEYS]
+COLUMN_DTYPES = {'timestamp': np.int64, **{metric: np.float64 for metric in SENSOR_KEYS}}
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def file_size(capacity, max_devices):
+    offset = align(HEADER_DTYPE.itemsize) + align(DEVICE_DTYPE.itemsize * max_devices)
+    return offset + sum(align(np.dtype(COLUMN_DTYPES[column]).itemsize * capacity * max_devices) for column in COLUMNS)
+
+
+def to_epoch(timestamp):
+    # Wall-clock seconds, the same convention as wire_format.to_epoch_seconds
+    return calendar.timegm(timestamp.timetuple())
+
+
+def writer_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RingBuffer:
+    # The mapped file: a header, a device table and one (max_devices, capacity) array per column,
+    # all views straight onto the mapping
+    def __init__(self):
+        self.path = None
+        self.header = None
+        self.device_table = None
+        self.columns = {}
+        self.capacity = 0
+        self.max_devices = 0
+        self._slots = {}
+        self._mmap = None
+
+    def _attach(self, buffer):
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buffer)
+        if self.header['magic'] != MAGIC or self.header['version'] != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} recent readings ring buffer")
+
+        self.capacity = int(self.header['capacity'])
+        self.max_devices = int(self.header['max_devices'])
+        offset = align(HEADER_DTYPE.itemsize)
+        self.device_table = np.ndarray((self.max_devices,), dtype=DEVICE_DTYPE, buffer=buffer, offset=offset)
+        offset += align(DEVICE_DTYPE.itemsize * self.max_devices)
+        for column in COLUMNS:
+            self.columns[column] = np.ndarray(
+                (self.max_devices, self.capacity), dtype=COLUMN_DTYPES[column], buffer=buffer, offset=offset
+            )
+            offset += align(self.columns[column].nbytes)
+
+    def slot(self, device_id):
+        slot = self._slots.get(device_id)
+        if slot is None and len(self._slots) < int(self.header['devices']):
+            for index in range(len(self._slots), int(self.header['devices'])):
+                self._slots[self.device_table['device_id'][index].decode()] = index
+            slot = self._slots.get(device_id)
+        return slot
+
+    def device_ids(self):
+        self.slot(None)
+        return list(self._slots)
+
+    def covers(self, device_id, start_date):
+        # Only a live writer keeps the ring complete, and only back to when it started or to where it wrapped
+        if self.header is None or not writer_alive(self.header['writer_pid']):
+            return False
+        start = to_epoch(start_date)
+        if start < int(self.header['created']):
+            return False
+        slot = self.slot(device_id)
+        if slot is None:
+            # Not written yet, or refused a slot once the ring was full: only the database has its readings
+            return False
+        head = int(self.device_table['head'][slot])
+        return head <= self.capacity or int(self.columns['timestamp'][slot, head % self.capacity]) <= start
+
+    def view(self, device_id):
+        # Zero-copy: the raw ring rows in slot order, oldest slot at head % capacity once it has wrapped.
+        # The writer keeps overwriting them, so anything that needs a consistent window should use read_columns()
+        slot = self.slot(device_id)
+        if slot is None:
+            return 0, {column: self.columns[column][0, :0] for column in COLUMNS}
+        return int(self.device_table['head'][slot]), {column: self.columns[column][slot] for column in COLUMNS}
+
+    def read_columns(self, device_id, start_date, end_date=None, metrics=SENSOR_KEYS):
+        slot = self.slot(device_id)
+        if slot is None:
+            return np.empty(0, dtype=np.int64), {metric: np.empty(0, dtype=np.float64) for metric in metrics}
+
+        # Lock-free: the writer fills a slot before it moves head, so every slot below head is complete,
+        # and the ones it reached again while we were copying are dropped afterwards
+        head = int(self.device_table['head'][slot])
+        count = min(head, self.capacity)
+        indices = np.arange(head - count, head) % self.capacity
+        epochs = self.columns['timestamp'][slot].take(indices)
+        values = {metric: self.columns[metric][slot].take(indices) for metric in metrics}
+        overwritten = max(0, int(self.device_table['head'][slot]) - self.capacity - (head - count))
+
+        mask = epochs >= to_epoch(start_date)
+        if end_date is not None:
+            mask &= epochs < to_epoch(end_date)
+        mask[:overwritten] = False
+        epochs = epochs[mask]
+        values = {metric: column[mask] for metric, column in values.items()}
+
+        # Devices may send their own, slightly out of order timestamps
+        if len(epochs) > 1 and (np.diff(epochs) < 0).any():
+            order = np.argsort(epochs, kind='stable')
+            epochs = epochs[order]
+            values = {metric: column[order] for metric, column in values.items()}
+        return epochs, values
+
+    def close(self):
+        self.header = None
+        self.device_table = None
+        self.columns = {}
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views handed out by view() still point into the mapping; it is released with them
+                pass
+            self._mmap = None
+
+
+class RecentReadingsReader(RingBuffer):
+    # For other processes: maps the writer's file read-only, so every array is a read-only view
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._attach(self._mmap)
+
+
+class RecentReadings(RingBuffer):
+    def __init__(self, app=None):
+        super().__init__()
+        self.app = None
+        self.hours = 6.0
+        self.interval = 1.0
+        self.device_limit = 64
+        self.dropped = 0
+        self._reader = None
+        self._lock = threading.Lock()
+        self._failed = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.hours = app.config.get('RECENT_READINGS_HOURS', self.hours)
+        self.interval = app.config.get('RECENT_READINGS_INTERVAL', self.interval)
+        self.device_limit = app.config.get('RECENT_READINGS_MAX_DEVICES', self.device_limit)
+        self.path = app.config.get('RECENT_READINGS_PATH', self.path)
+        app.extensions['recent_readings'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.hours) and self.path is not None
+
+    def _create(self):
+        # Called with the lock held, on the first reading this process ingests
+        temporary = f'{self.path}.{os.getpid()}'
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER_DTYPE.itemsize:
+                pid = int(np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)[0]['writer_pid'])
+                if pid != os.getpid() and writer_alive(pid):
+                    raise RuntimeError(f"process {pid} is already writing it")
+
+            capacity = max(1, int(self.hours * 3600 / self.interval))
+            size = file_size(capacity, self.device_limit)
+            # A fresh file every start: readers holding the old one keep their mapping until they reopen
+            with open(temporary, 'w+b') as file:
+                file.truncate(size)
+                self._mmap = mmap.mmap(file.fileno(), size)
+
+            header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._mmap)
+            header['magic'] = MAGIC
+            header['version'] = VERSION
+            header['capacity'] = capacity
+            header['max_devices'] = self.device_limit
+            header['writer_pid'] = os.getpid()
+            header['created'] = to_epoch(datetime.now())
+            self._attach(self._mmap)
+            os.replace(temporary, self.path)
+        except Exception as e:
+            logger.error(f"Recent readings ring buffer disabled, could not create {self.path}: {str(e)}")
+            self._failed = True
+            self.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return False
+
+        atexit.register(self.release)
+        logger.info(f"Recent readings ring buffer at {self.path} "
+                    f"({capacity} readings per device, {self.max_devices} devices, {size / (1024 * 1024):.1f} MB)")
+        return True
+
+    def _register(self, device_id):
+        index = int(self.header['devices'])
+        if index >= self.max_devices:
+            return None
+        # The id goes in before the device count that makes it visible to readers
+        self.device_table['device_id'][index] = device_id.encode()[:DEVICE_DTYPE['device_id'].itemsize]
+        self.header['devices'] = index + 1
+        self._slots[device_id] = index
+        return index
+
+    def append(self, device_id, timestamp, temperature, humidity, soil_moisture, light_level):
+        if not self.enabled or self._failed:
+            return
+
+        with self._lock:
+            if self.header is None and not self._create():
+                return
+            slot = self._slots.get(device_id)
+            if slot is None:
+                slot = self._register(device_id)
+                if slot is None:
+                    self.dropped += 1
+                    return
+
+            head = int(self.device_table['head'][slot])
+            index = head % self.capacity
+            self.columns['timestamp'][slot, index] = to_epoch(timestamp)
+            self.columns['temperature'][slot, index] = temperature
+            self.columns['humidity'][slot, index] = humidity
+            self.columns['soil_moisture'][slot, index] = soil_moisture
+            self.columns['light_level'][slot, index] = light_level
+            self.device_table['head'][slot] = head + 1
+
+    def covering(self, device_id, start_date):
+        # The ring this process can read from for the window, or None to fall back to the database.
+        # Web processes that never ingest map the writer's file instead of their own
+        if not self.enabled:
+            return None
+        ring = self if self.header is not None else self._attach_reader()
+        if ring is not None and ring.covers(device_id, start_date):
+            return ring
+        return None
+
+    def _attach_reader(self):
+        reader = self._reader
+        if reader is not None and writer_alive(reader.header['writer_pid']):
+            return reader
+        try:
+            self._reader = RecentReadingsReader(self.path)
+        except (OSError, ValueError):
+            self._reader = None
+        return self._reader
+
+    def release(self):
+        with self._lock:
+            if self.header is not None:
+                self.header['writer_pid'] = 0
+                self._mmap.flush()
+            self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the recent readings ring buffer of a running server')
+    parser.add_argument('--path', default=None, help='Ring buffer file (defaults to RECENT_READINGS_PATH)')
+    parser.add_argument('--minutes', type=float, default=10)
+    args = parser.parse_args()
+
+    ring = RecentReadingsReader(args.path or Config.RECENT_READINGS_PATH)
+    start_date = datetime.now() - timedelta(minutes=args.minutes)
+    print(f"{'device':<20} {'readings':>8}  " + '  '.join(f"{metric + ' min/mean/max':>28}" for metric in SENSOR_KEYS))
+    for device_id in ring.device_ids():
+        epochs, values = ring.read_columns(device_id, start_date)
+        if not len(epochs):
+            continue
+        summary = '  '.join(
+            f"{f'{column.min():.1f} / {column.mean():.1f} / {column.max():.1f}':>28}" for column in values.values()
+        )
+        print(f"{device_id:<20} {len(epochs):>8}  {summary}")
+
+
+if __name__ == '__main__':
+    main()
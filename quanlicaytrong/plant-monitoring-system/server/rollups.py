@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from devices import SENSOR_KEYS
+from models import SensorRollupMinute, SensorRollupHour, SensorRollupDay, SensorRollupMonth
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default cap on bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER, 3.32+)
+SQLITE_MAX_VARIABLES = 32766
+
+ROLLUP_MODELS = {
+    'minute': SensorRollupMinute,
+    'hour': SensorRollupHour,
+    'day': SensorRollupDay,
+    'month': SensorRollupMonth
+}
+
+
+def bucket_start(timestamp, resolution):
+    if resolution == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'month':
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def aggregate(rows, resolution):
+    buckets = {}
+
+    for row in rows:
+        key = (row['device_id'], bucket_start(row['timestamp'], resolution))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = {'device_id': key[0], 'bucket': key[1], 'count': 0}
+            for metric in SENSOR_KEYS:
+                bucket[f'{metric}_sum'] = 0
+                bucket[f'{metric}_min'] = row[metric]
+                bucket[f'{metric}_max'] = row[metric]
+            buckets[key] = bucket
+
+        bucket['count'] += 1
+        for metric in SENSOR_KEYS:
+            value = row[metric]
+            bucket[f'{metric}_sum'] += value
+            if value < bucket[f'{metric}_min']:
+                bucket[f'{metric}_min'] = value
+            if value > bucket[f'{metric}_max']:
+                bucket[f'{metric}_max'] = value
+
+    return list(buckets.values())
+
+
+def apply_rollups(session, rows):
+    if not rows:
+        return
+
+    for resolution, model in ROLLUP_MODELS.items():
+        values = aggregate(rows, resolution)
+        # Every bucket binds one parameter per column, so a statement takes as many buckets as SQLite allows
+        per_statement = max(1, SQLITE_MAX_VARIABLES // len(values[0]))
+        for index in range(0, len(values), per_statement):
+            session.execute(upsert_rollups(model, values[index:index + per_statement]))
+
+
+def upsert_rollups(model, values):
+    stmt = sqlite_insert(model).values(values)
+    excluded = stmt.excluded
+
+    update = {'count': model.count + excluded.count}
+    for metric in SENSOR_KEYS:
+        column_sum = getattr(model, f'{metric}_sum')
+        column_min = getattr(model, f'{metric}_min')
+        column_max = getattr(model, f'{metric}_max')
+        update[f'{metric}_sum'] = column_sum + getattr(excluded, f'{metric}_sum')
+        # SQLite's two-argument min()/max() are scalar functions, not aggregates
+        update[f'{metric}_min'] = func.min(column_min, getattr(excluded, f'{metric}_min'))
+        update[f'{metric}_max'] = func.max(column_max, getattr(excluded, f'{metric}_max'))
+
+    return stmt.on_conflict_do_update(index_elements=['device_id', 'bucket'], set_=update)
+
+
+def expire_rollups(session, retention_days, now=None):
+    now = now or datetime.now()
+    expired = 0
+    for resolution, days in retention_days.items():
+        if not days:
+            continue
+        model = ROLLUP_MODELS[resolution]
+        cutoff = bucket_start(now - timedelta(days=days), resolution)
+        expired += session.query(model).filter(model.bucket < cutoff).delete(synchronize_session=False)
+
+    if expired:
+        logger.info(f"Dropped {expired} expired sensor rollup buckets")
+    return expired
+
+
+def query_rollups(resolution, device_id, start_date, end_date=None, session=None):
+    model = ROLLUP_MODELS[resolution]
+    query = (model.query if session is None else session.query(model)).filter(
+        model.device_id == device_id,
+        model.bucket >= bucket_start(start_date, resolution)
+    )
+    if end_date is not None:
+        query = query.filter(model.bucket < end_date)
+    return query.order_by(model.bucket)
+
+
+def rebuild_rollups(session, rows, batch_size=5000):
+    for model in ROLLUP_MODELS.values():
+        session.query(model).delete()
+
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append({
+            'device_id': row.device_id,
+            'timestamp': row.timestamp,
+            'temperature': row.temperature,
+            'humidity': row.humidity,
+            'soil_moisture': row.soil_moisture,
+            'light_level': row.light_level
+        })
+        if len(batch) >= batch_size:
+            apply_rollups(session, batch)
+            total += len(batch)
+            batch = []
+
+    apply_rollups(session, batch)
+    total += len(batch)
+    logger.info(f"Rebuilt sensor rollups from {total} readings")
+    return total
@@ -1,56 +1,107 @@
-from flask import Blueprint, render_template, request, jsonify
-from models import SensorData, ThresholdSettings
-from extensions import db, mqtt
+from flask import Blueprint, render_template, request, jsonify, current_app, Response, stream_with_context, g
+from models import SensorData
+from extensions import mqtt, devices
+from devices import DEFAULT_DEVICE_ID, SENSOR_KEYS, SUBTOPIC_THRESHOLDS, SUBTOPIC_COMMAND, SUBTOPIC_MODE, device_topic
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from history import HISTORY_LABELS, HISTORY_STREAM_BATCH_SIZE, iter_history, iter_columns, load_history_columns
+from downsampling import METHODS as DOWNSAMPLING_METHODS, downsample, effective_method
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, registry as metrics_registry
+from wire_format import MIMETYPE as COLUMNAR_MIMETYPE, RAW_METRIC_DTYPES, DTYPE_FLOAT32, encode_columnar
 import json
+import time
 
 main_bp = Blueprint('main', __name__)
 
+TIMED_ENDPOINTS = {'main.get_history', 'main.get_current_data', 'main.manage_thresholds'}
+
+@main_bp.before_request
+def start_request_timer():
+    if request.endpoint in TIMED_ENDPOINTS:
+        g.request_started = time.perf_counter()
+
+@main_bp.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Streaming history responses are timed up to the first byte, not the full body
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint,
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
 @main_bp.route('/')
 def index():
     return render_template('index.html')
 
 @main_bp.route('/api/current')
 def get_current_data():
-    latest_data = SensorData.query.order_by(SensorData.timestamp.desc()).first()
+    device_id = request.args.get('device_id', DEFAULT_DEVICE_ID)
+    since = request.args.get('since', type=int)
+    wait = min(request.args.get('wait', 0, type=float), current_app.config.get('LONG_POLL_MAX_WAIT', 60))
+    device = devices.get(device_id, create=False)
+    latest_data = None
+    
+    if device is None or not device.seq:
+        # Nothing received since startup yet, so fall back to the last stored reading
+        latest_data = current_app.extensions['sensor_partitions'].latest(
+            current_app.extensions['storage'].reader_session(), device_id)
+        if not latest_data and device is None:
+            # Unknown ids never get a registry entry, so clients cannot grow it by long-polling made-up devices
+            return jsonify({'error': 'No data available'}), 404
     
-    if not latest_data:
-        return jsonify({'error': 'No data available'}), 404
+    if since is not None and wait > 0:
+        if device is None:
+            device = devices.get(device_id)
+        create_event = current_app.extensions['socketio'].server.eio.create_event
+        if not device.wait_for_change(since, wait, create_event=create_event):
+            return Response(status=204, headers={'X-Seq': str(device.seq)})
     
-    return jsonify(latest_data.to_dict())
+    if device is None or not device.seq:
+        if not latest_data:
+            return jsonify({'error': 'No data available'}), 404
+        return jsonify({'seq': 0, **SensorData(**latest_data._mapping).to_dict()})
+    
+    seq, state = device.current()
+    if since is not None and seq <= since:
+        return Response(status=204, headers={'X-Seq': str(seq)})
+    return jsonify({'seq': seq, 'device_id': device_id, **state})
 
 @main_bp.route('/api/thresholds', methods=['GET', 'POST'])
 def manage_thresholds():
+    device_id = request.args.get('device_id', DEFAULT_DEVICE_ID)
+    threshold_cache = current_app.extensions['threshold_cache']
+    
     if request.method == 'GET':
-        threshold_settings = ThresholdSettings.query.first()
-        if not threshold_settings:
+        cached = threshold_cache.get(device_id)
+        if cached is None:
             return jsonify({'error': 'No threshold settings found'}), 404
-        return jsonify(threshold_settings.to_dict())
+        
+        version, threshold_settings = cached
+        etag = threshold_cache.etag(version)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(threshold_settings)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     
     elif request.method == 'POST':
         try:
             data = request.get_json()
+            device_id = data.get('device_id', device_id)
             
-            threshold_settings = ThresholdSettings.query.first()
-            if not threshold_settings:
-                threshold_settings = ThresholdSettings()
+            device_thresholds = threshold_cache.update(device_id, data)
+            if device_thresholds is not None:
+                # The MQTT echo of this publish is a no-op for the cache, so tell dashboards here
+                current_app.extensions['broadcaster'].publish(device_id, {'thresholds': device_thresholds})
+                current_app.extensions['automation'].notify(device_id)
+            _, threshold_settings = threshold_cache.get(device_id)
             
-            if 'temperature_min' in data:
-                threshold_settings.temperature_min = float(data['temperature_min'])
-            if 'temperature_max' in data:
-                threshold_settings.temperature_max = float(data['temperature_max'])
-            if 'soil_moisture_min' in data:
-                threshold_settings.soil_moisture_min = int(data['soil_moisture_min'])
-            if 'humidity_min' in data:
-                threshold_settings.humidity_min = float(data['humidity_min'])
-            if 'light_level_min' in data:
-                threshold_settings.light_level_min = int(data['light_level_min'])
-            
-            db.session.add(threshold_settings)
-            db.session.commit()
-            
-            mqtt.publish('plant/thresholds', json.dumps(threshold_settings.to_dict()))
+            mqtt.publish(device_topic(device_id, SUBTOPIC_THRESHOLDS), json.dumps(threshold_settings))
             
             return jsonify({'success': True, 'message': 'Thresholds updated successfully'})
         
@@ -61,6 +112,7 @@ def manage_thresholds():
 def control_system():
     try:
         data = request.get_json()
+        device_id = data.get('device_id', DEFAULT_DEVICE_ID)
         command = data.get('command')
         
         if not command:
@@ -70,7 +122,7 @@ def control_system():
         if command not in valid_commands:
             return jsonify({'error': f'Invalid command. Must be one of {valid_commands}'}), 400
         
-        mqtt.publish('plant/command', command)
+        mqtt.publish(device_topic(device_id, SUBTOPIC_COMMAND), command)
         
         return jsonify({'success': True, 'message': f'Command {command} sent successfully'})
     
@@ -81,6 +133,7 @@ def control_system():
 def set_mode():
     try:
         data = request.get_json()
+        device_id = data.get('device_id', DEFAULT_DEVICE_ID)
         mode = data.get('mode')
         
         if not mode:
@@ -90,22 +143,50 @@ def set_mode():
         if mode not in valid_modes:
             return jsonify({'error': f'Invalid mode. Must be one of {valid_modes}'}), 400
         
-        mqtt.publish('plant/mode', mode)
+        mqtt.publish(device_topic(device_id, SUBTOPIC_MODE), mode)
         
         return jsonify({'success': True, 'message': f'Mode set to {mode} successfully'})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@main_bp.route('/metrics')
+def get_metrics():
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+@main_bp.route('/api/ingest/stats')
+def get_ingest_stats():
+    return jsonify(current_app.extensions['ingest_queue'].stats())
+
+def stream_ndjson(header, items):
+    yield json.dumps(header) + '\n'
+    
+    lines = []
+    for item in items:
+        lines.append(json.dumps(item))
+        if len(lines) >= HISTORY_STREAM_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
 @main_bp.route('/api/history')
 def get_history():
     period = request.args.get('period', 'day')
     data_type = request.args.get('type', 'all')
+    device_id = request.args.get('device_id', DEFAULT_DEVICE_ID)
+    response_format = request.args.get('format', 'json')
+    max_points = request.args.get('max_points', type=int)
+    method = request.args.get('downsample')
     
     now = datetime.now()
-    if period == 'day':
+    if period == 'hour':
+        start_date = now - timedelta(hours=1)
+        interval = 'raw'
+    elif period == 'day':
         start_date = now - timedelta(days=1)
-        interval = 'hour'
+        interval = 'minute'
     elif period == 'week':
         start_date = now - timedelta(weeks=1)
         interval = 'day'
@@ -116,69 +197,55 @@ def get_history():
         start_date = now - timedelta(days=365)
         interval = 'month'
     else:
-        return jsonify({'error': 'Invalid period. Must be one of [day, week, month, year]'}), 400
-    
-    if interval == 'hour':
-        query = SensorData.query.filter(SensorData.timestamp >= start_date).order_by(SensorData.timestamp)
-    elif interval == 'day':
-        query = db.session.query(
-            func.date(SensorData.timestamp).label('date'),
-            func.avg(SensorData.temperature).label('temperature'),
-            func.avg(SensorData.humidity).label('humidity'),
-            func.avg(SensorData.soil_moisture).label('soil_moisture'),
-            func.avg(SensorData.light_level).label('light_level')
-        ).filter(SensorData.timestamp >= start_date).group_by(func.date(SensorData.timestamp))
-    elif interval == 'month':
-        query = db.session.query(
-            func.strftime('%Y-%m', SensorData.timestamp).label('month'),
-            func.avg(SensorData.temperature).label('temperature'),
-            func.avg(SensorData.humidity).label('humidity'),
-            func.avg(SensorData.soil_moisture).label('soil_moisture'),
-            func.avg(SensorData.light_level).label('light_level')
-        ).filter(SensorData.timestamp >= start_date).group_by(func.strftime('%Y-%m', SensorData.timestamp))
-    
-    results = query.all()
-    
-    if interval == 'hour':
-        chart_data = [
-            {
-                'timestamp': result.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': result.temperature,
-                'humidity': result.humidity,
-                'soil_moisture': result.soil_moisture,
-                'light_level': result.light_level
-            } for result in results
-        ]
-    elif interval == 'day':
-        chart_data = [
-            {
-                'date': result.date,
-                'temperature': result.temperature,
-                'humidity': result.humidity,
-                'soil_moisture': result.soil_moisture,
-                'light_level': result.light_level
-            } for result in results
-        ]
-    elif interval == 'month':
-        chart_data = [
-            {
-                'month': result.month,
-                'temperature': result.temperature,
-                'humidity': result.humidity,
-                'soil_moisture': result.soil_moisture,
-                'light_level': result.light_level
-            } for result in results
-        ]
+        return jsonify({'error': 'Invalid period. Must be one of [hour, day, week, month, year]'}), 400
+    
+    interval = request.args.get('resolution', interval)
+    if interval not in HISTORY_LABELS:
+        return jsonify({'error': f'Invalid resolution. Must be one of {list(HISTORY_LABELS)}'}), 400
+    
+    if response_format not in ['json', 'ndjson', 'columnar']:
+        return jsonify({'error': 'Invalid format. Must be one of [json, ndjson, columnar]'}), 400
+    
+    if max_points is not None and max_points < 3:
+        return jsonify({'error': 'max_points must be at least 3'}), 400
+    
+    if method is not None and method not in DOWNSAMPLING_METHODS:
+        return jsonify({'error': f'Invalid downsample method. Must be one of {DOWNSAMPLING_METHODS}'}), 400
     
-    if data_type != 'all' and data_type in ['temperature', 'humidity', 'soil_moisture', 'light_level']:
-        for item in chart_data:
-            for key in list(item.keys()):
-                if key != data_type and key not in ['timestamp', 'date', 'month']:
-                    del item[key]
+    metrics = SENSOR_KEYS
+    if data_type in SENSOR_KEYS:
+        metrics = [data_type]
     
-    return jsonify({
+    header = {
+        'device_id': device_id,
         'period': period,
         'interval': interval,
-        'type': data_type,
-        'data': chart_data
-    })
\ No newline at end of file
+        'type': data_type
+    }
+    
+    if max_points is not None or response_format == 'columnar':
+        epochs, values = load_history_columns(interval, device_id, start_date, metrics)
+        if max_points is not None and len(epochs) > max_points:
+            epochs, values = downsample(epochs, values, max_points, method)
+            header['max_points'] = max_points
+            header['downsample'] = effective_method(method, len(metrics))
+    
+    if response_format == 'columnar':
+        columns = [
+            (metric, values[metric], RAW_METRIC_DTYPES[metric] if interval == 'raw' and 'downsample' not in header else DTYPE_FLOAT32)
+            for metric in metrics
+        ]
+        response = Response(encode_columnar(epochs, columns), mimetype=COLUMNAR_MIMETYPE)
+        response.headers['X-History-Header'] = json.dumps(header)
+        return response
+    
+    if max_points is not None:
+        items = iter_columns(interval, epochs, values)
+    else:
+        items = iter_history(interval, device_id, start_date, metrics)
+    
+    if response_format == 'ndjson':
+        return Response(stream_with_context(stream_ndjson(header, items)), mimetype='application/x-ndjson')
+    
+    header['data'] = list(items)
+    return jsonify(header)
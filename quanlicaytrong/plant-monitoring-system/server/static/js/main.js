@@ -1,4 +1,10 @@
 let socket;
+const currentDeviceId = new URLSearchParams(window.location.search).get('device') || 'default';
+// 'json' or 'columnar' (binary typed arrays, see server/wire_format.py)
+const WIRE_FORMAT = new URLSearchParams(window.location.search).get('wire') || 'json';
+const HISTORY_FORMAT = new URLSearchParams(window.location.search).get('history') || 'ndjson';
+// Upper bound on points per chart; the server downsamples anything denser
+const HISTORY_MAX_POINTS = 500;
 let temperatureChart;
 let humidityChart;
 let soilMoistureChart;
@@ -23,7 +29,7 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function connectWebSocket() {
-    socket = io();
+    socket = io({ query: { device_id: currentDeviceId, wire: WIRE_FORMAT } });
     
     socket.on('connect', function() {
         console.log('Đã kết nối với máy chủ WebSocket');
@@ -48,44 +54,44 @@ function connectWebSocket() {
         updateModeToggle();
     });
     
-    socket.on('sensor_data_update', function(data) {
-        updateSensorValues(data);
-    });
-    
-    socket.on('temperature_update', function(data) {
-        updateValue('temperature', data.value);
-    });
-    
-    socket.on('humidity_update', function(data) {
-        updateValue('humidity', data.value);
-    });
-    
-    socket.on('soil_moisture_update', function(data) {
-        updateValue('soil-moisture', data.value);
-    });
-    
-    socket.on('light_level_update', function(data) {
-        updateValue('light-level', data.value);
-    });
-    
-    socket.on('pump_status_update', function(data) {
-        updatePumpStatus(data.status);
-    });
-    
-    socket.on('light_status_update', function(data) {
-        updateLightStatus(data.status);
-    });
-    
-    socket.on('mode_update', function(data) {
-        if (currentMode !== data.mode) {
-            currentMode = data.mode;
+    socket.on('state_delta', function(data) {
+        const changes = data.devices[currentDeviceId];
+        if (!changes) return;
+        
+        updateSensorValues(changes);
+        
+        if (changes.pump_status !== undefined) {
+            updatePumpStatus(changes.pump_status);
+        }
+        
+        if (changes.light_status !== undefined) {
+            updateLightStatus(changes.light_status);
+        }
+        
+        if (changes.mode !== undefined && currentMode !== changes.mode) {
+            currentMode = changes.mode;
             updateModeToggle();
         }
+        
+        if (changes.thresholds) {
+            thresholds = changes.thresholds;
+            updateThresholdInputs();
+        }
     });
     
-    socket.on('thresholds_update', function(data) {
-        thresholds = data;
-        updateThresholdInputs();
+    socket.on('sensor_frame', function(buffer) {
+        const frame = decodeColumnar(buffer);
+        const deviceIds = frame.columns.device_id || [];
+        for (let i = 0; i < frame.rowCount; i++) {
+            if (deviceIds[i] !== currentDeviceId) continue;
+            const values = {};
+            ['temperature', 'humidity', 'soil_moisture', 'light_level'].forEach(metric => {
+                if (frame.columns[metric] && !Number.isNaN(frame.columns[metric][i])) {
+                    values[metric] = frame.columns[metric][i];
+                }
+            });
+            updateSensorValues(values);
+        }
     });
 }
 
@@ -251,7 +257,7 @@ function updateThresholdInputs() {
 }
 
 function fetchThresholds() {
-    fetch('/api/thresholds')
+    fetch(`/api/thresholds?device_id=${encodeURIComponent(currentDeviceId)}`)
         .then(response => response.json())
         .then(data => {
             thresholds = data;
@@ -268,29 +274,30 @@ function setupEventListeners() {
         }
         
         const mode = this.checked ? 'AUTO' : 'MANUAL';
-        socket.emit('set_mode', { mode: mode });
+        socket.emit('set_mode', { device_id: currentDeviceId, mode: mode });
     });
     
     document.getElementById('pump-on-btn').addEventListener('click', function() {
-        socket.emit('send_command', { command: 'PUMP_ON' });
+        socket.emit('send_command', { device_id: currentDeviceId, command: 'PUMP_ON' });
     });
     
     document.getElementById('pump-off-btn').addEventListener('click', function() {
-        socket.emit('send_command', { command: 'PUMP_OFF' });
+        socket.emit('send_command', { device_id: currentDeviceId, command: 'PUMP_OFF' });
     });
     
     document.getElementById('light-on-btn').addEventListener('click', function() {
-        socket.emit('send_command', { command: 'LIGHT_ON' });
+        socket.emit('send_command', { device_id: currentDeviceId, command: 'LIGHT_ON' });
     });
     
     document.getElementById('light-off-btn').addEventListener('click', function() {
-        socket.emit('send_command', { command: 'LIGHT_OFF' });
+        socket.emit('send_command', { device_id: currentDeviceId, command: 'LIGHT_OFF' });
     });
     
     document.getElementById('threshold-form').addEventListener('submit', function(e) {
         e.preventDefault();
         
         const newThresholds = {
+            device_id: currentDeviceId,
             temperature_min: parseFloat(document.getElementById('temp-min').value),
             temperature_max: parseFloat(document.getElementById('temp-max').value),
             soil_moisture_min: parseInt(document.getElementById('soil-min').value),
@@ -333,11 +340,159 @@ function setupEventListeners() {
     });
 }
 
+function decodeColumnar(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'PMC1') {
+        throw new Error('Định dạng dữ liệu không hợp lệ');
+    }
+    
+    const columnCount = view.getUint8(5);
+    const rowCount = view.getUint32(8, true);
+    let epoch = Number(view.getBigInt64(12, true));
+    let offset = 20;
+    
+    const timestamps = new Float64Array(rowCount);
+    for (let i = 0; i < rowCount; i++) {
+        epoch += view.getInt32(offset + i * 4, true);
+        timestamps[i] = epoch;
+    }
+    offset += rowCount * 4;
+    
+    const decoder = new TextDecoder();
+    const columns = {};
+    for (let c = 0; c < columnCount; c++) {
+        const nameLength = view.getUint8(offset);
+        const dtype = view.getUint8(offset + 1);
+        offset += 2;
+        const name = decoder.decode(new Uint8Array(buffer, offset, nameLength));
+        offset += nameLength;
+        
+        if (dtype === 1) {
+            columns[name] = new Float32Array(buffer.slice(offset, offset + rowCount * 4));
+            offset += rowCount * 4;
+        } else if (dtype === 2) {
+            columns[name] = new Int16Array(buffer.slice(offset, offset + rowCount * 2));
+            offset += rowCount * 2;
+        } else if (dtype === 3) {
+            const values = [];
+            for (let i = 0; i < rowCount; i++) {
+                const length = view.getUint16(offset, true);
+                values.push(decoder.decode(new Uint8Array(buffer, offset + 2, length)));
+                offset += 2 + length;
+            }
+            columns[name] = values;
+        } else {
+            throw new Error(`Kiểu cột không hỗ trợ: ${dtype}`);
+        }
+    }
+    
+    return { rowCount, timestamps, columns };
+}
+
+function columnarToRows(frame, interval) {
+    const rows = [];
+    for (let i = 0; i < frame.rowCount; i++) {
+        // Timestamps carry the server's wall-clock time, so read them back without a timezone shift
+        const iso = new Date(frame.timestamps[i] * 1000).toISOString().slice(0, 19);
+        const item = {};
+        if (interval === 'day') {
+            item.date = iso.slice(0, 10);
+        } else if (interval === 'month') {
+            item.month = iso.slice(0, 7);
+        } else {
+            item.timestamp = iso;
+        }
+        Object.keys(frame.columns).forEach(name => {
+            item[name] = frame.columns[name][i];
+        });
+        rows.push(item);
+    }
+    return rows;
+}
+
 function loadHistoricalData(period) {
-    fetch(`/api/history?period=${period}&type=all`)
-        .then(response => response.json())
-        .then(data => {
-            updateCharts(data.data, period);
+    if (HISTORY_FORMAT === 'columnar') {
+        loadColumnarHistory(period);
+    } else {
+        streamHistoricalData(period);
+    }
+}
+
+function loadColumnarHistory(period) {
+    fetch(`/api/history?period=${period}&type=all&format=columnar&max_points=${HISTORY_MAX_POINTS}&device_id=${encodeURIComponent(currentDeviceId)}`)
+        .then(response => {
+            const header = JSON.parse(response.headers.get('X-History-Header') || '{}');
+            return response.arrayBuffer().then(buffer => columnarToRows(decodeColumnar(buffer), header.interval));
+        })
+        .then(rows => {
+            if (period === currentPeriod) {
+                updateCharts(rows, period);
+            }
+        })
+        .catch(error => console.error('Lỗi khi lấy dữ liệu lịch sử:', error));
+}
+
+function streamHistoricalData(period) {
+    const url = `/api/history?period=${period}&type=all&format=ndjson&max_points=${HISTORY_MAX_POINTS}&device_id=${encodeURIComponent(currentDeviceId)}`;
+    const rows = [];
+    let header = null;
+    let redrawPending = false;
+    
+    const scheduleRedraw = () => {
+        if (redrawPending) {
+            return;
+        }
+        redrawPending = true;
+        requestAnimationFrame(() => {
+            redrawPending = false;
+            if (period === currentPeriod) {
+                updateCharts(rows, period);
+            }
+        });
+    };
+    
+    const handleLine = line => {
+        if (!line) {
+            return;
+        }
+        const item = JSON.parse(line);
+        if (header === null) {
+            header = item;
+        } else {
+            rows.push(item);
+        }
+    };
+    
+    fetch(url)
+        .then(response => {
+            if (!response.body || !window.TextDecoder) {
+                return response.text().then(text => {
+                    text.split('\n').forEach(handleLine);
+                    scheduleRedraw();
+                });
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            
+            const readChunk = () => reader.read().then(({ done, value }) => {
+                if (done) {
+                    handleLine(buffered.trim());
+                    scheduleRedraw();
+                    return;
+                }
+                
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.forEach(handleLine);
+                scheduleRedraw();
+                return readChunk();
+            });
+            
+            return readChunk();
         })
         .catch(error => console.error('Lỗi khi lấy dữ liệu lịch sử:', error));
 }
@@ -349,7 +504,9 @@ function updateCharts(data, period) {
     }
     
     const labels = data.map(item => {
-        if (period === 'day') {
+        if (period === 'hour') {
+            return new Date(item.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', second: '2-digit' });
+        } else if (period === 'day') {
             return new Date(item.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
         } else if (period === 'week' || period === 'month') {
             return new Date(item.date).toLocaleDateString([], { month: 'short', day: 'numeric' });
@@ -0,0 +1,136 @@
+import atexit
+import logging
+import threading
+
+from flask import g
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage:
+    def __init__(self, db, app=None):
+        self.db = db
+        self.app = None
+        self.durable = False
+        self.synchronous = 'NORMAL'
+        self.cache_mb = 64
+        self.mmap_mb = 256
+        self.busy_timeout_ms = 5000
+        self.reader_pool_size = 8
+        self.checkpoint_interval = 30.0
+        self.wal_autocheckpoint = 10000
+        self.wal_limit_mb = 64
+        self.reader_engine = None
+        self._readers = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.checkpoints = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.synchronous = app.config.get('SQLITE_SYNCHRONOUS', self.synchronous)
+        self.cache_mb = app.config.get('SQLITE_CACHE_MB', self.cache_mb)
+        self.mmap_mb = app.config.get('SQLITE_MMAP_MB', self.mmap_mb)
+        self.busy_timeout_ms = app.config.get('SQLITE_BUSY_TIMEOUT_MS', self.busy_timeout_ms)
+        self.reader_pool_size = app.config.get('SQLITE_READER_POOL_SIZE', self.reader_pool_size)
+        self.checkpoint_interval = app.config.get('SQLITE_CHECKPOINT_INTERVAL', self.checkpoint_interval)
+        self.wal_autocheckpoint = app.config.get('SQLITE_WAL_AUTOCHECKPOINT', self.wal_autocheckpoint)
+        self.wal_limit_mb = app.config.get('SQLITE_WAL_LIMIT_MB', self.wal_limit_mb)
+        app.extensions['storage'] = self
+        app.teardown_appcontext(self._close_reader)
+
+        with app.app_context():
+            writer = self.db.engine
+
+        # Only a file-backed SQLite database can be shared by a second pool; :memory: stays on the one engine
+        self.durable = (
+            app.config.get('STORAGE_PROFILE') == 'durable'
+            and writer.dialect.name == 'sqlite'
+            and writer.url.database not in (None, '', ':memory:')
+        )
+        if not self.durable:
+            return
+
+        event.listen(writer, 'connect', self._configure_writer)
+        self.reader_engine = create_engine(
+            writer.url, pool_size=self.reader_pool_size, max_overflow=0
+        )
+        event.listen(self.reader_engine, 'connect', self._configure_reader)
+        self._readers = sessionmaker(bind=self.reader_engine)
+        logger.info(f"Durable SQLite storage at {writer.url.database} "
+                    f"(WAL, synchronous {self.synchronous}, {self.reader_pool_size} readers)")
+
+    def _configure_connection(self, dbapi_connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        # Negative cache_size is in KiB
+        cursor.execute(f'PRAGMA cache_size = {-int(self.cache_mb * 1024)}')
+        cursor.execute(f'PRAGMA mmap_size = {int(self.mmap_mb * 1024 * 1024)}')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        return cursor
+
+    def _configure_writer(self, dbapi_connection, connection_record):
+        cursor = self._configure_connection(dbapi_connection)
+        cursor.execute('PRAGMA journal_mode = WAL')
+        # NORMAL only syncs at checkpoints in WAL mode: a power cut can lose the last commits but never corrupts the file
+        cursor.execute(f'PRAGMA synchronous = {self.synchronous}')
+        # The checkpoint thread does the regular work; this is only a backstop if it falls behind
+        cursor.execute(f'PRAGMA wal_autocheckpoint = {int(self.wal_autocheckpoint)}')
+        cursor.execute(f'PRAGMA journal_size_limit = {int(self.wal_limit_mb * 1024 * 1024)}')
+        cursor.close()
+
+    def _configure_reader(self, dbapi_connection, connection_record):
+        cursor = self._configure_connection(dbapi_connection)
+        cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    def reader_session(self):
+        # One reader session per app context; WAL readers see the last commit and never wait for the writer
+        if self._readers is None:
+            return self.db.session
+        if 'storage_reader' not in g:
+            g.storage_reader = self._readers()
+        return g.storage_reader
+
+    def _close_reader(self, exception=None):
+        session = g.pop('storage_reader', None)
+        if session is not None:
+            session.close()
+
+    def checkpoint(self):
+        if not self.durable:
+            return None
+        try:
+            # PASSIVE copies what it can without waiting on readers or blocking the writer
+            with self.app.app_context(), self.db.engine.connect() as connection:
+                busy, wal_pages, copied = connection.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').one()
+        except Exception as e:
+            logger.error(f"Error checkpointing SQLite WAL: {str(e)}")
+            return None
+        self.checkpoints += 1
+        logger.debug(f"WAL checkpoint: {copied}/{wal_pages} pages copied{' (busy)' if busy else ''}")
+        return busy, wal_pages, copied
+
+    def start(self):
+        if not self.durable or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='sqlite-checkpointer')
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"SQLite checkpointer started (every {self.checkpoint_interval}s)")
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.checkpoint()
+
+    def _run(self):
+        while not self._stopped.wait(self.checkpoint_interval):
+            self.checkpoint()
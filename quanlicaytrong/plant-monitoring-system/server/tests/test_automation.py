@@ -0,0 +1,119 @@
+from devices import DeviceRegistry
+from automation import AutomationEngine
+
+
+class FakeMqtt:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+class FakeBroadcaster:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, device_id, changes):
+        self.published.append((device_id, changes))
+
+
+def engine_with(device_id='dev1', **state):
+    registry = DeviceRegistry()
+    registry.get(device_id).update({
+        'temperature': 22, 'humidity': 60, 'soil_moisture': 50, 'light_level': 80, 'timestamp': 't', **state
+    })
+    engine = AutomationEngine(None, registry, FakeMqtt(), FakeBroadcaster())
+    engine.enabled = True
+    engine.min_command_interval = 0
+    engine.pump_max_run = 1000
+    engine.notify(device_id)
+    return engine, registry.get(device_id)
+
+
+def commands(engine):
+    return [payload for _, payload in engine.mqtt.published]
+
+
+def reading(engine, device, now, **changes):
+    device.update(changes)
+    engine.notify(device.device_id)
+    engine.tick(now)
+
+
+def test_pump_switches_with_hysteresis():
+    engine, device = engine_with(soil_moisture=20)
+    engine.tick(0)
+    assert commands(engine) == ['PUMP_ON']
+
+    # Once the board confirms, readings above the minimum (30) but inside the hysteresis band keep it running
+    reading(engine, device, 0.5, pump_status='ON')
+    reading(engine, device, 1, soil_moisture=33)
+    assert commands(engine) == ['PUMP_ON']
+    reading(engine, device, 2, soil_moisture=35)
+    assert commands(engine) == ['PUMP_ON', 'PUMP_OFF']
+
+    # And it only starts again once the soil drops below the minimum
+    reading(engine, device, 2.5, pump_status='OFF')
+    reading(engine, device, 3, soil_moisture=31)
+    assert commands(engine) == ['PUMP_ON', 'PUMP_OFF']
+    reading(engine, device, 4, soil_moisture=29)
+    assert commands(engine) == ['PUMP_ON', 'PUMP_OFF', 'PUMP_ON']
+
+
+def test_pump_run_time_is_capped():
+    engine, device = engine_with(soil_moisture=10)
+    engine.pump_max_run = 3
+    engine.tick(0)
+    engine.tick(2)
+    assert commands(engine) == ['PUMP_ON']
+    engine.tick(3)
+    assert commands(engine) == ['PUMP_ON', 'PUMP_OFF']
+
+
+def test_commands_are_rate_limited():
+    engine, device = engine_with(light_level=10)
+    engine.min_command_interval = 60
+    engine.tick(100)
+    reading(engine, device, 105, light_status='ON')
+    reading(engine, device, 110, light_level=90)
+    assert commands(engine) == ['LIGHT_ON']
+    engine.tick(161)
+    assert commands(engine) == ['LIGHT_ON', 'LIGHT_OFF']
+
+
+def test_pump_run_time_cap_ignores_the_rate_limit():
+    engine, device = engine_with(soil_moisture=10)
+    engine.min_command_interval = 60
+    engine.pump_max_run = 30
+    engine.tick(100)
+    reading(engine, device, 105, pump_status='ON', soil_moisture=40)
+    # Wet enough to stop, but the pump was only switched on 10 s ago
+    engine.tick(110)
+    assert commands(engine) == ['PUMP_ON']
+    # The run-time cap stops it regardless
+    engine.tick(130)
+    assert commands(engine) == ['PUMP_ON', 'PUMP_OFF']
+
+
+def test_manual_mode_and_incomplete_readings_are_left_alone():
+    engine, device = engine_with(soil_moisture=5, mode='MANUAL')
+    engine.tick(0)
+    assert commands(engine) == []
+
+    registry = DeviceRegistry()
+    registry.get('fresh')
+    engine = AutomationEngine(None, registry, FakeMqtt(), FakeBroadcaster())
+    engine.enabled = True
+    engine.notify('fresh')
+    engine.tick(0)
+    assert commands(engine) == []
+
+
+def test_alerts_are_published_on_change():
+    engine, device = engine_with(temperature=35)
+    engine.tick(0)
+    engine.tick(1)
+    assert engine.broadcaster.published == [('dev1', {'alerts': ['temperature_high']})]
+    reading(engine, device, 2, temperature=25)
+    assert engine.broadcaster.published[-1] == ('dev1', {'alerts': []})
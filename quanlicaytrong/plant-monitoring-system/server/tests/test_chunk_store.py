@@ -0,0 +1,144 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy.orm import Session
+
+from chunk_store import RAW, SensorChunkStore
+from devices import SENSOR_KEYS
+from extensions import db
+from models import SensorChunk
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'chunks.db'}"
+    app.config['SENSOR_CHUNK_SECONDS'] = 600
+    db.init_app(app)
+    with app.app_context():
+        SensorChunk.__table__.create(db.engine)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def store(app):
+    return SensorChunkStore(app)
+
+
+def reading(device_id, timestamp, temperature=21.5, humidity=60.25, soil_moisture=40, light_level=300):
+    return {
+        'device_id': device_id,
+        'timestamp': timestamp,
+        'temperature': temperature,
+        'humidity': humidity,
+        'soil_moisture': soil_moisture,
+        'light_level': light_level
+    }
+
+
+def insert(store, rows):
+    store.insert(db.session, rows)
+    db.session.commit()
+
+
+def read(store, device_id, start):
+    return [tuple(getattr(row, column) for column in ['timestamp', *SENSOR_KEYS])
+            for row in store.read_range(db.session, device_id, start)]
+
+
+def expected(rows):
+    return sorted(tuple(row[column] for column in ['timestamp', *SENSOR_KEYS]) for row in rows)
+
+
+def test_round_trip_across_flushes_and_chunks(store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    rows = [reading('dev1', start + timedelta(seconds=step * 7), 20 + step % 10 / 4, 55.5, step % 100, 200 + step)
+            for step in range(400)]
+    for index in range(0, len(rows), 37):
+        insert(store, rows[index:index + 37])
+
+    assert read(store, 'dev1', start) == expected(rows)
+    assert store.count_rows(db.session) == len(rows)
+    assert store.latest(db.session, 'dev1').timestamp == rows[-1]['timestamp']
+
+
+def test_first_reading_with_more_decimals_than_metric_digits(store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    rows = [reading('dev1', start, temperature=20.123), reading('dev1', start + timedelta(seconds=1), temperature=20.5)]
+    insert(store, rows[:1])
+    insert(store, rows[1:])
+
+    assert read(store, 'dev1', start) == expected(rows)
+    assert db.session.execute(SensorChunk.__table__.select()).one().temperature[0] == RAW
+
+
+def test_precise_and_late_readings_in_an_existing_chunk(store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    rows = [reading('dev1', start + timedelta(seconds=step * 10)) for step in range(10)]
+    insert(store, rows)
+    late = [reading('dev1', start + timedelta(seconds=15), humidity=61.0625),
+            reading('dev1', start + timedelta(seconds=5), temperature=-3.14159)]
+    insert(store, late)
+
+    assert read(store, 'dev1', start) == expected(rows + late)
+
+
+def test_random_readings_round_trip(store):
+    rng = random.Random(3)
+    start = datetime(2026, 3, 1)
+    rows = []
+    for step in range(3000):
+        device_id = rng.choice(['a', 'b', 'c'])
+        timestamp = start + timedelta(seconds=step * 3 + rng.randint(-60, 0))
+        rows.append(reading(device_id, timestamp, rng.uniform(10, 40), round(rng.uniform(30, 90), 2),
+                            rng.randint(0, 100), rng.randint(0, 1000)))
+    for index in range(0, len(rows), 500):
+        insert(store, rows[index:index + 500])
+
+    for device_id in ['a', 'b', 'c']:
+        device_rows = [row for row in rows if row['device_id'] == device_id]
+        # Readings that share a timestamp keep no particular order
+        assert sorted(read(store, device_id, start - timedelta(minutes=5))) == expected(device_rows)
+
+
+def test_read_columns_limits_the_window(store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    insert(store, [reading('dev1', start + timedelta(seconds=step)) for step in range(2000)])
+
+    epochs, values = store.read_columns(
+        db.session, 'dev1', start + timedelta(seconds=700), start + timedelta(seconds=1300), metrics=['humidity']
+    )
+    assert len(epochs) == 600
+    assert list(values) == ['humidity']
+    assert (values['humidity'] == 60.25).all()
+
+
+def test_rolled_back_insert_is_not_kept(store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    insert(store, [reading('dev1', start)])
+    store.insert(db.session, [reading('dev1', start + timedelta(seconds=1))])
+    db.session.rollback()
+    insert(store, [reading('dev1', start + timedelta(seconds=2))])
+
+    assert [row[0] for row in read(store, 'dev1', start)] == [start, start + timedelta(seconds=2)]
+
+
+def test_only_the_app_session_fills_the_open_chunks(app, store):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    # init_app() again (a second app, or a reload) must not register the listeners twice
+    store.init_app(app)
+    other = SensorChunkStore(app)
+
+    with Session(db.engine) as session:
+        store.insert(session, [reading('dev1', start)])
+        session.commit()
+    assert store._open == {}
+
+    insert(store, [reading('dev1', start + timedelta(seconds=1))])
+    assert list(store._open) == ['dev1']
+    assert other._open == {}
+    assert [row[0] for row in read(store, 'dev1', start)] == [start, start + timedelta(seconds=1)]
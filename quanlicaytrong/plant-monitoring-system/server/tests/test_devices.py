@@ -0,0 +1,45 @@
+import threading
+import time
+
+from devices import DEFAULT_DEVICE_ID, DeviceRegistry, default_state, parse_topic
+
+
+def test_parse_topic():
+    assert parse_topic('plant/data') == (DEFAULT_DEVICE_ID, 'data')
+    assert parse_topic('plant/dev7/thresholds') == ('dev7', 'thresholds')
+    assert parse_topic('other/dev7/data') == (None, None)
+    assert parse_topic('plant//data') == (None, None)
+
+
+def test_update_returns_only_changed_keys():
+    device = DeviceRegistry().get('dev1')
+    assert device.update({'temperature': 21.5, 'mode': 'AUTO'}) == {'temperature': 21.5}
+    seq = device.seq
+    assert device.update({'temperature': 21.5}) == {}
+    assert device.seq == seq
+
+
+def test_wait_for_change_wakes_on_update():
+    device = DeviceRegistry().get('dev1')
+    since = device.seq
+    threading.Timer(0.05, device.update, args=({'humidity': 70},)).start()
+
+    started = time.monotonic()
+    assert device.wait_for_change(since, 5)
+    assert time.monotonic() - started < 1
+    assert not device._waiters
+
+
+def test_wait_for_change_times_out_and_returns_at_once_when_behind():
+    device = DeviceRegistry().get('dev1')
+    assert not device.wait_for_change(device.seq, 0.05)
+    device.update({'light_level': 5})
+    assert device.wait_for_change(0, 5)
+
+
+def test_snapshot_of_an_unknown_device_does_not_register_it():
+    registry = DeviceRegistry()
+    state, thresholds = registry.snapshot('nobody')
+    assert state == default_state()
+    assert 'temperature_min' in thresholds
+    assert 'nobody' not in registry
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from downsampling import average_buckets, downsample, effective_method, lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_the_ends_and_the_spike():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 25.0
+
+    indices = lttb_indices(x, y, 50)
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 437 in indices
+    assert (np.diff(indices) > 0).all()
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 10, 11])
+def test_lttb_returns_everything_when_there_is_nothing_to_drop(threshold):
+    assert lttb_indices(np.arange(10), np.arange(10), threshold).tolist() == list(range(10))
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    rng = np.random.default_rng(4)
+    y = rng.normal(size=1000)
+    y[10], y[900] = -40.0, 40.0
+
+    indices = minmax_indices(y, 100)
+    assert len(indices) <= 100
+    assert 10 in indices and 900 in indices
+    assert (np.diff(indices) > 0).all()
+
+
+def test_average_buckets():
+    x = np.arange(10)
+    timestamps, averaged = average_buckets(x, {'temperature': np.arange(10, dtype=float)}, 5)
+    assert timestamps.tolist() == [0, 2, 4, 6, 8]
+    assert averaged['temperature'].tolist() == [0.5, 2.5, 4.5, 6.5, 8.5]
+
+
+def test_several_metrics_are_always_averaged():
+    assert effective_method('lttb', 2) == 'avg'
+    assert effective_method(None, 1) == 'lttb'
+
+    x = np.arange(100)
+    values = {'temperature': np.ones(100), 'humidity': np.zeros(100)}
+    timestamps, downsampled = downsample(x, values, 10, 'minmax')
+    assert len(timestamps) == 10
+    assert set(downsampled) == {'temperature', 'humidity'}
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample(np.arange(10), {'temperature': np.arange(10)}, 5, 'median')
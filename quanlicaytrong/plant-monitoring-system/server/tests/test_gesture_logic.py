@@ -0,0 +1,56 @@
+import numpy as np
+
+from gesture_logic import GestureStateMachine, finger_states, hand_features
+from gesture_replay import hand_pose
+
+
+# Neither a gesture nor a fist
+IDLE = hand_pose(('ring',))
+
+
+def replay(machine, script, fps=10.0, keys=None):
+    # script: (hands, seconds) steps; hands is a list of hand_pose() arrays
+    commands = []
+    now = 0.0
+    for hands, seconds in script:
+        for _ in range(int(seconds * fps)):
+            frame_commands, _ = machine.update(np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3), now, keys)
+            commands.extend(frame_commands)
+            now += 1.0 / fps
+    return commands
+
+
+def test_finger_states_classifies_each_hand():
+    hands = np.stack([hand_pose(('index',)), hand_pose(('middle',)), hand_pose(), hand_pose(resting=True)])
+    assert hand_features(hands) == [
+        (False, True, False, False),
+        (False, False, True, False),
+        (False, False, False, True),
+        (True, False, False, True)
+    ]
+    # Leading axes are broadcast, so a whole trace classifies in one call
+    assert finger_states(hands[np.newaxis])['index_up'].shape == (1, 4)
+
+
+def test_single_hand_gestures():
+    machine = GestureStateMachine(1.5)
+    script = [([IDLE], 1.0), ([hand_pose(('index',))], 2.0), ([hand_pose()], 2.0)]
+    # Index held turns the light on, a held fist turns everything off
+    assert replay(machine, script) == ['LIGHT_ON', 'LIGHT_OFF']
+
+
+def test_second_hand_does_not_reset_the_first():
+    machine = GestureStateMachine(1.5)
+    script = [([IDLE, IDLE], 1.0), ([hand_pose(('index',)), IDLE], 5.0)]
+    assert replay(machine, script) == ['LIGHT_ON']
+    assert machine.light_state
+
+
+def test_hands_are_tracked_by_key():
+    # The same physical hand keeps its timers when it moves to another position in the frame
+    machine = GestureStateMachine(1.5)
+    commands = replay(machine, [([IDLE, IDLE], 1.0)], keys=['Left', 'Right'])
+    commands += replay(machine, [([hand_pose(('middle',)), IDLE], 1.0)], keys=['Right', 'Left'])
+    assert commands == []
+    assert machine.hands['Right'].last_middle_state
+    assert not machine.hands['Left'].last_middle_state
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from gesture_replay import load_trace, replay, save_trace, score, synthetic_trace
+
+
+@pytest.mark.parametrize('duration', [1.0, 1.5])
+def test_synthetic_trace_produces_the_expected_commands(duration):
+    frames, timestamps, expected = synthetic_trace()
+    commands, _ = replay(frames, timestamps, duration)
+    assert commands == expected == ['LIGHT_ON', 'LIGHT_OFF', 'PUMP_ON', 'PUMP_OFF']
+    assert score(commands, expected) == (0, 0)
+
+
+def test_noisy_trace_still_scores_clean():
+    frames, timestamps, expected = synthetic_trace(fps=15.0, noise=0.01, seed=1)
+    commands, _ = replay(frames, timestamps)
+    assert score(commands, expected) == (0, 0)
+
+
+def test_saved_trace_replays_the_same(tmp_path):
+    frames, timestamps, expected = synthetic_trace()
+    path = tmp_path / 'trace.npz'
+    save_trace(path, frames, timestamps, expected)
+
+    loaded_frames, loaded_timestamps, loaded_expected = load_trace(path)
+    assert [len(hands) for hands in loaded_frames] == [len(hands) for hands in frames]
+    np.testing.assert_array_equal(loaded_timestamps, timestamps)
+    assert loaded_expected == expected
+    assert replay(loaded_frames, loaded_timestamps)[0] == replay(frames, timestamps)[0]
+
+
+def test_score_counts_false_triggers_and_misses():
+    assert score(['LIGHT_ON', 'LIGHT_ON', 'PUMP_ON'], ['LIGHT_ON', 'LIGHT_OFF']) == (2, 1)
@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+import pytest
+
+from gorilla import FloatEncoder, TimestampEncoder, decode_floats, decode_timestamps
+
+
+def encode_timestamps(start, timestamps):
+    encoder = TimestampEncoder(start)
+    for timestamp in timestamps:
+        encoder.append(timestamp)
+    return encoder.getvalue()
+
+
+def encode_floats(values):
+    encoder = FloatEncoder()
+    for value in values:
+        encoder.append(value)
+    return encoder.getvalue()
+
+
+@pytest.mark.parametrize('timestamps', [
+    [],
+    [1700000000],
+    [1700000000 + step for step in range(100)],
+    [1700000000 + step * 5 for step in range(100)],
+    # Every delta-of-delta bucket, including negative deltas and the 32-bit one
+    [1700000000, 1700000001, 1700000100, 1700000101, 1700002000, 1700001000, 1700100000, 1705000000],
+])
+def test_timestamps_round_trip(timestamps):
+    start = 1700000000
+    decoded = decode_timestamps(encode_timestamps(start, timestamps), start, len(timestamps))
+    assert decoded.tolist() == timestamps
+
+
+def test_random_timestamps_round_trip():
+    rng = random.Random(1)
+    timestamps = [1700000000]
+    for _ in range(2000):
+        timestamps.append(timestamps[-1] + rng.choice([0, 1, 1, 1, 2, 60, -3, 5000, 200000]))
+    decoded = decode_timestamps(encode_timestamps(timestamps[0], timestamps), timestamps[0], len(timestamps))
+    assert decoded.tolist() == timestamps
+
+
+def test_timestamp_delta_of_delta_too_large():
+    encoder = TimestampEncoder(0)
+    with pytest.raises(ValueError):
+        encoder.append(1 << 40)
+
+
+@pytest.mark.parametrize('values', [
+    [],
+    [21.5],
+    [21.5] * 50,
+    [20.123, 20.124, 19.99, 20.123, 1e300, -0.0, 0.0, -1e-300, float('inf'), 20.123],
+    [float(value) for value in range(-100, 100, 7)],
+])
+def test_floats_round_trip(values):
+    decoded = decode_floats(encode_floats(values), len(values))
+    assert decoded.tobytes() == np.asarray(values, dtype=np.float64).tobytes()
+
+
+def test_random_floats_round_trip():
+    rng = random.Random(2)
+    values = [rng.choice([rng.uniform(-50, 50), round(rng.uniform(0, 100), 2), 42.0]) for _ in range(3000)]
+    decoded = decode_floats(encode_floats(values), len(values))
+    assert decoded.tolist() == values
+
+
+def test_nan_round_trips_bit_exact():
+    values = [1.0, float('nan'), 1.0]
+    decoded = decode_floats(encode_floats(values), len(values))
+    assert decoded.tobytes() == np.asarray(values, dtype=np.float64).tobytes()
+
+
+def test_copy_keeps_encoding_independent():
+    encoder = FloatEncoder()
+    for value in [1.0, 2.5, 2.5]:
+        encoder.append(value)
+    copy = encoder.copy()
+    copy.append(7.25)
+    encoder.append(-3.0)
+    assert decode_floats(encoder.getvalue(), 4).tolist() == [1.0, 2.5, 2.5, -3.0]
+    assert decode_floats(copy.getvalue(), 4).tolist() == [1.0, 2.5, 2.5, 7.25]
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from ingest_queue import IngestQueue, POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST
+
+
+class Handler:
+    # Holds the worker inside the first item until released, so the shard behind it fills up
+    def __init__(self):
+        self.seen = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, name):
+        self.started.set()
+        self.release.wait(5)
+        if name == 'bad':
+            raise ValueError(name)
+        self.seen.append(name)
+
+
+def stalled_queue(policy, block_timeout=0.05):
+    # One worker with room for two waiting items, already busy with 'first'
+    app = Flask(__name__)
+    app.config.update(INGEST_WORKERS=1, INGEST_QUEUE_SIZE=2, INGEST_OVERFLOW_POLICY=policy,
+                      INGEST_BLOCK_TIMEOUT=block_timeout)
+    handler = Handler()
+    ingest = IngestQueue(handler, app)
+    assert ingest.submit('dev1', ('first',))
+    assert handler.started.wait(5)
+    assert ingest.submit('dev1', ('a',))
+    assert ingest.submit('dev1', ('b',))
+    return ingest, handler
+
+
+def drain(ingest, handler):
+    handler.release.set()
+    ingest.join()
+    ingest.stop()
+    return handler.seen
+
+
+def test_drop_oldest_keeps_the_newest_items():
+    ingest, handler = stalled_queue(POLICY_DROP_OLDEST)
+    assert ingest.submit('dev1', ('c',))
+    assert ingest.dropped == 1
+    assert drain(ingest, handler) == ['first', 'b', 'c']
+    assert ingest.stats()['enqueued'] == 4
+    assert ingest.processed == 3
+
+
+def test_drop_newest_rejects_the_new_item():
+    ingest, handler = stalled_queue(POLICY_DROP_NEWEST)
+    assert not ingest.submit('dev1', ('c',))
+    assert ingest.dropped == 1
+    assert drain(ingest, handler) == ['first', 'a', 'b']
+
+
+def test_block_gives_up_after_the_timeout():
+    ingest, handler = stalled_queue(POLICY_BLOCK)
+    started = time.monotonic()
+    assert not ingest.submit('dev1', ('c',))
+    assert time.monotonic() - started >= 0.05
+    assert ingest.dropped == 1
+    assert drain(ingest, handler) == ['first', 'a', 'b']
+
+
+def test_block_waits_for_room():
+    ingest, handler = stalled_queue(POLICY_BLOCK, block_timeout=5)
+    threading.Timer(0.1, handler.release.set).start()
+    assert ingest.submit('dev1', ('c',))
+    assert ingest.dropped == 0
+    assert drain(ingest, handler) == ['first', 'a', 'b', 'c']
+
+
+def test_errors_and_lag_are_counted():
+    ingest, handler = stalled_queue(POLICY_DROP_NEWEST)
+    time.sleep(0.1)
+    drain(ingest, handler)
+    ingest.start()
+    assert ingest.submit('dev1', ('bad',))
+    ingest.join()
+    ingest.stop()
+
+    stats = ingest.stats()
+    assert stats['processed'] == 4
+    assert stats['errors'] == 1
+    assert stats['depth'] == 0
+    # 'a' and 'b' waited behind the stalled item
+    assert stats['lag_seconds']['max'] >= 0.1
+
+
+def test_unknown_policy():
+    app = Flask(__name__)
+    app.config['INGEST_OVERFLOW_POLICY'] = 'drop_everything'
+    with pytest.raises(ValueError):
+        IngestQueue(lambda: None, app)
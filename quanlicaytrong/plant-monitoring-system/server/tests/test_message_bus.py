@@ -0,0 +1,85 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from message_bus import LocalBus, MessageBus, UnixSocketClient, UnixSocketHub, encode_frame, read_frames
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_message_bus_is_abstract():
+    with pytest.raises(TypeError):
+        MessageBus()
+
+
+def test_read_frames_across_split_and_batched_reads():
+    messages = [{'type': 'state', 'index': index, 'text': 'x' * (index * 997 % 5000)} for index in range(300)]
+    data = b''.join(encode_frame(message) for message in messages)
+    reader, writer = socket.socketpair()
+    received = []
+    thread = threading.Thread(target=read_frames, args=(reader, received.append))
+    thread.start()
+
+    # Uneven writes put frame boundaries anywhere inside a read, including inside the length header
+    position = 0
+    for size in [1, 3, 2, 70000, 5, 123457, 1, 9999999]:
+        writer.sendall(data[position:position + size])
+        position += size
+    writer.close()
+    thread.join(5)
+    reader.close()
+    assert received == messages
+
+
+def test_local_bus_hands_subscribers_a_copy():
+    bus = LocalBus()
+    received = []
+    bus.subscribe(received.append)
+    message = {'type': 'state', 'devices': {'dev1': {'temperature': 20}}}
+    assert bus.publish(message)
+    message['devices']['dev1']['temperature'] = 30
+    assert received == [{'type': 'state', 'devices': {'dev1': {'temperature': 20}}}]
+
+
+def test_hub_and_clients(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+    hub = UnixSocketHub(path, greeting=lambda: {'type': 'snapshot', 'devices': {}})
+    to_hub = []
+    hub.subscribe(to_hub.append)
+    hub.start()
+
+    clients = []
+    for _ in range(2):
+        client = UnixSocketClient(path, reconnect_delay=0.05)
+        received = []
+        client.subscribe(received.append)
+        client.start()
+        clients.append((client, received))
+    try:
+        assert wait_for(lambda: hub.subscriber_count() == 2)
+        assert hub.publish({'type': 'state', 'devices': {'dev1': {'mode': 'AUTO'}}})
+        for _, received in clients:
+            assert wait_for(lambda: len(received) == 2)
+            assert received[0]['type'] == 'snapshot'
+            assert received[1] == {'type': 'state', 'devices': {'dev1': {'mode': 'AUTO'}}}
+
+        assert clients[0][0].publish({'type': 'mqtt', 'topic': 'plant/dev1/command', 'payload': 'PUMP_ON'})
+        assert wait_for(lambda: to_hub == [{'type': 'mqtt', 'topic': 'plant/dev1/command', 'payload': 'PUMP_ON'}])
+    finally:
+        for client, _ in clients:
+            client.close()
+        hub.close()
+
+
+def test_client_publish_without_a_hub_is_dropped(tmp_path):
+    client = UnixSocketClient(str(tmp_path / 'missing.sock'))
+    assert not client.publish({'type': 'mqtt'})
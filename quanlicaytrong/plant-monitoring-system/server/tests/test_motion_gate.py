@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+
+from motion_gate import MotionGate
+
+
+def frame(value=0, square=None):
+    image = np.full((240, 320, 3), value, dtype=np.uint8)
+    if square is not None:
+        x, y = square
+        image[y:y + 60, x:x + 60] = 255
+    return image
+
+
+def test_opens_on_motion_and_closes_after_the_hold():
+    gate = MotionGate(hold_seconds=3.0)
+    assert gate.check(frame(), 0.0)
+    assert gate.check(frame(), 2.0)
+    assert not gate.check(frame(), 3.5)
+
+    assert gate.check(frame(square=(100, 80)), 4.0)
+    assert gate.opened == 2
+    assert gate.check(frame(), 6.9)
+
+
+def test_hold_keeps_a_still_hand_open():
+    gate = MotionGate(hold_seconds=1.0)
+    gate.check(frame(), 0.0)
+    for now in [0.8, 1.6, 2.4]:
+        gate.hold(now)
+        assert gate.check(frame(), now + 0.5)
+    assert gate.opened == 1
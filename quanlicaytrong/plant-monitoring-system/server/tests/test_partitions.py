@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from partitions import SensorPartitions
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plant.db'}")
+    yield engine
+    engine.dispose()
+
+
+def reading(device_id, timestamp, value=20.0):
+    return {
+        'device_id': device_id,
+        'timestamp': timestamp,
+        'temperature': value,
+        'humidity': value,
+        'soil_moisture': int(value),
+        'light_level': int(value)
+    }
+
+
+def filled(engine, *months):
+    partitions = SensorPartitions()
+    with Session(engine) as session:
+        partitions.insert(session, [reading('dev1', datetime(2026, month, 10)) for month in months])
+        session.commit()
+    return partitions
+
+
+def test_rows_land_in_monthly_partitions(engine):
+    partitions = filled(engine, 1, 2, 3)
+    assert partitions.keys() == [202601, 202602, 202603]
+
+    with Session(engine) as session:
+        rows = list(partitions.read_range(session, 'dev1', datetime(2026, 2, 1)))
+        assert [row.timestamp for row in rows] == [datetime(2026, 2, 10), datetime(2026, 3, 10)]
+        assert partitions.latest(session, 'dev1').timestamp == datetime(2026, 3, 10)
+        assert partitions.count_rows(session) == 3
+
+
+def test_retention_drops_whole_months(engine):
+    partitions = filled(engine, 1, 2, 3)
+    partitions.retention_months = 2
+
+    assert partitions.apply_retention(engine, now=datetime(2026, 3, 15)) == ['sensor_data_202601']
+    assert partitions.keys() == [202602, 202603]
+    assert 'sensor_data_202601' not in inspect(engine).get_table_names()
+
+    # Rows older than the retention window are not written back
+    with Session(engine) as session:
+        assert partitions.insert(session, [reading('dev1', datetime(2026, 1, 20))]) == 0
+
+
+def test_retention_during_a_read_skips_the_dropped_months(engine):
+    partitions = filled(engine, 1, 2, 3)
+    partitions.retention_months = 1
+
+    with Session(engine) as session:
+        rows = partitions.read_range(session, 'dev1', datetime(2026, 1, 1))
+        assert next(rows).timestamp == datetime(2026, 1, 10)
+
+        # The writer opening a new month drops January and February while the read is between partitions
+        partitions.apply_retention(engine, now=datetime(2026, 3, 15))
+
+        assert [row.timestamp for row in rows] == [datetime(2026, 3, 10)]
+
+
+def test_refresh_forgets_partitions_dropped_elsewhere(engine):
+    partitions = filled(engine, 1, 2)
+    other = SensorPartitions()
+    other.load(engine)
+    other.retention_months = 1
+    other.apply_retention(engine, now=datetime(2026, 2, 15))
+
+    partitions.refresh(engine)
+    assert partitions.keys() == [202602]
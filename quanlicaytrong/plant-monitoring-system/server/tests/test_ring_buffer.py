@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from ring_buffer import RecentReadings, RecentReadingsReader
+
+
+@pytest.fixture
+def ring(tmp_path):
+    app = Flask(__name__)
+    app.config['RECENT_READINGS_HOURS'] = 0.01
+    app.config['RECENT_READINGS_INTERVAL'] = 1
+    app.config['RECENT_READINGS_MAX_DEVICES'] = 2
+    app.config['RECENT_READINGS_PATH'] = str(tmp_path / 'recent.ring')
+    ring = RecentReadings(app)
+    yield ring
+    ring.release()
+
+
+def append(ring, device_id, timestamp, value=1.0):
+    ring.append(device_id, timestamp, value, value, value, value)
+
+
+def test_reads_back_the_window(ring):
+    now = datetime.now().replace(microsecond=0)
+    for step in range(10):
+        append(ring, 'a', now + timedelta(seconds=step), step)
+
+    epochs, values = ring.read_columns('a', now + timedelta(seconds=3), now + timedelta(seconds=7))
+    assert epochs.tolist() == [epochs[0] + offset for offset in range(4)]
+    assert values['temperature'].tolist() == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_keeps_only_the_newest_capacity_readings(ring):
+    now = datetime.now().replace(microsecond=0)
+    # 0.01 hours at one reading a second
+    for step in range(36 + 5):
+        append(ring, 'a', now + timedelta(seconds=step), step)
+
+    epochs, values = ring.read_columns('a', now)
+    assert len(epochs) == ring.capacity
+    assert values['temperature'][0] == 5.0
+    assert not ring.covers('a', now)
+    assert ring.covers('a', now + timedelta(seconds=10))
+
+
+def test_devices_without_a_slot_are_not_covered(ring):
+    now = datetime.now().replace(microsecond=0)
+    for device_id in ['a', 'b', 'c']:
+        append(ring, device_id, now)
+
+    assert ring.covers('a', now)
+    assert ring.covers('b', now)
+    assert not ring.covers('c', now)
+    assert not ring.covers('never-seen', now)
+    assert ring.dropped == 1
+
+
+def test_reader_maps_the_writer_file(ring):
+    now = datetime.now().replace(microsecond=0)
+    append(ring, 'a', now, 2.5)
+
+    reader = RecentReadingsReader(ring.path)
+    try:
+        epochs, values = reader.read_columns('a', now)
+        assert values['humidity'].tolist() == [2.5]
+        assert reader.covers('a', now)
+    finally:
+        reader.close()
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+import rollups
+from rollups import ROLLUP_MODELS, aggregate, apply_rollups, expire_rollups
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    for model in ROLLUP_MODELS.values():
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def reading(device_id, timestamp, value):
+    return {
+        'device_id': device_id,
+        'timestamp': timestamp,
+        'temperature': value,
+        'humidity': value,
+        'soil_moisture': int(value),
+        'light_level': int(value)
+    }
+
+
+def count(session, resolution):
+    return session.execute(select(func.count()).select_from(ROLLUP_MODELS[resolution])).scalar()
+
+
+def test_aggregate_sums_and_extremes():
+    start = datetime(2026, 5, 1, 10, 0, 0)
+    rows = [reading('dev1', start + timedelta(seconds=step * 20), step) for step in range(6)]
+
+    buckets = aggregate(rows, 'minute')
+    assert [bucket['count'] for bucket in buckets] == [3, 3]
+    assert buckets[1]['temperature_sum'] == 3 + 4 + 5
+    assert buckets[1]['temperature_min'] == 3
+    assert buckets[1]['temperature_max'] == 5
+
+
+def test_upserts_merge_into_existing_buckets(session):
+    start = datetime(2026, 5, 1, 10, 0, 0)
+    apply_rollups(session, [reading('dev1', start, 10)])
+    apply_rollups(session, [reading('dev1', start + timedelta(seconds=30), 20)])
+
+    bucket = session.query(ROLLUP_MODELS['minute']).one()
+    assert bucket.count == 2
+    assert bucket.average('temperature') == 15
+    assert (bucket.temperature_min, bucket.temperature_max) == (10, 20)
+
+
+def test_more_buckets_than_one_statement_can_bind(session, monkeypatch):
+    # 15 columns per bucket, so 100 parameters take 6 buckets per statement
+    monkeypatch.setattr(rollups, 'SQLITE_MAX_VARIABLES', 100)
+    start = datetime(2026, 5, 1, 10, 0, 0)
+    apply_rollups(session, [reading(f'dev{index}', start, index % 50) for index in range(40)])
+    apply_rollups(session, [reading(f'dev{index}', start, 1) for index in range(40)])
+    assert count(session, 'minute') == 40
+    assert session.query(func.sum(ROLLUP_MODELS['month'].count)).scalar() == 80
+
+
+def test_expire_rollups_keeps_each_resolution_window(session):
+    now = datetime(2026, 5, 20, 12, 0, 0)
+    apply_rollups(session, [reading('dev1', now - timedelta(days=days), 1) for days in range(0, 60, 2)])
+
+    expire_rollups(session, {'minute': 7, 'hour': 30, 'day': 0}, now)
+    minutes = session.query(ROLLUP_MODELS['minute'].bucket).all()
+    assert min(bucket for bucket, in minutes) >= now - timedelta(days=7)
+    assert count(session, 'minute') == 4
+    # A bucket that starts right at the cutoff is kept
+    assert count(session, 'hour') == 16
+    assert count(session, 'day') == 30
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from devices import DeviceRegistry
+from extensions import db
+from models import ThresholdSettings
+from threshold_cache import ThresholdCache
+
+
+@pytest.fixture
+def cache():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield ThresholdCache(DeviceRegistry(), app)
+    with app.app_context():
+        db.engine.dispose()
+
+
+def stored(cache, device_id):
+    with cache.app.app_context():
+        return ThresholdSettings.query.filter_by(device_id=device_id).first()
+
+
+def test_update_persists_and_skips_unchanged(cache):
+    values = cache.update('dev1', {'soil_moisture_min': '45', 'unknown': 1})
+    assert values['soil_moisture_min'] == 45
+    assert stored(cache, 'dev1').soil_moisture_min == 45
+
+    version, _ = cache.get('dev1')
+    assert cache.update('dev1', {'soil_moisture_min': 45}) is None
+    assert cache.get('dev1')[0] == version
+    assert (cache.writes, cache.skipped) == (1, 1)
+
+
+def test_failed_write_restores_the_cache(cache, monkeypatch):
+    cache.update('dev1', {'temperature_max': 31})
+    version, _ = cache.get('dev1')
+
+    def fail(*args):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(cache, '_persist', fail)
+    with pytest.raises(RuntimeError):
+        cache.update('dev1', {'temperature_max': 35})
+
+    assert cache.registry.get('dev1').thresholds['temperature_max'] == 31
+    # The restored thresholds still get a new version, so clients that saw the failed one refetch
+    assert cache.get('dev1')[0] > version
+
+
+def test_device_lock_is_free_while_writing(cache, monkeypatch):
+    device = cache.registry.get('dev1')
+    persist = cache._persist
+    lock_free = []
+
+    def check(*args):
+        acquired = device.lock.acquire(timeout=1)
+        lock_free.append(acquired)
+        if acquired:
+            device.lock.release()
+        persist(*args)
+
+    monkeypatch.setattr(cache, '_persist', check)
+    thread = threading.Thread(target=cache.update, args=('dev1', {'humidity_min': 50}))
+    thread.start()
+    thread.join()
+    assert lock_free == [True]
@@ -0,0 +1,77 @@
+import struct
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from wire_format import (
+    COLUMN_HEADER, DTYPE_FLOAT32, DTYPE_INT16, DTYPE_STRING, HEADER, MAGIC, encode_columnar, encode_readings,
+    to_epoch_seconds
+)
+
+
+def decode(data):
+    # The reading side of the layout documented in wire_format.py, as static/js decodes it
+    magic, version, column_count, _, count, first = HEADER.unpack_from(data)
+    assert magic == MAGIC
+    offset = HEADER.size
+    deltas = np.frombuffer(data, dtype='<i4', count=count, offset=offset)
+    offset += deltas.nbytes
+    epochs = first + np.cumsum(deltas, dtype=np.int64)
+
+    columns = {}
+    for _ in range(column_count):
+        name_length, dtype = COLUMN_HEADER.unpack_from(data, offset)
+        offset += COLUMN_HEADER.size
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        if dtype == DTYPE_STRING:
+            values = []
+            for _ in range(count):
+                (length,) = struct.unpack_from('<H', data, offset)
+                values.append(data[offset + 2:offset + 2 + length].decode('utf-8'))
+                offset += 2 + length
+        else:
+            array_dtype = '<f4' if dtype == DTYPE_FLOAT32 else '<i2'
+            values = np.frombuffer(data, dtype=array_dtype, count=count, offset=offset)
+            offset += values.nbytes
+        columns[name] = values
+    assert offset == len(data)
+    return epochs, columns
+
+
+def test_columns_round_trip():
+    epochs = [1700000000, 1700000005, 1700000005, 1700003600]
+    data = encode_columnar(epochs, [
+        ('temperature', [21.5, 22.25, np.nan, -3.5], DTYPE_FLOAT32),
+        ('soil_moisture', [10, 10.6, 99, 0], DTYPE_INT16),
+        ('device_id', ['dev1', 'vườn', '', 'dev1'], DTYPE_STRING)
+    ])
+
+    decoded_epochs, columns = decode(data)
+    assert decoded_epochs.tolist() == epochs
+    assert np.array_equal(columns['temperature'], np.float32([21.5, 22.25, np.nan, -3.5]), equal_nan=True)
+    assert columns['soil_moisture'].tolist() == [10, 11, 99, 0]
+    assert columns['device_id'] == ['dev1', 'vườn', '', 'dev1']
+
+
+def test_empty_frame():
+    epochs, columns = decode(encode_columnar([], [('temperature', [], DTYPE_FLOAT32)]))
+    assert len(epochs) == 0
+    assert len(columns['temperature']) == 0
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        encode_columnar([0], [('temperature', [1.0], 9)])
+
+
+def test_readings_fill_in_missing_metrics():
+    timestamp = datetime(2026, 10, 18, 12, 0, 0)
+    data = encode_readings([('dev1', {'temperature': 20.5, 'light_level': 300}), ('dev2', {'light_level': 7})], timestamp)
+
+    epochs, columns = decode(data)
+    assert epochs.tolist() == [to_epoch_seconds([timestamp])[0]] * 2
+    assert list(columns) == ['device_id', 'temperature', 'light_level']
+    assert np.isnan(columns['temperature'][1])
+    assert columns['light_level'].tolist() == [300, 7]
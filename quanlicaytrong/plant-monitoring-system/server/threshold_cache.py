@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import ThresholdSettings
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_TYPES = {
+    'temperature_min': float,
+    'temperature_max': float,
+    'soil_moisture_min': int,
+    'humidity_min': float,
+    'light_level_min': int
+}
+
+
+class ThresholdCache:
+    def __init__(self, registry, app=None):
+        self.registry = registry
+        self.app = None
+        self.writes = 0
+        self.skipped = 0
+        self._meta = {}
+        self._version = 0
+        self._version_lock = threading.Lock()
+        # Keeps threshold writes in order without holding device.lock, which ingest needs, across a commit
+        self._write_lock = threading.Lock()
+        # cluster.py web workers hand writes to the ingest process, which owns the database writer
+        self.writer = None
+        # Versions restart with the process, so the boot time keeps old ETags from matching new ones
+        self._epoch = format(int(time.time()), 'x')
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['threshold_cache'] = self
+
+    def _next_version(self):
+        with self._version_lock:
+            self._version += 1
+            return self._version
+
+    def load(self, session):
+        for settings in session.query(ThresholdSettings).all():
+            device = self.registry.get(settings.device_id)
+            with device.lock:
+                device.thresholds.update({key: getattr(settings, key) for key in THRESHOLD_TYPES})
+                self._meta[settings.device_id] = (self._next_version(), settings.last_updated)
+        logger.info(f"Loaded thresholds for {len(self._meta)} devices")
+
+    def get(self, device_id):
+        meta = self._meta.get(device_id)
+        if meta is None:
+            return None
+        device = self.registry.get(device_id)
+        with device.lock:
+            version, last_updated = self._meta[device_id]
+            values = dict(device.thresholds)
+        return version, {
+            'device_id': device_id,
+            **values,
+            'last_updated': last_updated.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def etag(self, version):
+        return f'{self._epoch}-{version}'
+
+    def update(self, device_id, changes):
+        changes = {key: THRESHOLD_TYPES[key](value) for key, value in changes.items() if key in THRESHOLD_TYPES}
+        device = self.registry.get(device_id)
+
+        with self._write_lock:
+            with device.lock:
+                changed = {key: value for key, value in changes.items() if device.thresholds.get(key) != value}
+                if not changed and device_id in self._meta:
+                    # Retained messages and echoes of our own publishes end here without touching the database
+                    self.skipped += 1
+                    return None
+
+                previous = {key: device.thresholds.get(key) for key in changed}
+                meta = self._meta.get(device_id)
+                last_updated = datetime.utcnow()
+                device.thresholds.update(changed)
+                self._meta[device_id] = (self._next_version(), last_updated)
+                values = dict(device.thresholds)
+
+            try:
+                if self.writer is not None:
+                    self.writer(device_id, values)
+                else:
+                    self._persist(device_id, values, last_updated)
+            except Exception:
+                with device.lock:
+                    device.thresholds.update(previous)
+                    if meta is None:
+                        self._meta.pop(device_id, None)
+                    else:
+                        self._meta[device_id] = (self._next_version(), meta[1])
+                raise
+
+            self.writes += 1
+            return values
+
+    def refresh(self, device_id, values):
+        # Thresholds another process has already stored (cluster.py web workers); only the cache changes
+        values = {key: THRESHOLD_TYPES[key](value) for key, value in values.items() if key in THRESHOLD_TYPES}
+        device = self.registry.get(device_id)
+
+        with device.lock:
+            if device_id in self._meta and all(device.thresholds.get(key) == value for key, value in values.items()):
+                return False
+            device.thresholds.update(values)
+            self._meta[device_id] = (self._next_version(), datetime.utcnow())
+            return True
+
+    def _persist(self, device_id, values, last_updated):
+        row = {'device_id': device_id, **values, 'last_updated': last_updated}
+        stmt = sqlite_insert(ThresholdSettings).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['device_id'],
+            set_={key: stmt.excluded[key] for key in row if key != 'device_id'}
+        )
+
+        with self.app.app_context():
+            try:
+                db.session.execute(stmt)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
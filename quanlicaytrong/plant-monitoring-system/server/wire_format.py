@@ -0,0 +1,77 @@
+import struct
+from datetime import datetime
+
+import numpy as np
+
+# Layout (little-endian):
+#   header  magic "PMC1", version u8, column count u8, reserved u16, row count u32, first epoch second i64
+#   times   row count x i32 deltas from the previous timestamp (the first delta is 0)
+#   columns name length u8, dtype u8, name bytes, then the values
+#           float32 / int16 values are packed arrays, strings are u16 length + UTF-8 bytes each
+MAGIC = b'PMC1'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHIq')
+COLUMN_HEADER = struct.Struct('<BB')
+
+DTYPE_FLOAT32 = 1
+DTYPE_INT16 = 2
+DTYPE_STRING = 3
+
+RAW_METRIC_DTYPES = {
+    'temperature': DTYPE_FLOAT32,
+    'humidity': DTYPE_FLOAT32,
+    'soil_moisture': DTYPE_INT16,
+    'light_level': DTYPE_INT16
+}
+
+MIMETYPE = 'application/vnd.plant.columnar'
+
+
+def to_epoch_seconds(timestamps):
+    # Naive datetimes are encoded as wall-clock time; the dashboard decodes them back the same way
+    return np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64)
+
+
+def encode_columnar(epochs, columns):
+    epochs = np.asarray(epochs, dtype=np.int64)
+    count = len(epochs)
+    first = int(epochs[0]) if count else 0
+
+    deltas = np.zeros(count, dtype='<i4')
+    if count > 1:
+        deltas[1:] = np.diff(epochs)
+
+    parts = [HEADER.pack(MAGIC, VERSION, len(columns), 0, count, first), deltas.tobytes()]
+
+    for name, values, dtype in columns:
+        encoded_name = name.encode('utf-8')
+        parts.append(COLUMN_HEADER.pack(len(encoded_name), dtype))
+        parts.append(encoded_name)
+
+        if dtype == DTYPE_FLOAT32:
+            parts.append(np.asarray(values, dtype='<f4').tobytes())
+        elif dtype == DTYPE_INT16:
+            parts.append(np.rint(np.asarray(values, dtype=np.float64)).astype('<i2').tobytes())
+        elif dtype == DTYPE_STRING:
+            for value in values:
+                encoded = str(value).encode('utf-8')
+                parts.append(struct.pack('<H', len(encoded)))
+                parts.append(encoded)
+        else:
+            raise ValueError(f"Unknown column dtype: {dtype}")
+
+    return b''.join(parts)
+
+
+def encode_readings(readings, timestamp=None):
+    # readings: list of (device_id, {metric: value}) pairs, one row per device
+    epoch = to_epoch_seconds([timestamp or datetime.now()])[0]
+    metrics = [metric for metric in RAW_METRIC_DTYPES if any(metric in values for _, values in readings)]
+
+    columns = [('device_id', [device_id for device_id, _ in readings], DTYPE_STRING)]
+    for metric in metrics:
+        dtype = RAW_METRIC_DTYPES[metric]
+        missing = np.nan if dtype == DTYPE_FLOAT32 else 0
+        columns.append((metric, [values.get(metric, missing) for _, values in readings], dtype))
+
+    return encode_columnar(np.full(len(readings), epoch, dtype=np.int64), columns)